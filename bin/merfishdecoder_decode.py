@@ -134,19 +134,15 @@ def main():
     zp.load_readout_images(
         zp.get_bit_name())
     
-    utilities.print_checkpoint("Correct Stage Drift")
+    utilities.print_checkpoint("Correct Stage Drift and Chromatic Aberration")
     (zp, errors) = registration.correct_drift(
         obj = zp,
         frameNames = zp.get_bit_name(),
         refFrameIndex = refFrameIndex,
-        highPassSigma = highPassFilterSigma)
-    
-    utilities.print_checkpoint("Correct Chromatic Abeeration")
-    profile = zp.get_chromatic_aberration_profile()
-    zp = registration.correct_chromatic_aberration(
-        obj = zp,
-        frameNames = zp.get_bit_name(),
-        profile = profile)
+        highPassSigma = highPassFilterSigma,
+        profile = zp.get_chromatic_aberration_profile(),
+        colorMaps = zp.get_chromatic_aberration_maps(),
+        reuseDrift = True)
     
     utilities.print_checkpoint("Remove Cell Background")
     zp = imagefilter.high_pass_filter(
@@ -0,0 +1,118 @@
+import argparse
+import sys
+import subprocess
+import numpy as np
+
+# the modules imported by each command of the command line interface
+COMMAND_MODULES = {
+    "parser": "merfishdecoder.parser",
+    "create-analysis": "merfishdecoder.apps.run_create_analysis",
+    "validate-raw": "merfishdecoder.apps.run_validate_raw",
+    "convert-raw": "merfishdecoder.apps.run_convert_raw",
+    "register-images": "merfishdecoder.apps.run_registration",
+    "register-fov-images": "merfishdecoder.apps.run_registration",
+    "decode-images": "merfishdecoder.apps.run_decoding",
+    "extract-barcodes": "merfishdecoder.apps.run_extract_barcodes",
+    "export-barcodes": "merfishdecoder.apps.run_export_barcodes",
+    "segmentation": "merfishdecoder.apps.run_segmentation"}
+
+# the modules that should only be imported when they are used
+HEAVY_MODULES = ["matplotlib", "tables", "xmltodict", "boto3", "botocore",
+                 "google.cloud", "cellpose", "geopandas", "numba",
+                 "sklearn", "SharedArray", "h5py"]
+
+# a module that cannot be imported is reported on the first line as
+# "skipped" when a dependency is not installed and as "failed" otherwise
+IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+try:
+    import {0}
+except ModuleNotFoundError as e:
+    if e.name is None or e.name.split('.')[0] == 'merfishdecoder':
+        raise
+    print('skipped: %s is not installed' % e.name)
+    sys.exit()
+except Exception as e:
+    print('failed: %s: %s' % (type(e).__name__, e))
+    sys.exit()
+print(time.perf_counter() - start)
+print(' '.join(x for x in {1} if x in sys.modules))
+"""
+
+def time_import(moduleName: str,
+                repeats: int = 5):
+
+    """
+    Import a module in fresh interpreters and measure the import time.
+
+    Returns:
+        A tuple with the import times in seconds and the names of the
+        heavy modules that were imported with the module, or None and
+        the reason if the module could not be imported.
+    """
+
+    importTimes = []
+    for i in range(repeats):
+        process = subprocess.run(
+            [sys.executable, "-c",
+             IMPORT_SCRIPT.format(moduleName, repr(HEAVY_MODULES))],
+            stdout = subprocess.PIPE,
+            stderr = subprocess.PIPE,
+            universal_newlines = True)
+        output = process.stdout.split("\n")
+        if process.returncode != 0:
+            return None, "failed: " + \
+                process.stderr.strip().split("\n")[-1]
+        if output[0].startswith(("skipped:", "failed:")):
+            return None, output[0]
+        importTimes.append(float(output[0]))
+    return importTimes, " ".join(output[1].split())
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure the import time of the merfishdecoder commands.')
+
+    parser.add_argument("--commands",
+                        type=str,
+                        nargs="+",
+                        default=list(COMMAND_MODULES.keys()),
+                        help="Commands to measure.")
+
+    parser.add_argument("--repeats",
+                        type=int,
+                        default=5,
+                        help="Number of fresh interpreters per command.")
+
+    parser.add_argument("--max-seconds",
+                        type=float,
+                        default=None,
+                        help="Exit with an error if the median import "
+                             "time of any command exceeds this limit.")
+
+    args = parser.parse_args()
+
+    slowCommands = []
+    print("%-20s %10s %10s  %s" % ("command", "median(s)", "min(s)",
+                                   "heavy modules imported"))
+    for command in args.commands:
+        (importTimes, heavyModules) = time_import(
+            COMMAND_MODULES[command], args.repeats)
+        if importTimes is None:
+            print("%-20s %10s %10s  %s" % (
+                command, "-", "-", heavyModules))
+            if not heavyModules.startswith("skipped:"):
+                slowCommands.append(command)
+            continue
+        medianTime = np.median(importTimes)
+        print("%-20s %10.3f %10.3f  %s" % (
+            command, medianTime, np.min(importTimes), heavyModules))
+        if args.max_seconds is not None and medianTime > args.max_seconds:
+            slowCommands.append(command)
+
+    if len(slowCommands) > 0:
+        sys.exit("Import failed or exceeds the time limit for: %s" %
+                 " ".join(slowCommands))
+
+if __name__ == "__main__":
+    main()
@@ -42,7 +42,7 @@ class SimpleGlobalAlignment():
         return []
 
     def fov_coordinates_to_global(self, fov, fovCoordinates):
-        fovStart = self.dataSet.get_fov_offset(fov)
+        fovStart = self.dataSet.get_global_coordinates().get_fov_offset(fov)
         micronsPerPixel = self.dataSet.get_microns_per_pixel()
         if len(fovCoordinates) == 2:
             return (fovStart[0] + fovCoordinates[0]*micronsPerPixel,
@@ -81,11 +81,11 @@ class SimpleGlobalAlignment():
     def global_coordinates_to_fov(self, fov, globalCoordinates):
         tform = np.linalg.inv(self.fov_to_global_transform(fov))
 
-        def convert_coordinate(coordinateIn):
-            coords = np.array([coordinateIn[0], coordinateIn[1], 1])
-            return np.matmul(tform, coords).astype(int)[:2]
-        pixels = [convert_coordinate(x) for x in globalCoordinates]
-        return pixels
+        globalCoordinates = np.asarray(globalCoordinates).reshape(-1, 2)
+        coords = np.column_stack([globalCoordinates,
+                                  np.ones(len(globalCoordinates))])
+        pixels = np.matmul(coords, tform.T).astype(int)[:, :2]
+        return list(pixels)
 
     def fov_to_global_transform(self, fov):
         micronsPerPixel = self.dataSet.get_microns_per_pixel()
@@ -97,15 +97,16 @@ class SimpleGlobalAlignment():
 
     def get_global_extent(self):
         fovSize = self.dataSet.get_image_dimensions()
-        fovBounds = [self.fov_coordinates_to_global(x, (0, 0))
-                     for x in self.dataSet.get_fovs()] + \
-                    [self.fov_coordinates_to_global(x, fovSize)
-                     for x in self.dataSet.get_fovs()]
+        globalCoordinates = self.dataSet.get_global_coordinates()
+        fovs = globalCoordinates.get_fovs()
+        (startX, startY) = globalCoordinates.fov_to_global(fovs, 0, 0)
+        (endX, endY) = globalCoordinates.fov_to_global(
+            fovs, fovSize[0], fovSize[1])
 
-        minX = np.min([x[0] for x in fovBounds])
-        maxX = np.max([x[0] for x in fovBounds])
-        minY = np.min([x[1] for x in fovBounds])
-        maxY = np.max([x[1] for x in fovBounds])
+        minX = min(np.min(startX), np.min(endX))
+        maxX = max(np.max(startX), np.max(endX))
+        minY = min(np.min(startY), np.min(endY))
+        maxY = max(np.max(startY), np.max(endY))
 
         return minX, minY, maxX, maxY
 
@@ -160,17 +161,8 @@ class CorrelationGlobalAlignment():
     def _get_overlapping_regions(self, fov: int, minArea: int = 2000):
         """Get a list of all the fovs that overlap with the specified fov.
         """
-        positions = self.dataSet.get_stage_positions()
-        pixelToMicron = self.dataSet.get_microns_per_pixel()
-        fovMicrons = [x*pixelToMicron
-                      for x in self.dataSet.get_image_dimensions()]
-        fovPosition = positions.loc[fov]
-        overlapAreas = [i for i, p in positions.iterrows()
-                        if self._calculate_overlap_area(
-                p['X'], p['Y'], fovPosition['X'], fovPosition['Y'],
-                fovMicrons[0], fovMicrons[1]) > minArea and i != fov]
-
-        return overlapAreas
+        return self.dataSet.get_global_coordinates().get_overlapping_fovs(
+            fov, minArea)
 
     def _run_analysis(self):
         fov1 = self.dataSet.get_fiducial_image(0, 0)
@@ -92,20 +92,15 @@ def main():
     frameNames = [ zp.get_readout_name()[refFrameIndex], featureName]
     zp.load_readout_images(frameNames)
     
-    utilities.print_checkpoint("Correct Stage Drift")
+    utilities.print_checkpoint("Correct Stage Drift and Chromatic Aberration")
     (zp, errors) = registration.correct_drift(
         obj = zp,
         frameNames = frameNames,
         refFrameIndex = refFrameIndex,
-        highPassSigma = highPassFilterSigma)
-    
-    utilities.print_checkpoint("Correct Chromatic Aberration")
-    profile = zp.get_chromatic_aberration_profile()
-
-    zp = registration.correct_chromatic_aberration(
-        obj = zp,
-        frameNames = frameNames,
-        profile = profile)
+        highPassSigma = highPassFilterSigma,
+        profile = zp.get_chromatic_aberration_profile(),
+        colorMaps = zp.get_chromatic_aberration_maps(),
+        reuseDrift = True)
     
     utilities.print_checkpoint("Cellpose Segmentation")
     
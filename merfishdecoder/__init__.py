@@ -38,6 +38,15 @@ else:
           % envPath)
 
 
+def get_raw_data_cache_size() -> int:
+    """Get the size in bytes of the local cache of raw data read from
+    s3:// or gc:// paths, from RAW_DATA_CACHE_SIZE in the environment or
+    the .env file. The cache is disabled when this is 0. The variable is
+    read on every call so that it can be changed after the import.
+    """
+    return int(os.environ.get('RAW_DATA_CACHE_SIZE', 0))
+
+
 def store_env(dataHome, analysisHome, parametersHome):
     with open(envPath, 'w') as f:
         f.write('DATA_HOME=%s\n' % dataHome)
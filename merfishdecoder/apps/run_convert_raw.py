@@ -0,0 +1,148 @@
+import os
+import h5py
+import numpy as np
+
+from merfishdecoder.core import dataset
+from merfishdecoder.util import imagereader
+from merfishdecoder.util import utilities
+
+def run_job(dataSetName: str = None,
+            fov: int = None,
+            compression: str = "gzip",
+            compressionLevel: int = 1,
+            overwrite: bool = False):
+
+    """
+    Convert the raw images of a MERFISH dataset into a chunked and
+    compressed image store.
+
+    Args
+    ----
+    dataSetName: input dataset name.
+
+    fov: the field of view to be converted. If it is None, all the
+                fields of view are converted.
+
+    compression: the compression applied to each chunk. One of gzip,
+                lzf or none.
+
+    compressionLevel: the gzip compression level (0-9).
+
+    overwrite: a boolen variable indicates whether fields of view that
+                are already in the image store are converted again.
+
+    """
+
+    utilities.print_checkpoint("Convert MERFISH raw images")
+    utilities.print_checkpoint("Start")
+
+    dataSet = dataset.MERFISHDataSet(dataSetName)
+    os.makedirs(dataSet.rawStorePath, exist_ok=True)
+
+    fovs = dataSet.get_fovs() if fov is None else [fov]
+    for currentFov in fovs:
+        storeFileName = dataSet.get_raw_store_file_name(
+            currentFov, existingOnly = False)
+        if os.path.exists(storeFileName) and not overwrite:
+            continue
+        write_raw_store(dataSet, currentFov, storeFileName,
+                        compression, compressionLevel)
+
+    utilities.print_checkpoint("Done")
+
+def write_raw_store(dataSet,
+                    fov: int,
+                    storeFileName: str,
+                    compression: str = "gzip",
+                    compressionLevel: int = 1):
+
+    """
+    Write the raw readout and fiducial frames of a field of view into
+    a store file with one chunk per frame.
+
+    Readout frames are stored in a (readout, z, y, x) dataset, in the
+    order of the data organization, and the fiducial frames in a
+    (fiducial, y, x) dataset with one frame for each distinct fiducial
+    frame. The fiducialIndexes attribute holds the fiducial of each
+    readout. Readouts that were not imaged at a z position
+    are stored as empty frames. Frames are stored as they were read
+    from the raw images, before the microscope orientation is applied.
+
+    """
+
+    dataOrganization = dataSet.get_data_organization()
+    dataChannels = dataOrganization.get_data_channels()
+    zPositions = dataSet.get_z_positions()
+
+    # group the frames by image file so each file is read once
+    requests = dict()
+    for dataChannel in dataChannels:
+        fileName = dataOrganization.get_image_filename(dataChannel, fov)
+        for zIndex, zPosition in enumerate(zPositions):
+            if not dataOrganization.has_image_frame(dataChannel, zPosition):
+                continue
+            requests.setdefault(fileName, []).append(
+                (int(dataOrganization.get_image_frame_index(
+                    dataChannel, zPosition)),
+                 ("readouts", (dataChannel, zIndex))))
+
+    # fiducial frames shared by several data channels are stored once
+    fiducialIndexes = dataSet.get_raw_store_fiducial_indexes()
+    storedFiducials = set()
+    for dataChannel in dataChannels:
+        fiducialIndex = fiducialIndexes[int(dataChannel)]
+        if fiducialIndex in storedFiducials:
+            continue
+        storedFiducials.add(fiducialIndex)
+        requests.setdefault(
+            dataOrganization.get_fiducial_filename(dataChannel, fov),
+            []).append((
+                int(dataOrganization.get_fiducial_frame_index(dataChannel)),
+                ("fiducials", (fiducialIndex,))))
+
+    (imageWidth, imageHeight, frameCount) = \
+        dataSet.image_stack_size(next(iter(requests)))
+    if compression == "none":
+        compressionArgs = dict()
+    elif compression == "gzip":
+        compressionArgs = dict(compression = "gzip", shuffle = True,
+                               compression_opts = compressionLevel)
+    else:
+        compressionArgs = dict(compression = compression, shuffle = True)
+
+    # write to a temporary file so that only complete stores are read
+    tmpFileName = storeFileName + ".tmp"
+    with h5py.File(tmpFileName, "w") as f:
+        stores = dict(
+            readouts = f.create_dataset(
+                "readouts",
+                shape = (len(dataChannels), len(zPositions),
+                         imageHeight, imageWidth),
+                dtype = np.uint16,
+                chunks = (1, 1, imageHeight, imageWidth),
+                **compressionArgs),
+            fiducials = f.create_dataset(
+                "fiducials",
+                shape = (len(storedFiducials), imageHeight, imageWidth),
+                dtype = np.uint16,
+                chunks = (1, imageHeight, imageWidth),
+                **compressionArgs))
+        f.attrs["version"] = imagereader.StoreReader.STORE_VERSION
+        f.attrs["fov"] = fov
+        f.attrs["fiducialIndexes"] = np.array(
+            [fiducialIndexes[int(x)] for x in dataChannels], dtype = np.int64)
+        f.attrs["readoutNames"] = np.array(
+            dataOrganization.data["readoutName"], dtype = "S")
+        f.attrs["zPositions"] = np.array(zPositions, dtype = np.float64)
+
+        for fileName, frameRequests in requests.items():
+            frameIndexes = sorted(set(x[0] for x in frameRequests))
+            framePositions = dict(
+                (x, i) for i, x in enumerate(frameIndexes))
+            with imagereader.open_reader(
+                    dataSet.rawDataPortal, fileName) as movie:
+                movieFrames = movie.load_frames(frameIndexes)
+            for (frameIndex, (storeName, storeIndex)) in frameRequests:
+                stores[storeName][storeIndex] = \
+                    movieFrames[framePositions[frameIndex]]
+    os.replace(tmpFileName, storeFileName)
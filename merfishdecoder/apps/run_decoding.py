@@ -131,9 +131,6 @@ def run_job(dataSetName: str = None,
         bitWeight = np.load(bitWeightName).astype(np.float)
     else:
         bitWeight = np.ones(cb.get_bit_count()) / cb.get_bit_count()
-        
-    # get codebook
-    cbMat = cb.get_barcodes()
 
     # create the folder
     os.makedirs(os.path.dirname(outputName),
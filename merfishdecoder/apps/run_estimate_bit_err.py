@@ -14,11 +14,7 @@ def FileCheck(fn):
 
 def estimate_one_to_zero_err(fn, cb):
     cbMat = cb.get_barcodes()
-    
-    cbMatMagnitudes = np.array([ np.linalg.norm(cbMat[i]) \
-       for i in range(cbMat.shape[0]) ], dtype=np.float32)
-    cbMatMagnitudes[cbMatMagnitudes == 0] = 1
-    cbMatNorm = cbMat / cbMatMagnitudes[:, None]
+    cbMatNorm = cb.get_normalized_barcode_matrix()
     x = pd.read_hdf(fn)
     m = np.array(x[cb.get_bit_names()])
     m = m / np.array(x.magnitudes)[:, None]
@@ -27,12 +23,8 @@ def estimate_one_to_zero_err(fn, cb):
 
 def estimate_zero_to_one_err(fn, cb):
     cbMat = cb.get_barcodes()
-    
-    cbMatMagnitudes = np.array([ np.linalg.norm(cbMat[i]) \
-       for i in range(cbMat.shape[0]) ], dtype=np.float32)
-    cbMatMagnitudes[cbMatMagnitudes == 0] = 1
-    cbMatNorm = cbMat / cbMatMagnitudes[:, None]
-    
+    cbMatNorm = cb.get_normalized_barcode_matrix()
+
     x = pd.read_hdf(fn)
     m = np.array(x[cb.get_bit_names()])
     m = m / np.array(x.magnitudes)[:, None]
@@ -55,7 +55,7 @@ def run_job(dataSetName: str = None,
     
     # estimate foreground
     cb = dataSet.get_codebook()
-    cbMat = cb.get_barcodes()[barcodes.barcode_id.astype(int),:]
+    cbMat = cb.get_barcode_matrix()[barcodes.barcode_id.astype(int),:]
     pixelTracesExp = np.array(barcodes[cb.get_bit_names()])
 
     pixelOneBit = pixelTracesExp[cbMat > 0]
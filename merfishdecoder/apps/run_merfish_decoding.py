@@ -14,6 +14,7 @@ import pandas as pd
 import numpy as np
 import geopandas as geo
 
+from merfishdecoder.core import dataset
 from merfishdecoder.core import zplane
 from merfishdecoder.util import registration
 from merfishdecoder.util import preprocessing
@@ -55,10 +56,15 @@ class merfishTask:
         utilities.print_checkpoint(self.to_string() + "\n")
         utilities.print_checkpoint("Start MEFISH Analysis")
 
-        # generate zplane object
+        # generate zplane object with the images of the bits held in
+        # one stack so that the decoding movie is not copied
+        bitNames = dataset.get_merfish_dataset(
+            dataSetName).get_codebook().get_bit_names()
         zp = zplane.Zplane(dataSetName,
                            fov=fov,
-                           zpos=zpos)
+                           zpos=zpos,
+                           stackBacked=True,
+                           stackedReadoutNames=bitNames)
 
         # load pixel score machine
         psm = pickle.load(open(psmName, "rb"))
@@ -72,19 +78,15 @@ class merfishTask:
         zp.load_readout_images(
             zp.get_bit_name())
 
-        utilities.print_checkpoint("Correct Stage Drift")
+        utilities.print_checkpoint("Correct Stage Drift and Chromatic Aberration")
         (zp, errors) = registration.correct_drift(
             obj = zp,
             frameNames = zp.get_bit_name(),
             refFrameIndex = refFrameIndex,
-            highPassSigma = highPassFilterSigma)
-
-        utilities.print_checkpoint("Correct Chromatic Abeeration")
-        profile = zp.get_chromatic_aberration_profile()
-        zp = registration.correct_chromatic_aberration(
-            obj = zp,
-            frameNames = zp.get_bit_name(),
-            profile = profile)
+            highPassSigma = highPassFilterSigma,
+            profile = zp.get_chromatic_aberration_profile(),
+            colorMaps = zp.get_chromatic_aberration_maps(),
+            reuseDrift = True)
 
         utilities.print_checkpoint("Remove Cell Background")
         zp = imagefilter.high_pass_filter(
@@ -105,10 +107,13 @@ class merfishTask:
             frameNames = zp.get_bit_name(),
             scaleFactors = scaleFactors)
 
+        # the decoding movie is a view of the stack of the bit images,
+        # which are not changed until the decoding is done
         utilities.print_checkpoint("Pixel-based Decoding")
         decodedImages = decoder.decoding(
                  obj = zp,
-                 movie = zp.get_readout_images(zp.get_bit_name()),
+                 movie = zp.get_readout_images(
+                     zp.get_bit_name(), copy = False),
                  borderSize = borderSize,
                  distanceThreshold = distanceThreshold,
                  magnitudeThreshold = magnitudeThreshold,
@@ -214,20 +219,20 @@ def main():
     
     args = parser.parse_args()
     mt = merfishTask(
-        dataSetName = args.data_set_name,
+        data_set_name = args.data_set_name,
         fov = args.fov,
         zpos = args.zpos,
-        psmName = args.psm_name,
-        maxCores = args.max_cores,
-        outputName = args.output_name,
-        refFrameIndex = args.ref_frame_index,
-        highPassFilterSigma = args.high_pass_filter_sigma,
-        borderSize = args.border_size,
-        magnitudeThreshold = args.magnitude_threshold,
-        distanceThreshold = args.distance_threshold,
-        barcodesPerCore = args.barcodes_per_core)
-
-    mt.run_jon()
+        psm_name = args.psm_name,
+        max_cores = args.max_cores,
+        output_name = args.output_name,
+        ref_frame_index = args.ref_frame_index,
+        high_pass_filter_sigma = args.high_pass_filter_sigma,
+        border_size = args.border_size,
+        magnitude_threshold = args.magnitude_threshold,
+        distance_threshold = args.distance_threshold,
+        barcodes_per_core = args.barcodes_per_core)
+
+    mt.run_job()
 
 if __name__ == "__main__":
     main()
@@ -38,9 +38,6 @@ def run_job(dataSetName: str = None,
                        fov = fov,
                        zpos = zpos)
     
-    # load codebook matrix
-    cbookMatrix = zp.get_codebook().get_barcodes()
-    
     # create the folder
     dirPath = os.path.dirname(outputName)
     os.makedirs(
@@ -15,27 +15,18 @@ def run_job(dataSetName: str = None,
             warpedImagesName: str = None,
             outputName: str = None,
             highPassFilterSigma: int = 3,
-<<<<<<< HEAD
-            lowPassFilterSigma: int = 1):
-=======
+            lowPassFilterSigma: int = 1,
             scaleFactorFile: str = None,
             logTransform: bool = False):
->>>>>>> c1e3ee130d7256ac122fa56c033538dda702739b
 
     
     """
     Preprocessing of MERFISH images prior to decoding:
-<<<<<<< HEAD
-        1) remove cell background - when highPassFilter is True
-        2) normalize magnitude
-        3) add gussian blur - when lowPassFilterSigma is True
-    
-=======
         1) remove cell background - when highPassFilter is given
-        2) normalize magnitude when medianScale is True
-        3) normalize magnitude by log transform when logTransform is True
+        2) normalize magnitude
+        3) add gussian blur - when lowPassFilterSigma is given
+        4) normalize magnitude by log transform when logTransform is True
 
->>>>>>> c1e3ee130d7256ac122fa56c033538dda702739b
     Args
     ----
     dataSetName: input dataset name.
@@ -60,6 +51,13 @@ def run_job(dataSetName: str = None,
                   high pass filter for removing the cell background.
                   highPassFilterSigma is None, high pass filter will
                   not be performed.
+
+    lowPassFilterSigma: the size of the gaussian sigma used to blur the
+                  normalized images. If lowPassFilterSigma is None, low 
+                  pass filter will not be performed.
+
+    logTransform: a boolen variable indicates whether the normalized 
+                  images are log transformed.
     """
 
     # print input variables
@@ -70,6 +68,7 @@ def run_job(dataSetName: str = None,
     print("warpedImagesName: %s" % warpedImagesName)
     print("outputName: %s" % outputName)
     print("highPassFilterSigma: %d" % highPassFilterSigma)
+    print("lowPassFilterSigma: %s" % lowPassFilterSigma)
     print("scaleFactorFile: %s" % scaleFactorFile)
     print("logTransform: %r" % logTransform)
     print("==================\n")
@@ -106,24 +105,18 @@ def run_job(dataSetName: str = None,
             sigma = highPassFilterSigma)
 
     # calcualte scale factor
-<<<<<<< HEAD
-    scaleFactors = preprocessing.estimate_scale_factors(
-        obj = zp,
-        frameNames = zp.get_readout_name())
-    medianValue = np.median([scaleFactors[key] for key in scaleFactors])
-    scaleFactors = dict([ (key, value / medianValue) \
-                     for key, value in scaleFactors.items() ])
-=======
     if scaleFactorFile is None:
         scaleFactors = preprocessing.estimate_scale_factors(
             obj = zp,
             frameNames = zp.get_readout_name())
+        medianValue = np.median([scaleFactors[key] for key in scaleFactors])
+        scaleFactors = dict([ (key, value / medianValue) \
+                         for key, value in scaleFactors.items() ])
     else:
         scaleFactors = pd.read_csv(scaleFactorFile)
         scaleFactors = dict(
             zip(scaleFactors.frameName, 
                 scaleFactors.value))    
->>>>>>> c1e3ee130d7256ac122fa56c033538dda702739b
 
     # normalize image intensity
     zp = preprocessing.scale_readout_images(
@@ -155,7 +148,7 @@ def run_job(dataSetName: str = None,
     
     np.savez_compressed(
             outputName, 
-            zp.get_readout_images())
+            zp.get_readout_images(copy = False))
 
     # check points
     utilities.print_checkpoint("Done")
@@ -18,7 +18,8 @@ def run_job(
     highPassFilterSigma: int=3,
     registerColor: bool=True,
     registerColorProfile: str = None,
-    saveFiducials: bool=False):
+    saveFiducials: bool=False,
+    ioThreads: int=1):
 
     """
     Reorganization and registration of MERFISH images.
@@ -57,6 +58,8 @@ def run_job(
     saveFiducials: a boolen variable indicates whether aligned fiducial
                 images are saved. Fiducial images will be saved
                 in the same folder with the same prefix.
+    
+    ioThreads: the number of threads used to load the raw images.
     """
     
     utilities.print_checkpoint("Register MERFISH images")
@@ -65,39 +68,147 @@ def run_job(
     # generate zplane object
     zp = zplane.Zplane(dataSetName,
                        fov = fov,
-                       zpos = zpos)
+                       zpos = zpos,
+                       ioThreads = ioThreads)
+
+    # load readout and fiducial images. Without saving the fiducial
+    # images, correct_drift only loads them when the drift of the field
+    # of view has not been estimated yet.
+    if saveFiducials or not registerDrift:
+        zp.load_images(zp.get_readout_name(),
+                       readoutImages = True,
+                       fiducialImages = registerDrift)
+
+    register_zplane(
+        zp = zp,
+        outputName = outputName,
+        registerDrift = registerDrift,
+        refFrameIndex = refFrameIndex,
+        highPassFilterSigma = highPassFilterSigma,
+        registerColor = registerColor,
+        registerColorProfile = registerColorProfile,
+        saveFiducials = saveFiducials)
+    utilities.print_checkpoint("Done")
+
+def run_fov_job(
+    dataSetName: str,
+    fov: int,
+    outputPath: str,
+    registerDrift: bool = True,
+    refFrameIndex: int=0,
+    highPassFilterSigma: int=3,
+    registerColor: bool=True,
+    registerColorProfile: str = None,
+    saveFiducials: bool=False,
+    ioThreads: int=1):
+
+    """
+    Reorganization and registration of the MERFISH images of all the
+    z-planes of a field of view.
+
+    The images of all the z-planes are loaded together, reading each
+    image file once, and the fiducial images are shared by the z-planes.
+    The registered images of each z-plane are saved as
+    outputPath/fov_{fov}_zpos_{zpos}.tif.
+
+    Args
+    ----
+    dataSetName: input dataset name.
+
+    fov: the field of view to be processed. 
+
+    outputPath: the folder of the output files.
+
+    The other arguments are the same as for run_job.
+    """
+    
+    utilities.print_checkpoint("Register MERFISH images of a FOV")
+    utilities.print_checkpoint("Start")
+
+    fs = zplane.FovStack(dataSetName,
+                         fov = fov,
+                         ioThreads = ioThreads)
+    fs.load_images(readoutImages = True,
+                   fiducialImages = registerDrift)
+
+    for i, zp in enumerate(fs.get_zplanes()):
+        utilities.print_checkpoint(
+            "Register zpos %s" % str(zp.get_z_position()))
+        # the drift is estimated with the first zplane and then read
+        # from the drift table, so the other zplanes only need their
+        # fiducial images to save them
+        if i > 0 and not saveFiducials:
+            zp.del_fiducial_images()
+        register_zplane(
+            zp = zp,
+            outputName = os.path.join(outputPath, 
+                "fov_%d_zpos_%s.tif" % (fov, str(zp.get_z_position()))),
+            registerDrift = registerDrift,
+            refFrameIndex = refFrameIndex,
+            highPassFilterSigma = highPassFilterSigma,
+            registerColor = registerColor,
+            registerColorProfile = registerColorProfile,
+            saveFiducials = saveFiducials)
+        zp.del_readout_images()
+        zp.del_fiducial_images()
+    utilities.print_checkpoint("Done")
+
+def register_zplane(
+    zp,
+    outputName: str,
+    registerDrift: bool = True,
+    refFrameIndex: int=0,
+    highPassFilterSigma: int=3,
+    registerColor: bool=True,
+    registerColorProfile: str = None,
+    saveFiducials: bool=False):
+
+    """
+    Register the images of a zplane and save them to outputName, with
+    the registration errors and, if saveFiducials, the fiducial images
+    in files with the same prefix. Images that are not loaded yet are
+    loaded by the registration.
+    """
 
     # create the folder
     os.makedirs(os.path.dirname(outputName), 
                 exist_ok=True)
 
-    # load readout images
-    zp.load_readout_images(zp.get_readout_name())
-    
-    # correct mechanical drift
+    profile = None
+    colorMaps = None
+    if registerColor:
+        if registerColorProfile is not None:
+            with open(registerColorProfile, "rb") as f:
+                profile = pickle.load(f)
+        else:
+            profile = zp.get_chromatic_aberration_profile()
+            colorMaps = zp.get_chromatic_aberration_maps()
+
+    # correct mechanical drift, together with the chromatic abberation
+    errors = dict()
     if registerDrift:
         (zp, errors) = registration.correct_drift(
             obj = zp,
             refFrameIndex = refFrameIndex,
-            highPassSigma = highPassFilterSigma)
+            highPassSigma = highPassFilterSigma,
+            profile = profile,
+            colorMaps = colorMaps,
+            reuseDrift = True)
     
     # correct chromatic abberation
-    if registerColor:
-        if registerColorProfile is not None:
-            profile = pickle.load(registerColorProfile)
-        else:
-            profile = zp.get_chromatic_aberration_profile()
+    elif registerColor:
         zp = registration.correct_chromatic_aberration(
             obj = zp,
-            profile = profile)
+            profile = profile,
+            colorMaps = colorMaps)
 
     # save readout images
     zp.save_readout_images(
         fileName = outputName)
 
     # save the error
-    errors = pd.DataFrame(errors.items())
-    errors.columns = ["frameName", "error"]
+    errors = pd.DataFrame(list(errors.items()),
+        columns = ["frameName", "error"])
     prefix = os.path.splitext(outputName)[0]
     errors.to_csv(
         prefix + "_err.csv",
@@ -107,5 +218,3 @@ def run_job(
     # save fiducial images
     saveFiducials and zp.save_fiducial_images(
         fileName = prefix + "_fiducial.tif")
-    utilities.print_checkpoint("Done")
-
@@ -60,7 +60,7 @@ def run_job(dataSetName: str = None,
             decodes["decodedImage"] > -1]
         
         y = np.ones(m.shape[0])
-        y[np.isin(o, dataSet.get_codebook().get_blank_indexes())] = 0
+        y[dataSet.get_codebook().is_blank(o)] = 0
         
         x = np.array([m, d]).T
 
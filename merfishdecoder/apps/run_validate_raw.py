@@ -0,0 +1,35 @@
+from merfishdecoder.core import dataset
+from merfishdecoder.util import utilities
+
+def run_job(dataSetName: str = None,
+            ioThreads: int = 16,
+            refreshFileMap: bool = False):
+
+    """
+    Check that the raw images of a MERFISH dataset are present and
+    contain all the frames specified in the data organization. Only
+    the image headers are read.
+
+    Args
+    ----
+    dataSetName: input dataset name.
+
+    ioThreads: the number of threads used to read the image headers.
+
+    refreshFileMap: a boolen variable indicates whether image files added
+                since the file map was created, for example rounds 
+                imaged during the acquisition, are mapped before the
+                validation. Only the new files are matched.
+
+    """
+
+    utilities.print_checkpoint("Validate MERFISH raw images")
+    utilities.print_checkpoint("Start")
+
+    dataSet = dataset.MERFISHDataSet(dataSetName)
+    if refreshFileMap:
+        dataSet.get_data_organization().refresh_file_map()
+    dataSet.get_data_organization().validate_file_map(
+        ioThreads = ioThreads)
+
+    utilities.print_checkpoint("Done")
@@ -0,0 +1,206 @@
+import numpy as np
+from typing import List
+from typing import Tuple
+
+class GlobalCoordinates(object):
+
+    """
+    Converts between the pixel coordinates of each field of view and
+    the global coordinates in microns, based on the stage positions of
+    the fields of view.
+
+    The positions are held as arrays so that the conversions are
+    vectorized over any number of points. The fields of view are also
+    indexed on a grid with cells the size of a field of view, so that
+    the fields of view covering a global point are found by checking
+    the few fields of view in the cell of the point.
+    """
+
+    def __init__(self, dataSet):
+        """
+        Create the global coordinates for the fields of view of a
+        MERFISH dataset.
+
+        Args:
+            dataSet: the MERFISHDataSet
+        """
+        positions = dataSet.get_stage_positions()
+        self._fovs = np.array(positions.index, dtype=np.int64)
+        self._offsets = positions[['X', 'Y']].to_numpy(dtype=np.float64)
+        self._micronsPerPixel = dataSet.get_microns_per_pixel()
+        self._fovSize = np.array(
+            dataSet.get_image_dimensions(), dtype=np.float64) \
+            * self._micronsPerPixel
+
+        # row of each field of view in the position arrays
+        self._fovRows = np.full(
+            self._fovs.max() + 1 if len(self._fovs) > 0 else 0, -1,
+            dtype=np.int64)
+        self._fovRows[self._fovs] = np.arange(len(self._fovs))
+
+        self._build_grid()
+
+    def _build_grid(self) -> None:
+        if len(self._fovs) == 0:
+            self._gridOrigin = np.zeros(2)
+            self._gridShape = np.zeros(2, dtype=np.int64)
+            self._cellFovs = np.full((0, 0), -1, dtype=np.int64)
+            return
+
+        self._gridOrigin = self._offsets.min(axis=0)
+        fovEnds = self._offsets + self._fovSize
+        self._gridShape = np.floor(
+            (fovEnds.max(axis=0) - self._gridOrigin) / self._fovSize
+            ).astype(np.int64) + 1
+
+        # each field of view covers at most 2x2 cells
+        startCells = self._point_cells(self._offsets)
+        endCells = self._point_cells(fovEnds)
+        cells = dict()
+        for row in range(len(self._fovs)):
+            for i in range(startCells[row, 0], endCells[row, 0] + 1):
+                for j in range(startCells[row, 1], endCells[row, 1] + 1):
+                    cells.setdefault(
+                        i * self._gridShape[1] + j, []).append(row)
+
+        maxFovs = max(len(x) for x in cells.values())
+        self._cellFovs = np.full(
+            (self._gridShape[0] * self._gridShape[1], maxFovs), -1,
+            dtype=np.int64)
+        for cell, rows in cells.items():
+            self._cellFovs[cell, :len(rows)] = rows
+
+    def _point_cells(self, points: np.ndarray) -> np.ndarray:
+        cells = np.floor(
+            (points - self._gridOrigin) / self._fovSize).astype(np.int64)
+        return np.clip(cells, 0, self._gridShape - 1)
+
+    def _rows(self, fovs) -> np.ndarray:
+        rows = self._fovRows[np.asarray(fovs, dtype=np.int64)]
+        if np.any(rows < 0):
+            raise KeyError('Unknown field of view in %s' % str(fovs))
+        return rows
+
+    def get_fovs(self) -> np.ndarray:
+        return self._fovs
+
+    def get_fov_offset(self, fov) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the global position of the corner of one or more fields of
+        view in microns.
+
+        Returns:
+            A tuple with the x and y offsets, with the shape of fov.
+        """
+        offsets = self._offsets[self._rows(fov)]
+        return offsets[..., 0], offsets[..., 1]
+
+    def fov_to_global(self, fov, x, y) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Convert pixel coordinates in the fields of view to global
+        coordinates in microns.
+
+        Args:
+            fov: the field of view of each point, or a single field of
+                view for all the points
+            x: the x pixel coordinates
+            y: the y pixel coordinates
+        Returns:
+            A tuple with the global x and y coordinates.
+        """
+        (offsetX, offsetY) = self.get_fov_offset(fov)
+        return (offsetX + np.asarray(x) * self._micronsPerPixel,
+                offsetY + np.asarray(y) * self._micronsPerPixel)
+
+    def global_to_fov(self, fov, globalX, globalY
+                      ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Convert global coordinates in microns to pixel coordinates in
+        the fields of view.
+
+        Args:
+            fov: the field of view of each point, or a single field of
+                view for all the points
+            globalX: the global x coordinates
+            globalY: the global y coordinates
+        Returns:
+            A tuple with the x and y pixel coordinates.
+        """
+        (offsetX, offsetY) = self.get_fov_offset(fov)
+        return ((np.asarray(globalX) - offsetX) / self._micronsPerPixel,
+                (np.asarray(globalY) - offsetY) / self._micronsPerPixel)
+
+    def find_fov(self, globalX, globalY) -> np.ndarray:
+        """
+        Find a field of view that covers each global point.
+
+        Args:
+            globalX: the global x coordinates
+            globalY: the global y coordinates
+        Returns:
+            An array with the first field of view, in the order of the
+            positions, that covers each point or -1 for points that are
+            not covered by any field of view.
+        """
+        points = np.stack(np.broadcast_arrays(
+            np.asarray(globalX, dtype=np.float64),
+            np.asarray(globalY, dtype=np.float64)), axis=-1)
+        fovs = np.full(points.shape[:-1], -1, dtype=np.int64)
+        if len(self._fovs) == 0:
+            return fovs
+
+        cells = self._point_cells(points)
+        candidates = self._cellFovs[
+            cells[..., 0] * self._gridShape[1] + cells[..., 1]]
+        for k in range(candidates.shape[-1]):
+            rows = candidates[..., k]
+            offsets = self._offsets[rows]
+            covered = (rows >= 0) & (fovs < 0) \
+                & np.all(points >= offsets, axis=-1) \
+                & np.all(points < offsets + self._fovSize, axis=-1)
+            fovs[covered] = self._fovs[rows[covered]]
+        return fovs
+
+    def get_fovs_in_box(self, minX: float, minY: float,
+                        maxX: float, maxY: float) -> List[int]:
+        """
+        Get the fields of view that overlap a box in global coordinates.
+
+        Returns:
+            A list of the fields of view in the order of the positions.
+        """
+        if len(self._fovs) == 0:
+            return []
+
+        (startCell, endCell) = self._point_cells(
+            np.array([[minX, minY], [maxX, maxY]]))
+        cells = np.arange(startCell[0], endCell[0] + 1)[:, None] \
+            * self._gridShape[1] \
+            + np.arange(startCell[1], endCell[1] + 1)[None, :]
+        rows = np.unique(self._cellFovs[cells.ravel()])
+        rows = rows[rows >= 0]
+        offsets = self._offsets[rows]
+        overlapping = (offsets[:, 0] < maxX) & (offsets[:, 1] < maxY) \
+            & (offsets[:, 0] + self._fovSize[0] > minX) \
+            & (offsets[:, 1] + self._fovSize[1] > minY)
+        return self._fovs[rows[overlapping]].tolist()
+
+    def get_overlapping_fovs(self, fov: int,
+                             minArea: float = 0) -> List[int]:
+        """
+        Get the fields of view that overlap a field of view by more
+        than minArea square microns.
+        """
+        (offsetX, offsetY) = self.get_fov_offset(fov)
+        candidates = np.array(self.get_fovs_in_box(
+            offsetX, offsetY,
+            offsetX + self._fovSize[0], offsetY + self._fovSize[1]),
+            dtype=np.int64)
+        candidates = candidates[candidates != fov]
+        (candidateX, candidateY) = self.get_fov_offset(candidates)
+        dx = np.minimum(candidateX, offsetX) + self._fovSize[0] \
+            - np.maximum(candidateX, offsetX)
+        dy = np.minimum(candidateY, offsetY) + self._fovSize[1] \
+            - np.maximum(candidateY, offsetY)
+        area = np.where((dx > 0) & (dy > 0), dx * dy, 0)
+        return candidates[area > minArea].tolist()
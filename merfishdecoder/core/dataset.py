@@ -8,22 +8,29 @@ import importlib
 import time
 import logging
 import pickle
+import hashlib
+import contextlib
 import datetime
-from matplotlib import pyplot as plt
+import threading
 from typing import List
 from typing import Tuple
 from typing import Union
 from typing import Dict
 from typing import Optional
-import h5py
-import tables
-import xmltodict
+
+try:
+    import fcntl
+except ImportError:
+    # fcntl is not available on Windows, where the drift tables are
+    # locked by creating the lock file exclusively instead
+    fcntl = None
 
 import merfishdecoder
 from merfishdecoder.util import imagereader
 from merfishdecoder.util import dataportal
 from merfishdecoder.data import codebook
 from merfishdecoder.data import dataorganization
+from merfishdecoder.core import coordinates
 
 TaskOrName = str
 
@@ -36,7 +43,8 @@ class DataSet(object):
                  dataDirectoryName: str,
                  dataHome: str = None, 
                  analysisHome: str = None,
-                 microscopeParametersHome: str = None
+                 microscopeParametersHome: str = None,
+                 rawDataCacheSize: int = None
                  ):
     
         """Create a dataset for the specified raw data.
@@ -51,6 +59,12 @@ class DataSet(object):
                     analysisHome/dataDirectoryName. If analysisHome is not
                     specified, ANALYSIS_HOME is read from the .env file.
             microscopeParametersHome: the base path for storing microscope parameter files. 
+            rawDataCacheSize: the maximum size in bytes of the local cache
+                    of raw data stored in s3 or Google Cloud. The cache
+                    is stored in analysisHome/dataDirectoryName/raw_cache.
+                    If rawDataCacheSize is not specified,
+                    RAW_DATA_CACHE_SIZE is read from the environment or
+                    the .env file.
 
         """
         if dataHome is None:
@@ -85,6 +99,13 @@ class DataSet(object):
 
         self.logPath = os.sep.join([self.analysisPath, 'logs'])
         os.makedirs(self.logPath, exist_ok=True)
+
+        if rawDataCacheSize is None:
+            rawDataCacheSize = merfishdecoder.get_raw_data_cache_size()
+        if rawDataCacheSize > 0:
+            self.rawDataPortal.set_block_cache(dataportal.BlockCache(
+                os.sep.join([self.analysisPath, 'raw_cache']),
+                rawDataCacheSize))
         
         self._store_dataset_metadata()
         
@@ -122,8 +143,12 @@ class DataSet(object):
             subdirectory: str = None) -> None:
         savePath = self._analysis_result_save_path(
             resultName, analysisName, resultIndex, subdirectory, '.json')
-        with open(savePath, 'w') as f:
+        # the result is replaced atomically so that it is never read
+        # partially written
+        tmpPath = savePath + '.%i.tmp' % os.getpid()
+        with open(tmpPath, 'w') as f:
             json.dump(analysisResult, f)
+        os.replace(tmpPath, savePath)
     
     def _analysis_result_save_path(
             self, resultName: str, analysisTask: TaskOrName,
@@ -265,6 +290,10 @@ class ImageDataSet(DataSet):
         """
         super().__init__(dataDirectoryName, dataHome, analysisHome)
 
+        self.rawStorePath = os.sep.join([self.analysisPath, 'raw_store'])
+        self.rawStorePortal = dataportal.DataPortal.create_portal(
+            self.rawStorePath)
+
         if microscopeParametersName is not None:
             self._import_microscope_parameters(
                 microscopeParametersName)
@@ -276,21 +305,36 @@ class ImageDataSet(DataSet):
         self._load_microscope_parameters()
         self._load_chromatic_aberration_profile()
 
-    def get_image_file_names(self):
+    def get_image_file_names(self, namePrefixes: List[str] = None):
+        """Get the sorted paths of the raw image files, optionally only
+        those whose names start with one of namePrefixes."""
         return sorted(self.rawDataPortal.list_files(
-            extensionList=['.dax', '.tif', '.tiff']))
+            extensionList=['.dax', '.tif', '.tiff'],
+            namePrefixes=namePrefixes))
 
     def load_image(self, imagePath, frameIndex):
-        with imagereader.infer_reader(
-                self.rawDataPortal.open_file(imagePath)) as reader:
-            imageIn = reader.load_frame(int(frameIndex))
-            if self.transpose:
-                imageIn = np.transpose(imageIn)
-            if self.flipHorizontal:
-                imageIn = np.flip(imageIn, axis=1)
-            if self.flipVertical:
-                imageIn = np.flip(imageIn, axis=0)
-            return imageIn 
+        with imagereader.open_reader(
+                self.rawDataPortal, imagePath) as reader:
+            return self.orient_image(reader.load_frame(int(frameIndex)))
+
+    def orient_image(self, image: np.ndarray,
+                     out: np.ndarray = None) -> np.ndarray:
+        """Apply the microscope orientation to a raw image.
+        Args:
+            image: the image as read from the image file
+            out: an optional array to write the oriented image into
+        Returns:
+            If out is None, a view of image with the transpose and flips
+            from the microscope parameters applied. Otherwise the oriented
+            image is copied into out in a single pass and out is returned.
+        """
+        if self.transpose:
+            image = image.T
+        image = image[self._orientationSlices]
+        if out is None:
+            return image
+        np.copyto(out, image)
+        return out
 
     def image_stack_size(self, imagePath):
         """
@@ -299,8 +343,8 @@ class ImageDataSet(DataSet):
             a three element list with [width, height, frameCount] or None
                     if the file does not exist
         """
-        with imagereader.infer_reader(self.rawDataPortal.open_file(imagePath)
-                                      ) as reader:
+        with imagereader.open_reader(
+                self.rawDataPortal, imagePath) as reader:
             return reader.film_size()
 
     def _import_microscope_parameters(self, microscopeParametersName):
@@ -349,6 +393,11 @@ class ImageDataSet(DataSet):
         self.flipVertical = self.microscopeParameters.get(
             'flip_vertical', False)
         self.transpose = self.microscopeParameters.get('transpose', True)
+        # the flips applied after the transpose reduce to a single
+        # strided view of the image
+        self._orientationSlices = (
+            slice(None, None, -1 if self.flipVertical else 1),
+            slice(None, None, -1 if self.flipHorizontal else 1))
         
         self.micronsPerPixel = self.microscopeParameters.get(
                 'microns_per_pixel', 0.108)
@@ -367,12 +416,80 @@ class ImageDataSet(DataSet):
             inputFile.close()
         else:
             self.chromaticAberrationProfile = {}
+        self._chromaticAberrationMaps = None
+        self._chromaticAberrationMapsLock = threading.Lock()
 
     def get_chromatic_aberration_profile(self):
         """Get the chromatic aberration profile."""
 
         return self.chromaticAberrationProfile
 
+    def get_chromatic_aberration_maps(self) -> Dict[str, np.ndarray]:
+        """Get the chromatic aberration profile evaluated at every pixel
+        of an oriented image.
+
+        The maps are computed once for the experiment and cached in the
+        chromatic_aberration_maps directory next to the profile, with the
+        hash of the profile they were computed from. They are computed
+        again when the hash of the profile changes.
+
+        Returns:
+            A dictionary from color to a read-only (2, rows, columns)
+            float32 array with the input row and column coordinates of
+            each output pixel.
+        """
+        with self._chromaticAberrationMapsLock:
+            if self._chromaticAberrationMaps is None:
+                self._chromaticAberrationMaps = \
+                    self._load_chromatic_aberration_maps()
+            return self._chromaticAberrationMaps
+
+    def _load_chromatic_aberration_maps(self) -> Dict[str, np.ndarray]:
+        profilePath = os.sep.join(
+                [self.analysisPath, 'chromatic_aberration.pkl'])
+        mapsPath = os.sep.join(
+                [self.analysisPath, 'chromatic_aberration_maps'])
+        if not self.chromaticAberrationProfile:
+            return {}
+        # registration imports the zplanes, which import this module
+        from merfishdecoder.util import registration
+
+        with open(profilePath, 'rb') as f:
+            profileHash = hashlib.sha256(f.read()).hexdigest()
+
+        # the oriented images are transposed from the raw images, which
+        # are imageDimensions[1] rows by imageDimensions[0] columns
+        if self.transpose:
+            shape = (self.imageDimensions[0], self.imageDimensions[1])
+        else:
+            shape = (self.imageDimensions[1], self.imageDimensions[0])
+
+        os.makedirs(mapsPath, exist_ok=True)
+        colorMaps = dict()
+        for color, transformation in \
+                self.chromaticAberrationProfile.items():
+            mapPath = os.sep.join(
+                [mapsPath, '%s_%ix%i.npy' % (color, shape[0], shape[1])])
+            hashPath = mapPath + '.sha256'
+            mapHash = None
+            if os.path.exists(mapPath) and os.path.exists(hashPath):
+                with open(hashPath, 'r') as f:
+                    mapHash = f.read().strip()
+            if mapHash != profileHash:
+                colorMap = registration.get_warp_coordinates(
+                    transformation, shape).astype(np.float32)
+                # the hash is written after the map, so a map is never
+                # used with the hash of another profile
+                tmpPath = mapPath + '.%i.tmp.npy' % os.getpid()
+                np.save(tmpPath, colorMap)
+                os.replace(tmpPath, mapPath)
+                tmpPath = hashPath + '.%i.tmp' % os.getpid()
+                with open(tmpPath, 'w') as f:
+                    f.write(profileHash)
+                os.replace(tmpPath, hashPath)
+            colorMaps[color] = np.load(mapPath, mmap_mode='r')
+        return colorMaps
+
     def get_microns_per_pixel(self):
         """Get the conversion factor to convert pixels to microns."""
 
@@ -391,11 +508,17 @@ class ImageDataSet(DataSet):
             imagePath: the path to the image file (.dax or .tif)
         Returns: the metadata from the associated xml file
         """
+        import xmltodict
         filePortal = self.rawDataPortal.open_file(
             imagePath).get_sibling_with_extension('.xml')
         return xmltodict.parse(filePortal.read_as_text())
 
 class MERFISHDataSet(ImageDataSet):
+
+    # version of the layout of the metadata snapshot, to be increased
+    # whenever the snapshot or the objects stored in it change
+    SNAPSHOT_VERSION = 1
+
     def __init__(self, dataDirectoryName: str, codebookNames: List[str] = None,
                  dataOrganizationName: str = None, positionFileName: str = None,
                  dataHome: str = None, analysisHome: str = None,
@@ -431,7 +554,14 @@ class MERFISHDataSet(ImageDataSet):
         super().__init__(dataDirectoryName, dataHome, analysisHome,
                          microscopeParametersName, 
                          microscopeChromaticAberrationName)
+        self._globalCoordinates = None
+        self._rawStoreFiducialIndexes = None
         
+        if dataOrganizationName is None and not codebookNames \
+                and positionFileName is None \
+                and self._load_metadata_snapshot():
+            return
+
         self.dataOrganization = dataorganization.DataOrganization(
                 self, dataOrganizationName)
         if codebookNames:
@@ -443,6 +573,74 @@ class MERFISHDataSet(ImageDataSet):
         if positionFileName is not None:
             self._import_positions(positionFileName)
         self._load_positions()
+        self._store_metadata_snapshot()
+
+    def _metadata_snapshot_path(self) -> str:
+        return os.sep.join([self.analysisPath, 'dataset_metadata.pkl'])
+
+    def _metadata_signature(self) -> List[Tuple[str, int, int]]:
+        """Get the modification time and size of each of the files that
+        the parsed metadata is read from.
+        """
+        metadataFiles = ['dataorganization.csv', 'filemap.csv', 
+                         'positions.csv'] + sorted(
+            x for x in os.listdir(self.analysisPath) 
+            if x.startswith('codebook_') and x.endswith('.csv'))
+        signature = []
+        for fileName in metadataFiles:
+            try:
+                fileStat = os.stat(os.sep.join([self.analysisPath, fileName]))
+            except FileNotFoundError:
+                continue
+            signature.append(
+                (fileName, fileStat.st_mtime_ns, fileStat.st_size))
+        return signature
+
+    def _store_metadata_snapshot(self) -> None:
+        """Store the parsed data organization, file map, codebooks and
+        positions in a binary snapshot so that they can be loaded without
+        parsing the csv files again.
+        """
+        snapshot = {
+            'version': self.SNAPSHOT_VERSION,
+            'signature': self._metadata_signature(),
+            'dataOrganization': self.dataOrganization.data,
+            'fileMap': self.dataOrganization.fileMap,
+            'codebooks': [(x.get_data(), x.get_codebook_index(),
+                           x.get_codebook_name()) for x in self.codebooks],
+            'positions': self.positions}
+        snapshotPath = self._metadata_snapshot_path()
+        tmpPath = snapshotPath + '.%i.tmp' % os.getpid()
+        with open(tmpPath, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpPath, snapshotPath)
+
+    def _load_metadata_snapshot(self) -> bool:
+        """Load the parsed metadata from the binary snapshot.
+        Returns:
+            True if the snapshot was loaded, False if it does not exist,
+            was stored in another snapshot layout or if any of the csv
+            files changed after it was stored.
+        """
+        try:
+            with open(self._metadata_snapshot_path(), 'rb') as f:
+                snapshot = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError,
+                AttributeError, ImportError):
+            return False
+        if not isinstance(snapshot, dict) \
+                or snapshot.get('version') != self.SNAPSHOT_VERSION:
+            return False
+        if snapshot['signature'] != self._metadata_signature():
+            return False
+
+        self.dataOrganization = \
+            dataorganization.DataOrganization.from_snapshot(
+                self, snapshot['dataOrganization'], snapshot['fileMap'])
+        self.codebooks = [codebook.Codebook.from_snapshot(self, *x)
+                          for x in snapshot['codebooks']]
+        self.positions = snapshot['positions']
+        return True
 
     def save_codebook(self, codebook: codebook.Codebook) -> None:
         """ Store the specified codebook in this dataset.
@@ -471,12 +669,6 @@ class MERFISHDataSet(ImageDataSet):
                 codebook.get_data(),
                 '_'.join(['codebook', str(codebook.get_codebook_index()),
                           codebook.get_codebook_name()]), index=False)
-        
-        if not existingCodebookName:
-            self.save_dataframe_to_csv(
-                codebook.get_data(),
-                '_'.join(['codebook', str(codebook.get_codebook_index()),
-                          codebook.get_codebook_name()]), index=False)
 
     def load_codebooks(self) -> List[codebook.Codebook]:
         """ Get all the codebooks stored within this dataset.
@@ -591,6 +783,14 @@ class MERFISHDataSet(ImageDataSet):
         # TODO - this should be implemented using the position of the fov.
         return self.positions.loc[fov]['X'], self.positions.loc[fov]['Y']
 
+    def get_global_coordinates(self) -> coordinates.GlobalCoordinates:
+        """Get the vectorized converter between the coordinates of the
+        fields of view and the global coordinate system.
+        """
+        if self._globalCoordinates is None:
+            self._globalCoordinates = coordinates.GlobalCoordinates(self)
+        return self._globalCoordinates
+
     def z_index_to_position(self, zIndex: int) -> float:
         """Get the z position associated with the provided z index."""
 
@@ -623,6 +823,58 @@ class MERFISHDataSet(ImageDataSet):
         # TODO - check this function
         return np.unique(self.dataOrganization.fileMap['imagingRound'])
     
+    def get_raw_store_file_name(self, fov: int, 
+                                existingOnly: bool = True) -> Optional[str]:
+        """Get the name of the raw image store file for a field of view.
+        Args:
+            fov: index of the field of view
+            existingOnly: if True, None is returned when the field of view
+                has not been converted into the raw image store
+        Returns:
+            The path of the store file in rawStorePath.
+        """
+        storeFileName = os.sep.join(
+            [self.rawStorePath, 'fov_%04d.h5' % fov])
+        if existingOnly and not os.path.exists(storeFileName):
+            return None
+        return storeFileName
+
+    def get_raw_store_frame_index(self, dataChannel: int,
+                                  zPosition: float) -> int:
+        """Get the index of a readout frame in the raw image store.
+        Readout frames are stored in (data channel, z) order.
+        """
+        zPositions = self.get_z_positions()
+        return dataChannel * len(zPositions) + zPositions.index(zPosition)
+
+    def get_raw_store_fiducial_indexes(self) -> Dict[int, int]:
+        """Get the index of the fiducial frame of each data channel among
+        the fiducial frames of the raw image store. Data channels that
+        share a frame of the same fiducial image share one stored frame,
+        in the order of the data channels.
+        """
+        if self._rawStoreFiducialIndexes is None:
+            fiducialFrames = dict()
+            fiducialIndexes = dict()
+            for dataChannel, channelInfo in zip(
+                    self.dataOrganization.get_data_channels(),
+                    self.dataOrganization.data.itertuples()):
+                fiducialFrame = (channelInfo.fiducialImageType,
+                                 int(channelInfo.fiducialImagingRound),
+                                 int(channelInfo.fiducialFrame))
+                fiducialIndexes[int(dataChannel)] = fiducialFrames.setdefault(
+                    fiducialFrame, len(fiducialFrames))
+            self._rawStoreFiducialIndexes = fiducialIndexes
+        return self._rawStoreFiducialIndexes
+
+    def get_raw_store_fiducial_frame_index(self, dataChannel: int) -> int:
+        """Get the index of a fiducial frame in the raw image store.
+        Fiducial frames are stored after all the readout frames.
+        """
+        return len(self.dataOrganization.data) \
+            * len(self.get_z_positions()) \
+            + self.get_raw_store_fiducial_indexes()[int(dataChannel)]
+
     def get_raw_image(self, dataChannel, fov, zPosition):
         return self.load_image(
                 self.dataOrganization.get_image_filename(dataChannel, fov),
@@ -633,3 +885,145 @@ class MERFISHDataSet(ImageDataSet):
         return self.load_image(
                 self.dataOrganization.get_fiducial_filename(dataChannel, fov),
                 self.dataOrganization.get_fiducial_frame_index(dataChannel))
+
+    def get_drift_table_file_name(self, fov: int) -> str:
+        """Get the name of the drift table file for a field of view."""
+        return os.sep.join(
+            [self.analysisPath, 'drift', 'fov_%04d.csv' % fov])
+
+    def load_drift_table(self, fov: int) -> Optional[pandas.DataFrame]:
+        """Load the drift offsets that were estimated for a field of view.
+        The fiducial frames only depend on the data channel and the field
+        of view, so the offsets are shared by all the z positions.
+        Args:
+            fov: index of the field of view
+        Returns:
+            A data frame with the readoutName, referenceName, highPassSigma,
+            upsampleFactor, dataVersion, rowShift, columnShift and error
+            of each estimated offset, or
+            None if no offsets were saved for the field of view.
+        """
+        fileName = self.get_drift_table_file_name(fov)
+        if not os.path.exists(fileName):
+            return None
+        return pandas.read_csv(
+            fileName, dtype={'readoutName': str, 'referenceName': str,
+                             'dataVersion': str},
+            float_precision='round_trip')
+
+    @contextlib.contextmanager
+    def lock_drift_table(self, fov: int):
+        """Hold an exclusive lock on the drift table of a field of view,
+        shared by all the processes that use the analysis path, for
+        the duration of a with block.
+        """
+        lockFileName = os.path.splitext(
+            self.get_drift_table_file_name(fov))[0] + '.lock'
+        os.makedirs(os.path.dirname(lockFileName), exist_ok=True)
+        if fcntl is None:
+            with _exclusive_file_lock(lockFileName + '.excl'):
+                yield
+            return
+
+        with open(lockFileName, 'a') as lockFile:
+            fcntl.flock(lockFile, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+    def save_drift_table(self, fov: int,
+                         driftTable: pandas.DataFrame) -> None:
+        """Save the drift offsets of a field of view, replacing the saved
+        table. The table is written to a temporary file first so that
+        jobs reading it concurrently see either the old or the new table.
+        """
+        fileName = self.get_drift_table_file_name(fov)
+        os.makedirs(os.path.dirname(fileName), exist_ok=True)
+        tmpFileName = fileName + '.%i.tmp' % os.getpid()
+        driftTable.to_csv(tmpFileName, index=False, float_format='%.17g')
+        os.replace(tmpFileName, fileName)
+
+
+@contextlib.contextmanager
+def _exclusive_file_lock(lockFileName: str, pollInterval: float = 0.05,
+                         staleSeconds: float = 600):
+    """Hold a lock by creating a file that does not exist yet, for the
+    duration of a with block. A lock file that was not modified for
+    staleSeconds was left by a process that ended while holding the
+    lock and is removed.
+    """
+    while True:
+        try:
+            lockFile = os.open(
+                lockFileName, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lockFileName) \
+                        > staleSeconds:
+                    os.remove(lockFileName)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(pollInterval)
+    try:
+        os.write(lockFile, str(os.getpid()).encode())
+        os.close(lockFile)
+        yield
+    finally:
+        os.remove(lockFileName)
+
+
+_dataSetRegistry = dict()
+_dataSetRegistryLock = threading.Lock()
+
+
+def get_merfish_dataset(dataSetName: str, dataHome: str = None,
+                        analysisHome: str = None,
+                        codebookNames: List[str] = None,
+                        dataOrganizationName: str = None,
+                        positionFileName: str = None,
+                        microscopeParametersName: str = None,
+                        microscopeChromaticAberrationName: str = None
+                        ) -> MERFISHDataSet:
+    """Get the MERFISHDataSet for an existing analysis. The data set is
+    created the first time it is requested and shared by all the later
+    requests in this process that are made with the same arguments.
+    Args:
+        dataSetName: the relative directory to the raw data
+        dataHome: the base path to the data. If dataHome is not specified,
+                DATA_HOME is used.
+        analysisHome: the base path for storing analysis results. If
+                analysisHome is not specified, ANALYSIS_HOME is used.
+        codebookNames, dataOrganizationName, positionFileName,
+        microscopeParametersName, microscopeChromaticAberrationName:
+                passed to MERFISHDataSet.
+    Returns:
+        The shared MERFISHDataSet.
+    """
+    dataHome = merfishdecoder.DATA_HOME if dataHome is None else dataHome
+    analysisHome = merfishdecoder.ANALYSIS_HOME \
+        if analysisHome is None else analysisHome
+    key = (dataSetName, dataHome, analysisHome,
+           None if codebookNames is None else tuple(codebookNames),
+           dataOrganizationName, positionFileName,
+           microscopeParametersName, microscopeChromaticAberrationName)
+    with _dataSetRegistryLock:
+        if key not in _dataSetRegistry:
+            _dataSetRegistry[key] = MERFISHDataSet(
+                dataSetName, codebookNames=codebookNames,
+                dataOrganizationName=dataOrganizationName,
+                positionFileName=positionFileName,
+                dataHome=dataHome, analysisHome=analysisHome,
+                microscopeParametersName=microscopeParametersName,
+                microscopeChromaticAberrationName=\
+                    microscopeChromaticAberrationName)
+        return _dataSetRegistry[key]
+
+
+def clear_merfish_datasets() -> None:
+    """Remove all the shared data sets so that they are created again
+    the next time they are requested."""
+    with _dataSetRegistryLock:
+        _dataSetRegistry.clear()
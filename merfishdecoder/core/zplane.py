@@ -1,16 +1,115 @@
 import os
+import hashlib
 import tifffile
+import threading
 import numpy as np
 from copy import copy 
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from merfishdecoder.util  import imagereader
 from merfishdecoder.core  import dataset
 
+class ImageStack(object):
+
+    """
+    A (frames, height, width) array that holds the images of a
+    set of frames. The image of each frame is a view into the array,
+    so that the images of several frames can be used together
+    without stacking them.
+
+    A frame is attached to the stack while its image is the view into
+    the array. An image with a different shape or dtype than the array
+    is held on its own as long as other frames are still attached to
+    the array, so that the array is never duplicated. The array is
+    released once no frame is attached to it, and the next image is
+    stored in a new array. The pages of a new array are only committed
+    as images are written into it.
+    """
+
+    def __init__(self, frameCount: int):
+        self._frameCount = frameCount
+        self._images = None
+        self._views = None
+        self._attached = [False] * frameCount
+        self._lock = threading.Lock()
+
+    def get_slot(self, index: int, shape: tuple,
+                 dtype: np.dtype) -> np.ndarray:
+        """
+        
+        Get the view that holds the image of a frame so that the image
+        can be written into it directly, or None if the image cannot
+        be held in the stack because other frames are still attached
+        to an array of a different shape or dtype.
+        
+        """
+        dtype = np.dtype(dtype).newbyteorder('=')
+        with self._lock:
+            if self._images is None or self._images.dtype != dtype \
+                    or self._images.shape[1:] != tuple(shape):
+                if any(self._attached[:index] + \
+                       self._attached[index + 1:]):
+                    self._attached[index] = False
+                    return None
+                self._images = np.empty(
+                    (self._frameCount,) + tuple(shape), dtype = dtype)
+                self._views = list(self._images)
+                self._attached = [False] * self._frameCount
+            self._attached[index] = True
+            return self._views[index]
+
+    def _detach(self, index: int):
+        with self._lock:
+            self._attached[index] = False
+            if not any(self._attached):
+                self._images = None
+                self._views = None
+
+    def store(self, index: int, img: np.ndarray) -> np.ndarray:
+        """
+        
+        Store the image of a frame and return the array that the frame
+        should hold, which is the view into the stack when possible.
+        
+        """
+        if img is None or img.ndim != 2:
+            self._detach(index)
+            return img
+        
+        view = self.get_slot(index, img.shape, img.dtype)
+        if view is None:
+            self._detach(index)
+            return img
+        if img is not view:
+            np.copyto(view, img)
+        return view
+
+    def get_images(self, indexes: list) -> np.ndarray:
+        """
+        
+        Get the images of frames as a read-only view of the stack, or 
+        None if any of the frames is not attached or the frames are 
+        not adjacent in the stack. The view aliases the stack, so it 
+        changes when an image is stored into one of the frames again.
+        
+        """
+        if self._images is None or len(indexes) == 0:
+            return None
+        if not all(self._attached[i] for i in indexes):
+            return None
+        if list(indexes) != list(range(indexes[0], indexes[-1] + 1)):
+            return None
+        images = self._images[indexes[0]:indexes[-1] + 1]
+        images.setflags(write = False)
+        return images
+
 class Frame(object):
     def __init__(self, 
         dataSet, 
         fov: int = None, 
         zpos: float = None,
-        readoutName: str = None):
+        readoutName: str = None,
+        rawStoreFileName: str = None):
 
         """
         
@@ -25,37 +124,53 @@ class Frame(object):
             
             readoutName: A string indicates the specific the frame name.
                 Also known as frame name.
+            
+            rawStoreFileName: The raw image store file of the field of
+                view, or None if it was not converted.
         
         """
         
         self._dataSet = dataSet;
+        self._readoutStack = None;
+        self._fiducialStack = None;
+        self._stackIndex = None;
         self._fiducial = None;
         self._img = None;
         self._zpos = zpos;
         self._fov = fov;
         self._readoutName = readoutName;
         
-        bit_i = self._dataSet.dataOrganization.data["channelName"][
-            int(np.where(self._dataSet.dataOrganization.data["readoutName"] == readoutName)[0])];
+        dataOrganization = self._dataSet.dataOrganization;
+        dataChannel = dataOrganization.get_data_channel_index(
+            dataOrganization.get_data_channel_name(
+                dataOrganization.get_data_channel_for_bit(readoutName)));
 
-        self._fiducial_file_name = \
-            self._dataSet.dataOrganization.get_fiducial_filename(
-            self._dataSet.dataOrganization.get_data_channel_index(bit_i),
-            fov);
+        self._fiducial_file_name = dataOrganization.get_fiducial_filename(
+            dataChannel, fov);
 
-        self._fiducial_frame_index = self._dataSet.dataOrganization.get_fiducial_frame_index(
-            self._dataSet.dataOrganization.get_data_channel_index(bit_i));
+        self._fiducial_frame_index = dataOrganization.get_fiducial_frame_index(
+            dataChannel);
             
-        self._image_file_name = self._dataSet.dataOrganization.get_image_filename(
-            self._dataSet.dataOrganization.get_data_channel_index(bit_i),
-            fov);
+        self._image_file_name = dataOrganization.get_image_filename(
+            dataChannel, fov);
+
+        self._image_frame_index = dataOrganization.get_image_frame_index(
+            dataChannel, zpos);
 
-        self._image_frame_index = self._dataSet.dataOrganization.get_image_frame_index(
-            self._dataSet.dataOrganization.get_data_channel_index(bit_i),
-            zpos);
+        self._image_color = dataOrganization.get_data_channel_color(
+            dataChannel);
 
-        self._image_color = self._dataSet.dataOrganization.get_data_channel_color(
-            self._dataSet.dataOrganization.get_data_channel_index(bit_i));
+        # frames of converted fields of view are read from the raw
+        # image store instead of the raw image files
+        self._dataPortal = self._dataSet.rawDataPortal;
+        if rawStoreFileName is not None:
+            self._dataPortal = self._dataSet.rawStorePortal;
+            self._image_file_name = rawStoreFileName;
+            self._image_frame_index = \
+                self._dataSet.get_raw_store_frame_index(dataChannel, zpos);
+            self._fiducial_file_name = rawStoreFileName;
+            self._fiducial_frame_index = \
+                self._dataSet.get_raw_store_fiducial_frame_index(dataChannel);
                 
     def get_image_color(self):
         """
@@ -65,26 +180,86 @@ class Frame(object):
         """
         return self._image_color
 
-    def load_readout_raw_image(self):
+    def set_image_stacks(self, 
+                         readoutStack: ImageStack,
+                         fiducialStack: ImageStack,
+                         stackIndex: int):
         """
     
-        Load readout raw image
+        Hold the readout and fiducial images of this frame in image 
+        stacks shared with other frames
     
         """
-        movie = imagereader.infer_reader(
-                self._dataSet.rawDataPortal.open_file(self._image_file_name));
+        self._readoutStack = readoutStack
+        self._fiducialStack = fiducialStack
+        self._stackIndex = stackIndex
+        self._img = self._img
+        self._fiducial = self._fiducial
+
+    @property
+    def _img(self):
+        return self._readoutImage
+
+    @_img.setter
+    def _img(self, img):
+        if self._readoutStack is not None:
+            img = self._readoutStack.store(self._stackIndex, img)
+        self._readoutImage = img
 
-        img = movie.load_frame(
-            self._image_frame_index)
+    @property
+    def _fiducial(self):
+        return self._fiducialImage
 
-        if self._dataSet.transpose:
-            img = np.transpose(img)
-        if self._dataSet.flipHorizontal:
-            img = np.flip(img, axis=1)
-        if self._dataSet.flipVertical:
-            img = np.flip(img, axis=0)
-        self._img = img.copy()
-        movie.close()
+    @_fiducial.setter
+    def _fiducial(self, img):
+        if self._fiducialStack is not None:
+            img = self._fiducialStack.store(self._stackIndex, img)
+        self._fiducialImage = img
+
+    def _orient_raw_image_into(self, img, imageStack):
+        """
+    
+        Apply the microscope orientation to a raw image, writing it 
+        into the image stack when there is one
+    
+        """
+        if imageStack is None:
+            return self._orient_raw_image(img)
+        
+        img = self._dataSet.orient_image(img)
+        out = imageStack.get_slot(self._stackIndex, img.shape, img.dtype)
+        if out is None:
+            return img.copy()
+        np.copyto(out, img)
+        return out
+
+    def _orient_raw_image(self, img):
+        """
+    
+        Apply the microscope orientation to a raw image and copy
+        it into a new contiguous array in a single pass
+    
+        """
+        return self._dataSet.orient_image(img).copy()
+
+    def set_readout_raw_image(self, img):
+        """
+    
+        Set readout raw image from a frame read from the image file
+    
+        """
+        self._img = self._orient_raw_image_into(img, self._readoutStack)
+
+    def load_readout_raw_image(self):
+        """
+    
+        Load readout raw image
+    
+        """
+        with imagereader.open_reader(
+                self._dataPortal, self._image_file_name) as movie:
+            self.set_readout_raw_image(movie.load_frame(
+                self._image_frame_index))
 
     def get_readout_image(self):
         """
@@ -94,25 +269,26 @@ class Frame(object):
         """
         return self._img
 
+    def set_fiducial_raw_image(self, img):
+        """
+    
+        Set fiducial raw image from a frame read from the image file
+    
+        """
+        self._fiducial = self._orient_raw_image_into(
+            img, self._fiducialStack)
+
     def load_fiducial_raw_image(self):
         """
     
         Load fiducial raw image
     
         """
-        movie = imagereader.infer_reader(
-                self._dataSet.rawDataPortal.open_file(
-                self._fiducial_file_name));
-        img = movie.load_frame(
-            self._fiducial_frame_index)
-        if self._dataSet.transpose:
-            img = np.transpose(img)
-        if self._dataSet.flipHorizontal:
-            img = np.flip(img, axis=1)
-        if self._dataSet.flipVertical:
-            img = np.flip(img, axis=0)
-        self._fiducial = img.copy()
-        movie.close()
+        with imagereader.open_reader(
+                self._dataPortal,
+                self._fiducial_file_name) as movie:
+            self.set_fiducial_raw_image(movie.load_frame(
+                self._fiducial_frame_index))
     
     def get_fiducial_image(self):
         """
@@ -128,7 +304,6 @@ class Frame(object):
         Remove readout raw image
     
         """
-        del self._img
         self._img = None
 
     def del_fiducial_raw_image(self):
@@ -137,8 +312,7 @@ class Frame(object):
         Remove fiducial raw image
     
         """
-        del self._fiducial
-        self._img = None
+        self._fiducial = None
         
 class Zplane(object):
     
@@ -164,7 +338,10 @@ class Zplane(object):
     def __init__(self, 
                  dataSetName: str = None,
                  fov: int = None,
-                 zpos: float = None):
+                 zpos: float = None,
+                 ioThreads: int = 1,
+                 stackBacked: bool = False,
+                 stackedReadoutNames: list = None):
         
         """
         
@@ -177,18 +354,44 @@ class Zplane(object):
             
             zpos: A float number indicates the zpos of the frame.
             
+            ioThreads: Number of threads used to load images.
+            
+            stackBacked: A boolen variable indicates whether the readout
+                and fiducial images are held in two preallocated 
+                (frames, height, width) stacks, with the image of each
+                frame being a view into its stack. The images of adjacent
+                frames are then returned as a read-only view instead
+                of a copy.
+            
+            stackedReadoutNames: A list of readout names whose images
+                are held in the stacks when stackBacked is set. All the
+                readouts are stacked if it is None.
+            
         """
                  
-        self._dataSet = dataset.MERFISHDataSet(
-            dataDirectoryName = dataSetName);
+        self._dataSet = dataset.get_merfish_dataset(dataSetName);
         readoutNames = \
             self._dataSet.dataOrganization.data["readoutName"]
+        # the raw image store of the field of view is resolved once
+        rawStoreFileName = self._dataSet.get_raw_store_file_name(fov)
         self._frames = dict(zip(readoutNames, 
             [ Frame(self._dataSet, fov = fov,
-            zpos = zpos, readoutName = x) \
+            zpos = zpos, readoutName = x,
+            rawStoreFileName = rawStoreFileName) \
             for x in readoutNames ]))
         self._fov = fov
         self._zpos = zpos
+        self._ioThreads = ioThreads
+        self._readoutStack = None
+        self._fiducialStack = None
+        if stackBacked:
+            stackedReadoutNames = list(readoutNames) \
+                if stackedReadoutNames is None else stackedReadoutNames
+            self._readoutStack = ImageStack(len(stackedReadoutNames))
+            self._fiducialStack = ImageStack(len(stackedReadoutNames))
+            for i, rn in enumerate(stackedReadoutNames):
+                self._frames[rn].set_image_stacks(
+                    self._readoutStack, self._fiducialStack, i)
         os.chdir(self._dataSet.analysisPath)
         
     def get_data_path(self) -> str:
@@ -407,12 +610,154 @@ class Zplane(object):
         
         Load readout images from a list readout names.
         
+        """
+        self.load_images(readoutNames,
+                         readoutImages = True,
+                         fiducialImages = False)
+
+    def load_images(self,
+                    readoutNames: list = None,
+                    readoutImages: bool = True,
+                    fiducialImages: bool = True,
+                    ioThreads: int = None):
+    
+        """
+        
+        Load readout and/or fiducial images from a list of readout 
+        names. The requested frames are grouped by image file so that
+        each file is read once, in frame order, with adjacent frames
+        read together. If ioThreads is larger than 1, the image files
+        are read concurrently by a pool of ioThreads threads.
+        
+        """
+        requests = dict()
+        self._add_frame_requests(requests, readoutNames,
+                                 readoutImages, fiducialImages)
+        self._load_frame_requests(
+            requests, self._ioThreads if ioThreads is None else ioThreads)
+
+    def _add_frame_requests(self,
+                            requests: dict,
+                            readoutNames: list = None,
+                            readoutImages: bool = True,
+                            fiducialImages: bool = True):
+    
+        """
+        
+        Add the frames of a list of readout names to a dictionary that
+        groups the requested frames by image file.
+        
         """
         readoutNames = self.get_readout_name() \
             if readoutNames is None else readoutNames 
+
+        if readoutImages:
+            for rn in readoutNames:
+                frame = self._frames[rn]
+                requests.setdefault(
+                    (frame._dataPortal, frame._image_file_name), []).append(
+                    (int(frame._image_frame_index),
+                     frame.set_readout_raw_image))
+        if fiducialImages:
+            # each fiducial frame is loaded once for all the readouts 
+            # that share it
+            for groupNames in self.get_fiducial_groups(readoutNames):
+                frame = self._frames[groupNames[0]]
+                requests.setdefault(
+                    (frame._dataPortal, frame._fiducial_file_name), []).append(
+                    (int(frame._fiducial_frame_index),
+                     partial(self._set_shared_fiducial_raw_image, 
+                             groupNames)))
+
+    def _set_shared_fiducial_raw_image(self, 
+                                       readoutNames: list,
+                                       img: np.ndarray):
+    
+        """
         
+        Set the fiducial raw image of the first readout name and share
+        the oriented image with the other readout names.
+        
+        """
+        frame = self._frames[readoutNames[0]]
+        frame.set_fiducial_raw_image(img)
+        for rn in readoutNames[1:]:
+            self._frames[rn]._fiducial = frame.get_fiducial_image()
+
+    def get_fiducial_groups(self, 
+                            readoutNames: list = None) -> list:
+    
+        """
+        
+        Group readout names by their fiducial image. Readouts from the
+        same imaging round share the fiducial frame of the same image
+        file. The groups are in the order of their first readout name.
+        
+        """
+        readoutNames = self.get_readout_name() \
+            if readoutNames is None else readoutNames 
+
+        groups = dict()
         for rn in readoutNames:
-            self.load_readout_image_from_readout_name(rn)
+            frame = self._frames[rn]
+            groups.setdefault(
+                (frame._dataPortal, frame._fiducial_file_name,
+                 int(frame._fiducial_frame_index)), []).append(rn)
+        return list(groups.values())
+
+    def _load_frame_requests(self, 
+                             requests: dict,
+                             ioThreads: int = 1):
+    
+        """
+        
+        Load the frames requested from each image file, reading the
+        image files concurrently if ioThreads is larger than 1.
+        
+        """
+        if ioThreads > 1 and len(requests) > 1:
+            # each task places its frames before returning, so at most 
+            # ioThreads files worth of frames are in flight at once
+            with ThreadPoolExecutor(max_workers = ioThreads) as executor:
+                list(executor.map(self._load_file_frames, 
+                                  requests.items()))
+        else:
+            for fileRequests in requests.items():
+                self._load_file_frames(fileRequests)
+
+    def _load_file_frames(self, fileRequests: tuple):
+    
+        """
+        
+        Load the frames requested from a single image file and pass
+        each of them to the frame that requested it.
+        
+        """
+        ((dataPortal, fileName), frameRequests) = fileRequests
+        with imagereader.open_reader(dataPortal, fileName) as movie:
+            self._load_movie_frames(movie, frameRequests)
+
+    def _load_movie_frames(self, movie, frameRequests: list):
+    
+        """
+        
+        Pass each of the frames requested from an open reader to the
+        frame that requested it.
+        
+        """
+        if movie.is_memory_mapped():
+            # frames are views into the file, so each frame is copied
+            # only once, when it is oriented
+            for (frameIndex, setImage) in frameRequests:
+                setImage(movie.load_frame(frameIndex))
+            return
+
+        frameIndexes = sorted(set(x[0] for x in frameRequests))
+        framePositions = dict(
+            (f, i) for i, f in enumerate(frameIndexes))
+        movieFrames = movie.load_frames(frameIndexes)
+        for (frameIndex, setImage) in frameRequests:
+            setImage(movieFrames[framePositions[frameIndex]])
     
     def get_readout_image_from_readout_name(self, 
                                             readoutName: str
@@ -429,20 +774,61 @@ class Zplane(object):
             ].get_readout_image()
     
     def get_readout_images(self,
-                           readoutNames: list=None):    
+                           readoutNames: list=None,
+                           copy: bool = True):    
 
         """
         
-        Get readout images from a list of readout names
+        Get readout images from a list of readout names. For a stack
+        backed zplane and copy set to False, the images of adjacent 
+        frames are returned as a read-only view of the stack instead 
+        of a copy. The view changes when the images of the frames are
+        set again, so it should only be used before that.
         
         """
 
         readoutNames = self.get_readout_name() \
             if readoutNames is None else readoutNames 
         
+        images = self._get_stack_images(
+            self._readoutStack, readoutNames)
+        if images is not None:
+            return images.copy() if copy else images
+
         return np.array([ 
             self.get_readout_image_from_readout_name(rn) \
             for rn in readoutNames ])
+
+    def _get_stack_images(self, 
+                          imageStack: ImageStack,
+                          readoutNames: list) -> np.ndarray:
+
+        """
+        
+        Get the images of a list of readout names as a read-only view
+        of an image stack, or None if they are not adjacent in the stack.
+        Frames that were held on their own while the dtype of the stack
+        changed are stored back into the stack first.
+        
+        """
+        
+        if imageStack is None:
+            return None
+        
+        frames = [ self._frames[rn] for rn in readoutNames ]
+        if any(frame._stackIndex is None for frame in frames):
+            return None
+        
+        indexes = [ frame._stackIndex for frame in frames ]
+        images = imageStack.get_images(indexes)
+        if images is None:
+            for frame in frames:
+                if imageStack is frame._readoutStack:
+                    frame._img = frame._img
+                else:
+                    frame._fiducial = frame._fiducial
+            images = imageStack.get_images(indexes)
+        return images
         
     
     def load_fiducial_image_from_readout_name(self, 
@@ -464,11 +850,9 @@ class Zplane(object):
         Load fiducial images from a list of readout names.
         
         """
-        if readoutNames == None:
-            readoutNames = self.get_readout_name()
-        
-        for rn in readoutNames:
-            self.load_fiducial_image_from_readout_name(rn)
+        self.load_images(readoutNames,
+                         readoutImages = False,
+                         fiducialImages = True)
     
     def get_fiducial_image_from_readout_name(self, 
                                              readoutName: str = None
@@ -484,18 +868,28 @@ class Zplane(object):
             readoutName].get_fiducial_image()
     
     def get_fiducial_images(self,
-                            readoutNames: list= None
+                            readoutNames: list= None,
+                            copy: bool = True
                             ) -> np.ndarray:    
 
         """
         
-        Get fiducial images from a list of readout names.
+        Get fiducial images from a list of readout names. For a stack
+        backed zplane and copy set to False, the images of adjacent 
+        frames are returned as a read-only view of the stack instead 
+        of a copy. The view changes when the images of the frames are
+        set again, so it should only be used before that.
         
         """
         
         readoutNames = self.get_readout_name() \
             if readoutNames is None else readoutNames 
         
+        images = self._get_stack_images(
+            self._fiducialStack, readoutNames)
+        if images is not None:
+            return images.copy() if copy else images
+
         return np.array([ 
             self.get_fiducial_image_from_readout_name(rn) \
             for rn in readoutNames ])
@@ -559,11 +953,11 @@ class Zplane(object):
         Save readout images into a tif file
         
         """
-        tifffile.imwrite(file = fileName, 
+        tifffile.imwrite(fileName, 
                 data = self.get_readout_images(
                     self.get_readout_name()      \
                     if readoutNames is None else \
-                    readoutNames).astype(np.uint16))
+                    readoutNames, copy = False).astype(np.uint16))
 
     def save_fiducial_images(self, 
                              fileName: str = None, 
@@ -575,11 +969,11 @@ class Zplane(object):
         
         """
 
-        tifffile.imwrite(file = fileName, 
+        tifffile.imwrite(fileName, 
                 data = self.get_fiducial_images(
                     self.get_readout_name()      \
                     if readoutNames is None else \
-                    readoutNames).astype(np.uint16))
+                    readoutNames, copy = False).astype(np.uint16))
 
     def get_chromatic_aberration_profile(self):
 
@@ -591,6 +985,68 @@ class Zplane(object):
         return \
             self._dataSet.get_chromatic_aberration_profile()
 
+    def get_chromatic_aberration_maps(self):
+
+        """
+        
+        Get chromatic abberation correction profiles evaluated at
+        every pixel, as remap tables for each color.
+        
+        """
+        return \
+            self._dataSet.get_chromatic_aberration_maps()
+
+    def load_drift_table(self):
+
+        """
+
+        Load the drift offsets saved for the field of view, which are
+        shared by all the zplanes of the field of view.
+
+        """
+        return \
+            self._dataSet.load_drift_table(self._fov)
+
+    def lock_drift_table(self):
+
+        """
+
+        Lock the drift table of the field of view for the duration of
+        a with block.
+
+        """
+        return self._dataSet.lock_drift_table(self._fov)
+
+    def get_fiducial_version(self,
+                             readoutNames: list = None) -> str:
+
+        """
+
+        Get an identifier of the fiducial images of the readout names,
+        which changes when any of their image files changes.
+
+        """
+        fiducialVersion = hashlib.sha256()
+        for group in self.get_fiducial_groups(readoutNames):
+            frame = self._frames[group[0]]
+            with frame._dataPortal.open_file(
+                    frame._fiducial_file_name) as filePortal:
+                fileVersion = filePortal.get_version()
+            fiducialVersion.update(('%s:%i:%s\n' % (
+                frame._fiducial_file_name,
+                int(frame._fiducial_frame_index),
+                fileVersion)).encode())
+        return fiducialVersion.hexdigest()
+
+    def save_drift_table(self, driftTable):
+
+        """
+
+        Save the drift offsets of the field of view.
+
+        """
+        self._dataSet.save_drift_table(self._fov, driftTable)
+
     def load_warped_images(self, filename):
 
         """
@@ -630,3 +1086,133 @@ class Zplane(object):
         del movie
 
     
+
+class FovStack(object):
+    
+    """
+    Purpuse: 
+        A fov stack object holds the zplanes of all the z positions
+            of a field of view, so that the images of all the 
+            zplanes are loaded together.
+
+    Args: 
+        fov: an integer indicates the field of view.
+    
+        zpos: a list of the z positions to be included. If it is
+            None, all the z positions of the dataset are included.
+
+    Returns: 
+        Return a FovStack object
+        
+    """
+
+    def __init__(self, 
+                 dataSetName: str = None,
+                 fov: int = None,
+                 zpos: list = None,
+                 ioThreads: int = 1,
+                 stackBacked: bool = False,
+                 stackedReadoutNames: list = None):
+        
+        """
+        
+        Create a new FovStack object from a MERFISH dataset.
+        
+        Args:
+            dataSetName: MERFISH dataset name.
+            
+            fov: An integer indicates the field of view.
+            
+            zpos: A list of the z positions to be included.
+            
+            ioThreads: Number of threads used to load images.
+            
+            stackBacked: A boolen variable indicates whether the images
+                of each zplane are held in image stacks.
+            
+        """
+        
+        zpos = dataset.get_merfish_dataset(dataSetName).get_z_positions() \
+            if zpos is None else zpos
+        self._zplanes = dict(
+            (z, Zplane(dataSetName, fov = fov, zpos = z, 
+                       ioThreads = ioThreads, stackBacked = stackBacked)) \
+            for z in zpos)
+        self._fov = fov
+        self._ioThreads = ioThreads
+    
+    def get_fov(self) -> int:
+        
+        """
+        
+        Get field of view
+        
+        """
+        
+        return self._fov
+
+    def get_z_positions(self) -> list:
+        
+        """
+        
+        Get the z positions of the zplanes
+        
+        """
+        
+        return list(self._zplanes.keys())
+    
+    def get_zplane(self, zpos: float) -> Zplane:
+        
+        """
+        
+        Get the zplane of a z position
+        
+        """
+        
+        return self._zplanes[zpos]
+
+    def get_zplanes(self) -> list:
+        
+        """
+        
+        Get the zplanes of all the z positions
+        
+        """
+        
+        return list(self._zplanes.values())
+
+    def load_images(self,
+                    readoutNames: list = None,
+                    readoutImages: bool = True,
+                    fiducialImages: bool = True,
+                    ioThreads: int = None):
+    
+        """
+        
+        Load readout and/or fiducial images of all the zplanes. The 
+        frames of all the z positions are grouped by image file so that
+        each file is read once, in frame order. The fiducial images do
+        not depend on the z position, so they are loaded once and shared
+        by all the zplanes.
+        
+        """
+        
+        zplanes = self.get_zplanes()
+        if len(zplanes) == 0:
+            return
+
+        requests = dict()
+        for i, zp in enumerate(zplanes):
+            zp._add_frame_requests(requests, readoutNames,
+                                   readoutImages = readoutImages,
+                                   fiducialImages = fiducialImages and i == 0)
+        zplanes[0]._load_frame_requests(
+            requests, self._ioThreads if ioThreads is None else ioThreads)
+
+        if fiducialImages:
+            readoutNames = zplanes[0].get_readout_name() \
+                if readoutNames is None else readoutNames
+            for zp in zplanes[1:]:
+                for rn in readoutNames:
+                    zp.get_frame_by_readout_name(rn)._fiducial = \
+                        zplanes[0].get_fiducial_image_from_readout_name(rn)
@@ -57,8 +57,54 @@ class Codebook(object):
             codebookName = os.path.splitext(os.path.basename(filePath))[0]
         self._codebookName = codebookName
         self._codebookIndex = codebookIndex
+        self._build_barcode_arrays()
         self._dataSet.save_codebook(self)
 
+    @classmethod
+    def from_snapshot(cls, dataSet, data: pandas.DataFrame,
+                      codebookIndex: int = 0,
+                      codebookName: str = None) -> 'Codebook':
+        """
+        Create a Codebook from a codebook that was parsed previously,
+        without reading or storing any files.
+        """
+        newCodebook = cls.__new__(cls)
+        newCodebook._dataSet = dataSet
+        newCodebook._data = data
+        newCodebook._codebookIndex = codebookIndex
+        newCodebook._codebookName = codebookName
+        newCodebook._build_barcode_arrays()
+        return newCodebook
+
+    def _build_barcode_arrays(self) -> None:
+        """
+        Build the barcode matrices and the blank and coding masks once so
+        that they are shared by all the callers instead of being
+        recomputed from the dataframe. The arrays are read-only and their
+        rows are in the order of the barcodes in the dataframe.
+        """
+        self._bitNames = [s for s in self._data.columns
+                          if s not in ['name', 'id']]
+        self._barcodes = self._data[self._bitNames].to_numpy(dtype=np.int64)
+
+        self._barcodeMatrix = np.ascontiguousarray(
+            self._barcodes, dtype=np.float32)
+        magnitudes = np.linalg.norm(self._barcodeMatrix, axis=1)
+        magnitudes[magnitudes == 0] = 1
+        self._normalizedBarcodeMatrix = np.ascontiguousarray(
+            self._barcodeMatrix / magnitudes[:, None], dtype=np.float32)
+
+        self._blankMask = self._data['name'].str.contains(
+            'Blank', case=False).to_numpy(dtype=bool)
+        self._codingMask = ~self._blankMask
+        self._blankIndexes = self._data.index[self._blankMask]
+        self._codingIndexes = self._data.index[self._codingMask]
+
+        for x in [self._barcodes, self._barcodeMatrix,
+                  self._normalizedBarcodeMatrix, self._blankMask,
+                  self._codingMask]:
+            x.setflags(write=False)
+
     @staticmethod
     def _generate_codebook_dataframe(barcodeData, bitNames):
         dfData = np.array([[currentRow['name'], currentRow['id']]
@@ -83,7 +129,7 @@ class Codebook(object):
         Returns:
             A list of 0's and 1's denoting the barcode
         """
-        return [self._data.loc[index][n] for n in self.get_bit_names()]
+        return self._barcodes[self._data.index.get_loc(index)].tolist()
 
     def get_barcode_count(self) -> int: 
         """
@@ -106,7 +152,7 @@ class Codebook(object):
         Returns:
             A list of the names of the bits in order from the lowest to highest
         """
-        return [s for s in self._data.columns if s not in ['name', 'id']]
+        return list(self._bitNames)
 
     def get_barcodes(self, ignoreBlanks: bool = False) -> np.array:
         """ Get the barcodes present in this codebook.
@@ -115,16 +161,68 @@ class Codebook(object):
             ignoreBlanks: flag indicating whether barcodes corresponding 
                     to blanks should be included.
         Returns:
-            A list of the barcodes represented as lists of bits.
+            A list of the barcodes represented as lists of bits. The
+            array is a copy that can be modified by the caller.
         """
-        bitNames = self.get_bit_names()
         if ignoreBlanks:
-            return np.array([[x[n] for n in bitNames] for i, x
-                             in self._data.iterrows()
-                             if 'BLANK' not in x['name'].upper()])
+            return self._barcodes[self._codingMask]
         else:
-            return np.array([[x[n] for n in bitNames]
-                             for i, x in self._data.iterrows()])
+            return self._barcodes.copy()
+
+    def get_barcode_matrix(self) -> np.ndarray:
+        """ Get the barcodes as a contiguous float32 matrix.
+
+        Returns:
+            A read-only (barcode, bit) array, including the blanks.
+        """
+        return self._barcodeMatrix
+
+    def get_normalized_barcode_matrix(self) -> np.ndarray:
+        """ Get the barcodes scaled to unit L2 norm.
+
+        Returns:
+            A read-only (barcode, bit) float32 array, including the blanks.
+        """
+        return self._normalizedBarcodeMatrix
+
+    def get_blank_mask(self) -> np.ndarray:
+        """ Get a boolean mask, in the order of the barcodes, of the
+        blanks."""
+        return self._blankMask
+
+    def get_coding_mask(self) -> np.ndarray:
+        """ Get a boolean mask, in the order of the barcodes, of the
+        barcodes that correspond with genes."""
+        return self._codingMask
+
+    def is_blank(self, barcodeIndexes) -> np.ndarray:
+        """ Determine which of the barcode indexes correspond with blanks.
+
+        Returns:
+            A boolean array with the shape of barcodeIndexes. Indexes that
+            are not in this codebook are neither blank nor coding.
+        """
+        return self._lookup_mask(self._blankMask, barcodeIndexes)
+
+    def is_coding(self, barcodeIndexes) -> np.ndarray:
+        """ Determine which of the barcode indexes correspond with genes.
+
+        Returns:
+            A boolean array with the shape of barcodeIndexes. Indexes that
+            are not in this codebook are neither blank nor coding.
+        """
+        return self._lookup_mask(self._codingMask, barcodeIndexes)
+
+    def _lookup_mask(self, mask: np.ndarray, barcodeIndexes) -> np.ndarray:
+        # the barcode indexes are labels of the dataframe index, which
+        # are converted to positions in the mask
+        barcodeIndexes = np.asarray(barcodeIndexes).astype(np.int64)
+        positions = self._data.index.get_indexer(
+            barcodeIndexes.ravel()).reshape(barcodeIndexes.shape)
+        valid = positions >= 0
+        result = np.zeros(barcodeIndexes.shape, dtype=bool)
+        result[valid] = mask[positions[valid]]
+        return result
 
     def get_coding_indexes(self) -> List[int]:
         """ Get the barcode indexes that correspond with genes.
@@ -133,8 +231,7 @@ class Codebook(object):
             A list of barcode indexes that correspond with genes and not 
                     blanks
         """
-        return self._data[
-                ~self._data['name'].str.contains('Blank', case=False)].index
+        return self._codingIndexes
     
     def get_blank_indexes(self) -> List[int]:
         """ Get the barcode indexes that do not correspond with genes.
@@ -142,8 +239,7 @@ class Codebook(object):
         Returns:
             A list of barcode indexes that correspond with blanks
         """
-        return self._data[
-                self._data['name'].str.contains('Blank', case=False)].index
+        return self._blankIndexes
 
     def get_gene_names(self) -> List[str]:
         """" Get the names of the genes represented in this codebook.
@@ -152,7 +248,7 @@ class Codebook(object):
             A list of the gene names. The list does not contain the names of
             the blanks.
         """
-        return self._data.loc[self.get_coding_indexes()]['name'].tolist()
+        return self._data['name'][self._codingMask].tolist()
 
     def get_name_for_barcode_index(self, index: int) -> str:
         """ Get the gene name for the barcode with the specified index.
@@ -1,12 +1,15 @@
 import os
 import re
+from typing import Dict
 from typing import List
 from typing import Tuple
 import pandas
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 import merfishdecoder
 from merfishdecoder.core import dataset
+from merfishdecoder.util import imagereader
 
 def _parse_list(inputString: str, dtype=float):
     if ',' in inputString:
@@ -68,6 +71,79 @@ class DataOrganization(object):
                          'imageRegExp', 'fiducialImageType', 'fiducialRegExp']
         self.data[stringColumns] = self.data[stringColumns].astype('str')
         self._map_image_files()
+        self._build_lookup_tables()
+
+    @classmethod
+    def from_snapshot(cls, dataSet, data: pandas.DataFrame,
+                      fileMap: pandas.DataFrame) -> 'DataOrganization':
+        """
+        Create a DataOrganization from a data organization and file map
+        that were parsed previously, without reading or storing any files.
+        """
+        dataOrganization = cls.__new__(cls)
+        dataOrganization._dataSet = dataSet
+        dataOrganization.data = data
+        dataOrganization.fileMap = fileMap
+        dataOrganization._build_lookup_tables()
+        return dataOrganization
+
+    def _build_lookup_tables(self) -> None:
+        """
+        Index the data organization and the file map so that the image
+        files and frames of each data channel are found with a single
+        dictionary lookup.
+        """
+        self._imagePaths = dict()
+        roundFiles = dict()
+        for imageType, fov, imagingRound, imagePath in zip(
+                self.fileMap['imageType'], self.fileMap['fov'],
+                self.fileMap['imagingRound'], self.fileMap['imagePath']):
+            if (imageType, int(fov), int(imagingRound)) in self._imagePaths:
+                continue
+            self._imagePaths[(imageType, int(fov), int(imagingRound))] = \
+                imagePath
+            roundFiles.setdefault(
+                (imageType, int(imagingRound)), []).append(
+                (int(fov), imagePath))
+
+        self._channelNames = dict()
+        self._readoutNames = dict()
+        self._channelIndexes = dict()
+        self._readoutIndexes = dict()
+        self._channelColors = dict()
+        self._frameIndexes = dict()
+        self._fiducialFrameIndexes = dict()
+        self._imageFiles = dict()
+        self._fiducialFiles = dict()
+        for dataChannel, channelInfo in zip(
+                self.get_data_channels(), self.data.itertuples()):
+            dataChannel = int(dataChannel)
+            self._channelNames[dataChannel] = channelInfo.channelName
+            self._readoutNames[dataChannel] = channelInfo.readoutName
+            self._channelIndexes.setdefault(
+                str(channelInfo.channelName).lower(), dataChannel)
+            self._readoutIndexes.setdefault(
+                channelInfo.readoutName, dataChannel)
+            self._channelColors[dataChannel] = str(channelInfo.color)
+            self._fiducialFrameIndexes[dataChannel] = \
+                channelInfo.fiducialFrame
+
+            if isinstance(channelInfo.zPos, np.ndarray):
+                for zIndex, zPosition in enumerate(channelInfo.zPos):
+                    self._frameIndexes.setdefault(
+                        (dataChannel, zPosition),
+                        channelInfo.frame[zIndex]
+                        if isinstance(channelInfo.frame, np.ndarray)
+                        else channelInfo.frame)
+
+            for fov, imagePath in roundFiles.get(
+                    (channelInfo.imageType, int(channelInfo.imagingRound)),
+                    []):
+                self._imageFiles[(dataChannel, fov)] = imagePath
+            for fov, imagePath in roundFiles.get(
+                    (channelInfo.fiducialImageType,
+                     int(channelInfo.fiducialImagingRound)), []):
+                self._fiducialFiles[(dataChannel, fov)] = imagePath
 
     def get_data_channels(self) -> np.array:
         """Get the data channels for the MERFISH data set.
@@ -85,7 +161,7 @@ class DataOrganization(object):
         Returns:
             The name of the specified data channel
         """
-        return self.data.iloc[dataChannelIndex]['readoutName']
+        return self._readoutNames[dataChannelIndex]
 
     def get_data_channel_name(self, dataChannelIndex: int) -> str:
         """Get the name for the data channel with the specified index.
@@ -96,7 +172,7 @@ class DataOrganization(object):
             The name of the specified data channel,
             primarily relevant for non-multiplex measurements
         """
-        return self.data.iloc[dataChannelIndex]['channelName']
+        return self._channelNames[dataChannelIndex]
 
     def get_data_channel_index(self, dataChannelName: str) -> int:
         """Get the index for the data channel with the specified name.
@@ -111,6 +187,9 @@ class DataOrganization(object):
             # TODO this should raise a meaningful exception if the data channel
             # is not found
         """
+        dataChannel = self._channelIndexes.get(dataChannelName.lower())
+        if dataChannel is not None:
+            return dataChannel
         return self.data[self.data['channelName'].apply(
             lambda x: str(x).lower()).str.match(
             dataChannelName.lower())].index.values.tolist()[0]
@@ -123,7 +202,7 @@ class DataOrganization(object):
         Returns:
             the color for this data channel as a string
         """
-        return str(self.data.at[dataChannel, 'color'])
+        return self._channelColors[dataChannel]
 
     def get_data_channel_for_bit(self, bitName: str) -> int:
         """Get the data channel associated with the specified bit.
@@ -133,7 +212,7 @@ class DataOrganization(object):
         Returns:
             The index of the associated data channel
         """
-        return self.data[self.data['readoutName'] == bitName].index.item()
+        return self._readoutIndexes[bitName]
 
     def get_data_channel_with_name(self, channelName: str) -> int:
         """Get the data channel associated with a gene name.
@@ -155,6 +234,9 @@ class DataOrganization(object):
         Returns:
             The full path to the image file containing the fiducials
         """
+        imagePath = self._fiducialFiles.get((dataChannel, fov))
+        if imagePath is not None:
+            return imagePath
 
         imageType = self.data.loc[dataChannel, 'fiducialImageType']
         imagingRound = \
@@ -170,7 +252,7 @@ class DataOrganization(object):
         Returns:
             The index of the fiducial frame in the corresponding image file
         """
-        return self.data.iloc[dataChannel]['fiducialFrame']
+        return self._fiducialFrameIndexes[dataChannel]
 
     def get_image_filename(self, dataChannel: int, fov: int) -> str:
         """Get the path for the image file that contains the
@@ -182,6 +264,10 @@ class DataOrganization(object):
         Returns:
             The full path to the image file containing the fiducials
         """
+        imagePath = self._imageFiles.get((dataChannel, fov))
+        if imagePath is not None:
+            return imagePath
+
         channelInfo = self.data.iloc[dataChannel]
         imagePath = self._get_image_path(
                 channelInfo['imageType'], fov, channelInfo['imagingRound'])
@@ -197,6 +283,10 @@ class DataOrganization(object):
         Returns:
             The index of the frame in the corresponding image file
         """
+        frame = self._frameIndexes.get((dataChannel, zPosition))
+        if frame is not None:
+            return frame
+
         channelInfo = self.data.iloc[dataChannel]
         channelZ = channelInfo['zPos']
         if isinstance(channelZ, np.ndarray):
@@ -218,6 +308,16 @@ class DataOrganization(object):
 
         return frame
 
+    def has_image_frame(self, dataChannel: int, zPosition: float) -> bool:
+        """Determine whether the data channel has an image frame at the
+        specified z position. Data channels with a single z position are
+        used for all the z positions.
+        """
+        if (dataChannel, zPosition) in self._frameIndexes:
+            return True
+        return not isinstance(self.data.iloc[dataChannel]['zPos'],
+                              np.ndarray)
+
     def get_z_positions(self) -> List[float]:
         """Get the z positions present in this data organization.
 
@@ -249,11 +349,12 @@ class DataOrganization(object):
 
     def _get_image_path(
             self, imageType: str, fov: int, imagingRound: int) -> str:
-        selection = self.fileMap[(self.fileMap['imageType'] == imageType) &
-                                 (self.fileMap['fov'] == fov) &
-                                 (self.fileMap['imagingRound'] == imagingRound)]
-
-        return selection['imagePath'].values[0]
+        imagePath = self._imagePaths.get((imageType, fov, imagingRound))
+        if imagePath is None:
+            raise IndexError(
+                'No image file found for image type %s, fov=%i, round=%i'
+                % (imageType, fov, imagingRound))
+        return imagePath
 
     def _map_image_files(self) -> None:
         # TODO: This doesn't map the fiducial image types and currently assumes
@@ -264,111 +365,268 @@ class DataOrganization(object):
             self.fileMap = self._dataSet.load_dataframe_from_csv('filemap')
 
         except FileNotFoundError:
-            uniqueEntries = self.data.drop_duplicates(
-                subset=['imageType', 'imageRegExp'], keep='first')
-
-            uniqueTypes = uniqueEntries['imageType']
-            uniqueIndexes = uniqueEntries.index.values.tolist()
+            self._create_file_map()
 
-            fileNames = self._dataSet.get_image_file_names()
-            if len(fileNames) == 0:
+    def refresh_file_map(self) -> None:
+        """
+        Map the image files in the raw data directory again, for example
+        when new imaging rounds were added during the acquisition. Only
+        the files that were not present when the file map was last created
+        are matched against the regular expressions.
+        """
+        self._create_file_map()
+        self._build_lookup_tables()
+
+    def _create_file_map(self) -> None:
+        uniqueEntries = self.data.drop_duplicates(
+            subset=['imageType', 'imageRegExp'], keep='first')
+
+        uniqueTypes = uniqueEntries['imageType'].tolist()
+        uniqueRegExps = uniqueEntries['imageRegExp'].tolist()
+
+        fileMatches = self._match_image_files(uniqueTypes, uniqueRegExps)
+        if len(fileMatches) == 0:
+            raise dataset.DataFormatException(
+                'No image files found at %s.' % self._dataSet.rawDataPath)
+
+        # the matches are in the order of get_image_file_names, so that
+        # the rows of each image type keep the order of the file listing
+        typeData = [[] for x in uniqueTypes]
+        for currentFile in fileMatches:
+            for typeIndex, transformedName in fileMatches[currentFile]:
+                typeData[typeIndex].append(transformedName)
+
+        for currentType, currentRegExp, currentData in zip(
+                uniqueTypes, uniqueRegExps, typeData):
+            if len(currentData) == 0:
                 raise dataset.DataFormatException(
-                    'No image files found at %s.' % self._dataSet.rawDataPath)
-            fileData = []
-            for currentType, currentIndex in zip(uniqueTypes, uniqueIndexes):
-                matchRE = re.compile(
-                        self.data.imageRegExp[currentIndex])
-
-                matchingFiles = False
-                for currentFile in fileNames:
-                    matchedName = matchRE.match(os.path.split(currentFile)[-1])
-                    if matchedName is not None:
-                        transformedName = matchedName.groupdict()
-                        if transformedName['imageType'] == currentType:
-                            if 'imagingRound' not in transformedName:
-                                transformedName['imagingRound'] = -1
-                            transformedName['imagePath'] = currentFile
-                            matchingFiles = True
-                            fileData.append(transformedName)
-
-                if not matchingFiles:
-                    raise dataset.DataFormatException(
-                        'Unable to identify image files matching regular '
-                        + 'expression %s for image type %s.'
-                        % (self.data.imageRegExp[currentIndex],
-                           currentType))
-
-            self.fileMap = pandas.DataFrame(fileData)
-            self.fileMap[['imagingRound', 'fov']] = \
-                self.fileMap[['imagingRound', 'fov']].astype(int)
-
-            #self._validate_file_map()
+                    'Unable to identify image files matching regular '
+                    + 'expression %s for image type %s.'
+                    % (currentRegExp, currentType))
 
-            self._dataSet.save_dataframe_to_csv(
-                    self.fileMap, 'filemap', index=False)
+        self.fileMap = pandas.DataFrame(
+            [x for currentData in typeData for x in currentData])
+        self.fileMap[['imagingRound', 'fov']] = \
+            self.fileMap[['imagingRound', 'fov']].astype(int)
 
-    def _validate_file_map(self) -> None:
+        #self._validate_file_map()
+
+        self._dataSet.save_dataframe_to_csv(
+                self.fileMap, 'filemap', index=False)
+
+    def _match_image_files(self, imageTypes: List[str],
+                           imageRegExps: List[str]) -> Dict[str, list]:
+        """
+        Match the names of the raw image files against the regular
+        expressions of all the image types in a single pass.
+
+        The matches are stored in a manifest in the analysis directory
+        together with the version of the raw data directory. When the
+        directory has not changed since the manifest was written, the
+        files are not listed again, and otherwise only the new files
+        are matched. Object stores do not provide a directory version,
+        so for raw data in S3 or Google Cloud Storage the files are
+        listed on every run, with one concurrent listing for the literal
+        prefix of each regular expression, and only the matching is
+        skipped.
+
+        Returns:
+            A dictionary mapping each image file to a list of
+            (image type index, matched fields) tuples.
+        """
+        rawDataPortal = self._dataSet.rawDataPortal
+        directoryVersion = rawDataPortal.get_directory_version()
+        imagePatterns = [list(x) for x in zip(imageTypes, imageRegExps)]
+
+        # a manifest that cannot be read is matched again from scratch
+        try:
+            manifest = self._dataSet.load_json_analysis_result(
+                'raw_manifest', None)
+            if manifest['image_patterns'] != imagePatterns:
+                manifest = None
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            manifest = None
+
+        if manifest is not None and directoryVersion is not None \
+                and manifest['directory_version'] == directoryVersion:
+            return manifest['files']
+
+        knownFiles = manifest['files'] if manifest is not None else {}
+        matchREs = [re.compile(x) for x in imageRegExps]
+
+        # only files starting with the literal prefix of a regular
+        # expression can match it, so object stores list each prefix
+        # concurrently instead of listing all the files
+        namePrefixes = [_get_name_prefix(imageType, imageRegExp)
+                        for imageType, imageRegExp
+                        in zip(imageTypes, imageRegExps)]
+        if not all(namePrefixes):
+            namePrefixes = None
+
+        fileMatches = dict()
+        for currentFile in self._dataSet.get_image_file_names(namePrefixes):
+            if currentFile in knownFiles:
+                fileMatches[currentFile] = knownFiles[currentFile]
+                continue
+
+            currentMatches = []
+            fileName = os.path.split(currentFile)[-1]
+            for typeIndex, matchRE in enumerate(matchREs):
+                matchedName = matchRE.match(fileName)
+                if matchedName is None:
+                    continue
+                transformedName = matchedName.groupdict()
+                if transformedName['imageType'] == imageTypes[typeIndex]:
+                    if 'imagingRound' not in transformedName:
+                        transformedName['imagingRound'] = -1
+                    transformedName['imagePath'] = currentFile
+                    currentMatches.append((typeIndex, transformedName))
+            fileMatches[currentFile] = currentMatches
+
+        self._dataSet.save_json_analysis_result(
+            {'directory_version': directoryVersion,
+             'image_patterns': imagePatterns,
+             'files': fileMatches}, 'raw_manifest', None)
+        return fileMatches
+
+    def validate_file_map(self, ioThreads: int = 16) -> None:
         """
         This function ensures that all the files specified in the file map
-        of the raw images are present.
+        of the raw images are present and contain the frames specified in
+        the data organization.
+
+        Only the file sizes and the image headers (.inf files or tiff
+        headers) are read, concurrently by ioThreads threads, and all the
+        problems found are reported together.
 
         Raises:
             InputDataError: If the set of raw data is incomplete or the
                     format of the raw data deviates from expectations.
         """
 
-        expectedImageSize = None
+        problems = []
+        requiredFrames = dict()
         for dataChannel in self.get_data_channels():
+            channelInfo = self.data.iloc[dataChannel]
             for fov in self.get_fovs():
-                channelInfo = self.data.iloc[dataChannel]
-                try:
-                    imagePath = self._get_image_path(
-                        channelInfo['imageType'], fov,
-                        channelInfo['imagingRound'])
-                except IndexError:
-                    raise FileNotFoundError(
-                        'Unable to find image path for %s, fov=%i, round=%i' %
-                        (channelInfo['imageType'], fov,
-                         channelInfo['imagingRound']))
-
-                if not self._dataSet.rawDataPortal.open_file(
-                        imagePath).exists():
-                    raise InputDataError(
-                        ('Image data for channel {0} and fov {1} not found. '
-                         'Expected at {2}')
-                        .format(dataChannel, fov, imagePath))
-
-                try:
-                    imageSize = self._dataSet.image_stack_size(imagePath)
-                except Exception as e:
-                    raise InputDataError(
-                        ('Unable to determine image stack size for fov {0} from'
-                         ' data channel {1} at {2}')
-                        .format(dataChannel, fov, imagePath))
-
-                frames = channelInfo['frame']
-
-                # this assumes fiducials are stored in the same image file
-                requiredFrames = max(np.max(frames),
-                                     channelInfo['fiducialFrame'])
-                if requiredFrames >= imageSize[2]:
-                    raise InputDataError(
+                for imageType, imagingRound, frames in [
+                        (channelInfo['imageType'],
+                         channelInfo['imagingRound'],
+                         channelInfo['frame']),
+                        (channelInfo['fiducialImageType'],
+                         channelInfo['fiducialImagingRound'],
+                         channelInfo['fiducialFrame'])]:
+                    try:
+                        imagePath = self._get_image_path(
+                            imageType, fov, imagingRound)
+                    except IndexError:
+                        problems.append(
+                            'Unable to find image path for %s, fov=%i, '
+                            'round=%i' % (imageType, fov, imagingRound))
+                        continue
+                    requiredFrames.setdefault(imagePath, []).append(
+                        (dataChannel, fov, int(np.max(frames))))
+
+        imagePaths = sorted(requiredFrames)
+        with ThreadPoolExecutor(max_workers=ioThreads) as executor:
+            imageSizes = list(executor.map(
+                self._read_image_stack_size, imagePaths))
+
+        expectedImageSize = None
+        for imagePath, (imageSize, problem) in zip(imagePaths, imageSizes):
+            if problem is not None:
+                problems.append(problem)
+                continue
+
+            for dataChannel, fov, requiredFrame in requiredFrames[imagePath]:
+                if requiredFrame >= imageSize[2]:
+                    problems.append(
                         ('Insufficient frames in data for channel {0} and '
                          'fov {1}. Expected {2} frames '
                          'but only found {3} in file {4}')
-                        .format(dataChannel, fov, requiredFrames, imageSize[2],
-                                imagePath))
-
-                if expectedImageSize is None:
-                    expectedImageSize = [imageSize[0], imageSize[1]]
-                else:
-                    if expectedImageSize[0] != imageSize[0] \
-                            or expectedImageSize[1] != imageSize[1]:
-                        raise InputDataError(
-                            ('Image data for channel {0} and fov {1} has '
-                             'unexpected dimensions. Expected {1}x{2} but '
-                             'found {3}x{4} in image file {5}')
-                            .format(dataChannel, fov, expectedImageSize[0],
-                                    expectedImageSize[1], imageSize[0],
-                                    imageSize[1], imagePath))
-        
\ No newline at end of file
+                        .format(dataChannel, fov, requiredFrame + 1,
+                                imageSize[2], imagePath))
+
+            if expectedImageSize is None:
+                expectedImageSize = [imageSize[0], imageSize[1]]
+            elif expectedImageSize[0] != imageSize[0] \
+                    or expectedImageSize[1] != imageSize[1]:
+                problems.append(
+                    ('Image data has unexpected dimensions. Expected '
+                     '{0}x{1} but found {2}x{3} in image file {4}')
+                    .format(expectedImageSize[0], expectedImageSize[1],
+                            imageSize[0], imageSize[1], imagePath))
+
+        if len(problems) > 0:
+            raise InputDataError(
+                '%i problems found in the raw data:\n' % len(problems)
+                + '\n'.join(problems))
+
+    def _read_image_stack_size(self, imagePath: str) -> Tuple[list, str]:
+        """
+        Read the size of an image stack from the image header.
+
+        Returns:
+            A tuple with the [width, height, frameCount] of the image
+            stack and None, or None and a description of the problem
+            if the size could not be determined.
+        """
+        try:
+            filePortal = self._dataSet.rawDataPortal.open_file(imagePath)
+        except FileNotFoundError:
+            filePortal = None
+        if filePortal is None or not filePortal.exists():
+            return None, 'Image file %s not found.' % imagePath
+
+        try:
+            fileSize = filePortal.get_size()
+            with imagereader.infer_reader(
+                    filePortal, useMemmap=False) as reader:
+                imageSize = reader.film_size()
+        except Exception as e:
+            return None, 'Unable to read the image header of %s: %s' \
+                % (imagePath, e)
+
+        if imagePath.endswith('.dax'):
+            expectedSize = imageSize[0] * imageSize[1] * imageSize[2] * 2
+            if fileSize < expectedSize:
+                return None, \
+                    ('Image file {0} is truncated. Expected {1} bytes '
+                     'for {2} frames but found {3} bytes').format(
+                        imagePath, expectedSize, imageSize[2], fileSize)
+        return imageSize, None
+
+
+def _get_name_prefix(imageType: str, imageRegExp: str) -> str:
+    """
+    Get the literal text that the names of the files matching a regular
+    expression of an image type start with, or an empty string if it
+    cannot be determined.
+    """
+    depth = 0
+    escaped = False
+    for c in imageRegExp:
+        if escaped:
+            escaped = False
+        elif c == '\\':
+            escaped = True
+        elif c in '([':
+            depth += 1
+        elif c in ')]':
+            depth -= 1
+        elif c == '|' and depth == 0:
+            return ''
+
+    # the matched imageType group has to be equal to the image type
+    if imageRegExp.startswith('(?P<imageType>'):
+        return imageType
+
+    prefix = ''
+    for c in imageRegExp:
+        if c in '.^$*+?{}[]\\|()':
+            break
+        prefix += c
+    # a quantifier applies to the last literal character
+    if imageRegExp[len(prefix):len(prefix) + 1] in ['*', '?', '{']:
+        prefix = prefix[:-1]
+    return prefix
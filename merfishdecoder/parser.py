@@ -10,7 +10,10 @@ def parse_args():
         dest="command",metavar="")
     
     add_create_analysis(subparsers)
+    add_validate_raw(subparsers)
+    add_convert_raw(subparsers)
     add_registration(subparsers)
+    add_fov_registration(subparsers)
     add_preprocessing(subparsers)
     add_predict_prob(subparsers)
     add_decoding(subparsers)
@@ -47,6 +50,20 @@ def parse_args():
             microscopeChromaticAberrationName=args.microscope_chromatic_aberration_name,
             dataHome=args.data_home,
             analysisHome=args.analysis_home)
+    elif args.command == "validate-raw":
+        from merfishdecoder.apps import run_validate_raw
+        run_validate_raw.run_job(
+            dataSetName=args.data_set_name,
+            ioThreads=args.io_threads,
+            refreshFileMap=args.refresh_file_map)
+    elif args.command == "convert-raw":
+        from merfishdecoder.apps import run_convert_raw
+        run_convert_raw.run_job(
+            dataSetName=args.data_set_name,
+            fov=args.fov,
+            compression=args.compression,
+            compressionLevel=args.compression_level,
+            overwrite=args.overwrite)
     elif args.command == "register-images":
         from merfishdecoder.apps import run_registration
         run_registration.run_job(
@@ -59,7 +76,21 @@ def parse_args():
             highPassFilterSigma=args.high_pass_filter_sigma,
             registerColor=args.register_color,
             registerColorProfile=args.register_color_profile,
-            saveFiducials=args.save_fiducials)               
+            saveFiducials=args.save_fiducials,
+            ioThreads=args.io_threads)               
+    elif args.command == "register-fov-images":
+        from merfishdecoder.apps import run_registration
+        run_registration.run_fov_job(
+            dataSetName=args.data_set_name,
+            fov=args.fov,
+            outputPath=args.output_path,
+            refFrameIndex=args.ref_frame_index,
+            registerDrift=args.register_drift,
+            highPassFilterSigma=args.high_pass_filter_sigma,
+            registerColor=args.register_color,
+            registerColorProfile=args.register_color_profile,
+            saveFiducials=args.save_fiducials,
+            ioThreads=args.io_threads)
     elif args.command == "process-images":
         from merfishdecoder.apps import run_preprocessing
         run_preprocessing.run_job(
@@ -69,9 +100,7 @@ def parse_args():
             warpedImagesName=args.warped_images_name,
             outputName=args.output_name,
             highPassFilterSigma=args.high_pass_filter_sigma,
-<<<<<<< HEAD
-            lowPassFilterSigma=args.low_pass_filter_sigma)                             
-=======
+            lowPassFilterSigma=args.low_pass_filter_sigma,
             scaleFactorFile=args.scale_factor_file,
             logTransform=args.log_transform)
     elif args.command == "predict-prob":
@@ -84,7 +113,6 @@ def parse_args():
             outputName=args.output_name,
             modelName=args.model_name,
             kernelSize=args.kernel_size)
->>>>>>> c1e3ee130d7256ac122fa56c033538dda702739b
     elif args.command == "decode-images":
         from merfishdecoder.apps import run_decoding
         run_decoding.run_job(
@@ -252,6 +280,63 @@ def add_create_analysis(subparsers):
                                      default=None,
                                      help="Base directory for analysis results.")
 
+def add_validate_raw(subparsers):
+     parser_validate_raw = subparsers.add_parser(
+          "validate-raw",
+          formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+          help="Check that the raw images are complete without loading them.")
+
+     parser_validate_raw_req = parser_validate_raw.add_argument_group("required inputs")
+     parser_validate_raw_req.add_argument("--data-set-name",
+                                         type=str,
+                                         required=True,
+                                         help="MERFISH dataset name.")
+
+     parser_validate_raw_opt = parser_validate_raw.add_argument_group("optional inputs")
+     parser_validate_raw_opt.add_argument("--io-threads",
+                                     type=int,
+                                     default=16,
+                                     help="Number of threads used to read the image headers.")
+
+     parser_validate_raw_opt.add_argument("--refresh-file-map",
+                                     type=str2bool,
+                                     default=False,
+                                     help="Map the image files added since the file map was created before validating.")
+
+def add_convert_raw(subparsers):
+     parser_convert_raw = subparsers.add_parser(
+          "convert-raw",
+          formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+          help="Convert raw images into a chunked and compressed image store.")
+
+     parser_convert_raw_req = parser_convert_raw.add_argument_group("required inputs")
+     parser_convert_raw_req.add_argument("--data-set-name",
+                                         type=str,
+                                         required=True,
+                                         help="MERFISH dataset name.")
+
+     parser_convert_raw_opt = parser_convert_raw.add_argument_group("optional inputs")
+     parser_convert_raw_opt.add_argument("--fov",
+                                     type=int,
+                                     default=None,
+                                     help="Field of view index. All fields of view are converted if not specified.")
+
+     parser_convert_raw_opt.add_argument("--compression",
+                                     type=str,
+                                     default="gzip",
+                                     choices=["gzip", "lzf", "none"],
+                                     help="Compression applied to each chunk.")
+
+     parser_convert_raw_opt.add_argument("--compression-level",
+                                     type=int,
+                                     default=1,
+                                     help="Compression level for gzip compression.")
+
+     parser_convert_raw_opt.add_argument("--overwrite",
+                                     type=str2bool,
+                                     default=False,
+                                     help="A boolen variable indicates whether converted fields of view are converted again.")
+
 def add_registration(subparsers):
      parser_registration = subparsers.add_parser(
           "register-images",
@@ -310,6 +395,69 @@ def add_registration(subparsers):
                                      default=False,
                                      help="A boolen variable indicates whether to save fiducial images.")
 
+     parser_registration_opt.add_argument("--io-threads",
+                                     type=int,
+                                     default=1,
+                                     help="Number of threads used to load raw images.")
+
+def add_fov_registration(subparsers):
+     parser_fov_registration = subparsers.add_parser(
+          "register-fov-images",
+          formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+          help="Register images of all the z positions of a field of view.")
+    
+     parser_fov_registration_req = parser_fov_registration.add_argument_group("required inputs")
+     parser_fov_registration_req.add_argument("--data-set-name",
+                                         type=str,
+                                         required=True,
+                                         help="MERFISH dataset name.")
+
+     parser_fov_registration_req.add_argument("--fov",
+                                     type=int,
+                                     required=True,
+                                     help="Field of view index.")
+
+     parser_fov_registration_req.add_argument("--output-path",
+                                     type=str,
+                                     required=True,
+                                     help="Output folder. The images of each z position are saved as fov_{fov}_zpos_{zpos}.tif.")
+
+     parser_fov_registration_opt = parser_fov_registration.add_argument_group("optional inputs")
+     parser_fov_registration_opt.add_argument("--register-drift",
+                                     type=str2bool,
+                                     default=True,
+                                     help="A boolen variable indicates whether to correct stage drift.")
+
+     parser_fov_registration_opt.add_argument("--ref-frame-index",
+                                     type=int,
+                                     default=0,
+                                     help="Reference frame index for correcting drift.")
+
+     parser_fov_registration_opt.add_argument("--high-pass-filter-sigma",
+                                     type=int,
+                                     default=3,
+                                     help="Low pass sigma for high pass filter prior to registration.")
+
+     parser_fov_registration_opt.add_argument("--register-color",
+                                     type=str2bool,
+                                     default=True,
+                                     help="A boolen variable indicates whether to correct chromatic abberation.")
+
+     parser_fov_registration_opt.add_argument("--register-color-profile",
+                                     type=str,
+                                     default=None,
+                                     help="A pkl file contains chromatic abberation profile.")
+
+     parser_fov_registration_opt.add_argument("--save-fiducials",
+                                     type=str2bool,
+                                     default=False,
+                                     help="A boolen variable indicates whether to save fiducial images.")
+
+     parser_fov_registration_opt.add_argument("--io-threads",
+                                     type=int,
+                                     default=1,
+                                     help="Number of threads used to load raw images.")
+
 def add_preprocessing(subparsers):
      parser_preprocessing = subparsers.add_parser(
           "process-images",
@@ -1,17 +1,13 @@
 import gc
 import random
-import cv2
 import copy
 import multiprocessing as mp
-import SharedArray as sa
 import tempfile
 import os
-import h5py
 
 import pandas as pd
 import numpy as np
 from numpy import linalg as LA
-from sklearn.neighbors import NearestNeighbors
 from collections import Counter
 from skimage import measure
 
@@ -26,6 +22,7 @@ def extract_barcodes(
     numCores: int = 1
     ) -> pd.core.frame.DataFrame:
 
+    import SharedArray as sa
     tmpPrefix = \
         tempfile.NamedTemporaryFile().name.split("/")[-1]
 
@@ -87,6 +84,7 @@ def extract_barcodes_by_indexes(
     barcodeIndexes: np.ndarray = None
     ) -> pd.core.frame.DataFrame:
     
+    import SharedArray as sa
     o = sa.attach(decodedImageName)
     p = sa.attach(probImageName)
     m = sa.attach(magImageName)
@@ -210,24 +208,25 @@ def extract_barcodes_by_indexes(
             "area": areas})
 
 def calc_barcode_fdr(b, cb):
-    blanks = b[b.barcode_id.isin(cb.get_blank_indexes())]
-    blanksNum = blanks.shape[0]
+    blanksNum = np.count_nonzero(cb.is_blank(b.barcode_id))
     totalNum = b.shape[0] + 1 # add psudo count
-    fdr = (blanksNum / len(cb.get_blank_indexes())) / (totalNum / cb.get_barcode_count())
+    fdr = (blanksNum / np.count_nonzero(cb.get_blank_mask())) / \
+        (totalNum / cb.get_barcode_count())
     return fdr
 
 def estimate_lik_err_table(
     bd, cb, minScore=0, maxScore=10, bins=100):
     scores = np.linspace(minScore, maxScore, bins)
-    blnkBarcodeNum = len(cb.get_blank_indexes())
-    codeBarcodeNum = len(cb.get_coding_indexes()) + len(cb.get_blank_indexes())
+    blnkBarcodeNum = np.count_nonzero(cb.get_blank_mask())
+    codeBarcodeNum = np.count_nonzero(cb.get_coding_mask()) + blnkBarcodeNum
+    likelihoods = bd.likelihood.to_numpy()
+    isCoding = cb.is_coding(bd.barcode_id)
+    isBlank = cb.is_blank(bd.barcode_id)
     pvalues = dict()
     for s in scores:
-        bd = bd[bd.likelihood >= s]
-        numPos = np.count_nonzero(
-            bd.barcode_id.isin(cb.get_coding_indexes()))
-        numNeg = np.count_nonzero(
-            bd.barcode_id.isin(cb.get_blank_indexes()))
+        passed = likelihoods >= s
+        numPos = np.count_nonzero(isCoding & passed)
+        numNeg = np.count_nonzero(isBlank & passed)
         numNegPerBarcode = numNeg / blnkBarcodeNum
         numPosPerBarcode = (numPos + numNeg) / codeBarcodeNum
         pvalues[s] = numNegPerBarcode / numPosPerBarcode
@@ -253,13 +252,14 @@ def export_barcodes(
     obj,
     fnames: list = None):
 
+    globalCoordinates = obj.get_global_coordinates()
     barcodes = []
     for fname in fnames:
         x = pd.read_hdf(fname, key="barcodes")
-        x = x.assign(global_x = np.array(x.x * obj.get_microns_per_pixel()) +\
-            np.array(obj.get_fov_offset(x.fov)[0]))
-        x = x.assign(global_y = np.array(x.y * obj.get_microns_per_pixel()) +\
-            np.array(obj.get_fov_offset(x.fov)[1]))
+        (globalX, globalY) = globalCoordinates.fov_to_global(
+            x.fov.to_numpy(), x.x.to_numpy(), x.y.to_numpy())
+        x = x.assign(global_x = globalX)
+        x = x.assign(global_y = globalY)
         x = x.assign(gene_name = \
             np.array(obj.get_codebook().get_data()["name"][
                 x.barcode_id.astype(int)]))
@@ -281,5 +281,5 @@ def filter_barcodes(barcodes,
     barcodes = barcodes[barcodes.area >= minAreaSize]
     if not keepBlankBarcodes:
         barcodes = barcodes[
-            barcodes.barcode_id.isin(codebook.get_coding_indexes())]
+            codebook.is_coding(barcodes.barcode_id)]
     return barcodes   
@@ -1,13 +1,87 @@
 import os
-import boto3
-import botocore
-from google.cloud import storage
-from google.cloud import exceptions
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from urllib import parse
 from abc import abstractmethod, ABC
 from typing import List
+from typing import Tuple
 from time import sleep
 
+# the maximum number of concurrent requests issued to an object store and
+# the size of the connection pool shared by all portals in a process
+MAX_CONCURRENT_REQUESTS = 16
+# reads larger than this many bytes are split into concurrent ranged requests
+RANGE_PART_SIZE = 8 * 1024 * 1024
+
+_sharedLock = threading.Lock()
+_sharedS3Resource = None
+_sharedGCloudClient = None
+_rangeExecutor = None
+_RANGE_THREAD_PREFIX = 'dataportal-range'
+
+
+def _get_shared_s3_resource():
+    # the cloud SDKs are slow to import so they are only imported once an
+    # s3:// or gc:// path is opened
+    global _sharedS3Resource
+    with _sharedLock:
+        if _sharedS3Resource is None:
+            import boto3
+            import botocore.config
+            _sharedS3Resource = boto3.resource(
+                's3', config=botocore.config.Config(
+                    max_pool_connections=MAX_CONCURRENT_REQUESTS))
+        return _sharedS3Resource
+
+
+def _get_shared_gcloud_client():
+    global _sharedGCloudClient
+    with _sharedLock:
+        if _sharedGCloudClient is None:
+            import google.auth
+            import requests
+            from google.auth.transport.requests import AuthorizedSession
+            from google.cloud import storage
+            credentials, project = google.auth.default(
+                scopes=storage.Client.SCOPE)
+            # the default requests adapter only keeps 10 connections open
+            session = AuthorizedSession(credentials)
+            session.mount('https://', requests.adapters.HTTPAdapter(
+                pool_connections=MAX_CONCURRENT_REQUESTS,
+                pool_maxsize=MAX_CONCURRENT_REQUESTS))
+            _sharedGCloudClient = storage.Client(
+                project=project, credentials=credentials, _http=session)
+        return _sharedGCloudClient
+
+
+def _get_range_executor() -> ThreadPoolExecutor:
+    # the executor only runs single ranged requests, which never submit
+    # work to it, so that a read cannot wait on a part queued behind it
+    global _rangeExecutor
+    with _sharedLock:
+        if _rangeExecutor is None:
+            _rangeExecutor = ThreadPoolExecutor(
+                max_workers=MAX_CONCURRENT_REQUESTS,
+                thread_name_prefix=_RANGE_THREAD_PREFIX)
+        return _rangeExecutor
+
+
+def _list_prefixes_concurrently(list_keys, basePrefix: str,
+                               namePrefixes: List[str]) -> List[str]:
+    # listings of an object store paginate sequentially, so the files
+    # of each name prefix are listed with a separate request. The
+    # listings do not use the range executor so that they never wait
+    # on range reads.
+    keyPrefixes = ['/'.join([basePrefix, x]) if basePrefix else x
+                   for x in namePrefixes]
+    if len(keyPrefixes) == 1:
+        return list_keys(keyPrefixes[0])
+    with ThreadPoolExecutor(max_workers=min(
+            len(keyPrefixes), MAX_CONCURRENT_REQUESTS)) as executor:
+        return [f for keys in executor.map(list_keys, keyPrefixes)
+                for f in keys]
+
 
 class DataPortal(ABC):
 
@@ -21,6 +95,22 @@ class DataPortal(ABC):
 
         self._basePath = basePath
 
+    def get_base_path(self) -> str:
+        """ Get the base path of this DataPortal.
+
+        Returns: the base path
+        """
+        return self._basePath
+
+    def set_block_cache(self, blockCache: 'BlockCache') -> None:
+        """ Set the local block cache used for files opened by this
+        DataPortal. Files in a local file system are not cached.
+
+        Args:
+            blockCache: the block cache to use or None to disable caching
+        """
+        pass
+
     @staticmethod
     def create_portal(basePath: str) -> 'DataPortal':
         """ Create a new portal capable of reading from the specified basePath.
@@ -61,21 +151,44 @@ class DataPortal(ABC):
                           ) -> List[str]:
         if not extensionList:
             return inputList
-        return [f for f in inputList if any(
-            [f.endswith(x) for x in extensionList])]
+        extensions = tuple(extensionList)
+        return [f for f in inputList if f.endswith(extensions)]
+
+    @staticmethod
+    def _minimal_prefixes(namePrefixes: List[str]) -> List[str]:
+        # prefixes that extend another prefix list a subset of its files
+        namePrefixes = sorted(set(namePrefixes))
+        return [p for i, p in enumerate(namePrefixes)
+                if not any(p.startswith(x) for x in namePrefixes[:i])]
 
     @abstractmethod
-    def list_files(self, extensionList: List[str] = None) -> List[str]:
+    def list_files(self, extensionList: List[str] = None,
+                   namePrefixes: List[str] = None) -> List[str]:
         """ List all the files within the base path represented by this
         DataReader.
 
         Args:
             extensionList: a list of extensions of files to filter for. Only
                 files ending in one of the extensions will be returned.
+            namePrefixes: a list of prefixes of the file names to filter
+                for. Object stores list the files of each prefix with
+                concurrent requests.
         Returns: a list of the file paths
         """
         pass
 
+    def get_directory_version(self):
+        """ Get an identifier that changes whenever files are added to
+        or removed from the base path.
+
+        Returns: the identifier, or None if the storage service does not
+            provide one so that the files must be listed to find changes.
+            Object stores have no directory objects, and a version derived
+            from the objects would require listing them, so the S3 and
+            Google Cloud portals return None.
+        """
+        return None
+
 
 class LocalDataPortal(DataPortal):
 
@@ -95,11 +208,20 @@ class LocalDataPortal(DataPortal):
         else:
             return LocalFilePortal(os.path.join(self._basePath, fileName))
 
-    def list_files(self, extensionList=None):
-        allFiles = [os.path.join(self._basePath, currentFile)
-                    for currentFile in os.listdir(self._basePath)]
+    def list_files(self, extensionList=None, namePrefixes=None):
+        # a single listing of a local directory is faster than one per
+        # prefix
+        namePrefixes = None if namePrefixes is None else tuple(namePrefixes)
+        with os.scandir(self._basePath) as entries:
+            allFiles = [os.path.join(self._basePath, currentFile.name)
+                        for currentFile in entries if currentFile.is_file()
+                        and (namePrefixes is None
+                             or currentFile.name.startswith(namePrefixes))]
         return self._filter_file_list(allFiles, extensionList)
 
+    def get_directory_version(self):
+        return os.stat(self._basePath).st_mtime_ns
+
 
 class S3DataPortal(DataPortal):
 
@@ -113,7 +235,15 @@ class S3DataPortal(DataPortal):
         t = parse.urlparse(basePath)
         self._bucketName = t.netloc
         self._prefix = t.path.strip('/')
-        self._s3 = boto3.resource('s3', **kwargs)
+        if kwargs:
+            import boto3
+            self._s3 = boto3.resource('s3', **kwargs)
+        else:
+            self._s3 = _get_shared_s3_resource()
+        self._blockCache = None
+
+    def set_block_cache(self, blockCache):
+        self._blockCache = blockCache
 
     def is_available(self):
         objects = list(self._s3.Bucket(self._bucketName).objects.limit(10)
@@ -125,12 +255,24 @@ class S3DataPortal(DataPortal):
             fullPath = fileName
         else:
             fullPath = '/'.join([self._basePath, fileName])
-        return S3FilePortal(fullPath, s3=self._s3)
-
-    def list_files(self, extensionList=None):
-        allFiles = ['s3://%s/%s' % (self._bucketName, f.key)
-                    for f in self._s3.Bucket(self._bucketName)
-                    .objects.filter(Prefix=self._prefix)]
+        return S3FilePortal(fullPath, s3=self._s3,
+                            blockCache=self._blockCache)
+
+    def _list_keys(self, keyPrefix: str) -> List[str]:
+        # the low level client is thread safe, unlike the resource objects
+        paginator = self._s3.meta.client.get_paginator('list_objects_v2')
+        return ['s3://%s/%s' % (self._bucketName, f['Key'])
+                for page in paginator.paginate(
+                    Bucket=self._bucketName, Prefix=keyPrefix)
+                for f in page.get('Contents', [])]
+
+    def list_files(self, extensionList=None, namePrefixes=None):
+        if namePrefixes is None:
+            allFiles = self._list_keys(self._prefix)
+        else:
+            allFiles = _list_prefixes_concurrently(
+                self._list_keys, self._prefix,
+                self._minimal_prefixes(namePrefixes))
         return self._filter_file_list(allFiles, extensionList)
 
 
@@ -146,7 +288,15 @@ class GCloudDataPortal(DataPortal):
         t = parse.urlparse(basePath)
         self._bucketName = t.netloc
         self._prefix = t.path.strip('/')
-        self._client = storage.Client(**kwargs)
+        if kwargs:
+            from google.cloud import storage
+            self._client = storage.Client(**kwargs)
+        else:
+            self._client = _get_shared_gcloud_client()
+        self._blockCache = None
+
+    def set_block_cache(self, blockCache):
+        self._blockCache = blockCache
 
     def is_available(self):
         blobList = list(self._client.list_blobs(
@@ -158,12 +308,21 @@ class GCloudDataPortal(DataPortal):
             fullPath = fileName
         else:
             fullPath = '/'.join([self._basePath, fileName])
-        return GCloudFilePortal(fullPath, self._client)
+        return GCloudFilePortal(fullPath, self._client,
+                                blockCache=self._blockCache)
 
-    def list_files(self, extensionList=None):
-        allFiles = ['gc://%s/%s' % (self._bucketName, f.name)
-                    for f in self._client.list_blobs(
-                        self._bucketName, prefix=self._prefix)]
+    def _list_keys(self, keyPrefix: str) -> List[str]:
+        return ['gc://%s/%s' % (self._bucketName, f.name)
+                for f in self._client.list_blobs(
+                    self._bucketName, prefix=keyPrefix)]
+
+    def list_files(self, extensionList=None, namePrefixes=None):
+        if namePrefixes is None:
+            allFiles = self._list_keys(self._prefix)
+        else:
+            allFiles = _list_prefixes_concurrently(
+                self._list_keys, self._prefix,
+                self._minimal_prefixes(namePrefixes))
         return self._filter_file_list(allFiles, extensionList)
 
 
@@ -211,6 +370,24 @@ class FilePortal(ABC):
         """
         pass
 
+    @abstractmethod
+    def get_version(self) -> str:
+        """ Get an identifier for the current version of this file, such
+        as the modification time of a local file or the ETag or
+        generation of an object.
+
+        Returns: the version identifier
+        """
+        pass
+
+    @abstractmethod
+    def get_size(self) -> int:
+        """ Get the size of this file.
+
+        Returns: The size of the file in bytes
+        """
+        pass
+
     @abstractmethod
     def get_sibling_with_extension(self, newExtension: str) -> 'FilePortal':
         """ Open the file with the same base name as this file but with the
@@ -242,6 +419,17 @@ class FilePortal(ABC):
         """
         pass
 
+    def read_ranges(self, byteRanges: List[Tuple[int, int]]) -> List[bytes]:
+        """ Read the bytes within each of the specified ranges from this file.
+
+        Args:
+            byteRanges: a list of (startByte, endByte) tuples where startByte
+                is inclusive and endByte is exclusive
+        Returns: A list containing the bytes for each of the ranges.
+        """
+        return [self.read_file_bytes(startByte, endByte)
+                for startByte, endByte in byteRanges]
+
     @abstractmethod
     def close(self) -> None:
         """ Close this file portal."""
@@ -264,37 +452,108 @@ class LocalFilePortal(FilePortal):
     def exists(self):
         return os.path.exists(self._fileName)
 
+    def get_size(self):
+        return os.path.getsize(self._fileName)
+
+    def get_version(self):
+        fileStat = os.stat(self._fileName)
+        return '%i-%i' % (fileStat.st_mtime_ns, fileStat.st_size)
+
     def read_as_text(self):
         self._fileHandle.seek(0)
         return self._fileHandle.read().decode('utf-8')
 
     def read_file_bytes(self, startByte, endByte):
+        if hasattr(os, 'pread'):
+            # pread does not move the file offset so concurrent reads
+            # from the same file portal are safe
+            return os.pread(self._fileHandle.fileno(),
+                            endByte-startByte, startByte)
         self._fileHandle.seek(startByte)
         return self._fileHandle.read(endByte-startByte)
 
     def close(self) -> None:
-        self._fileHandle.close()
+        # the handle is missing if the file could not be opened
+        if hasattr(self, '_fileHandle'):
+            self._fileHandle.close()
 
 
-class S3FilePortal(FilePortal):
+class RemoteFilePortal(FilePortal):
 
     """
-    A file portal for accessing a file from s3.
+    A superclass for file portals that read from an object store. Reads are
+    split into parts of at most RANGE_PART_SIZE bytes that are requested
+    concurrently over the shared connection pool. If a BlockCache is
+    provided, reads are served from the cache where possible.
     """
 
-    def __init__(self, fileName: str, s3=None):
+    def __init__(self, fileName: str, blockCache: 'BlockCache' = None):
         super().__init__(fileName)
+        self._blockCache = blockCache
+
+    @abstractmethod
+    def _read_range(self, startByte: int, endByte: int) -> bytes:
+        """ Read bytes within the specified range with a single request.
+
+        Args:
+            startByte: the index of the first byte to read (inclusive)
+            endByte: the index at the end of the range of bytes to read
+                (exclusive)
+        Returns: The bytes between startByte and endByte within this file.
+        """
+        pass
+
+    def read_file_bytes(self, startByte, endByte):
+        return self.read_ranges([(startByte, endByte)])[0]
+
+    def read_ranges(self, byteRanges):
+        if self._blockCache is not None:
+            return self._blockCache.read_ranges(self, byteRanges)
+        return self._read_ranges_uncached(byteRanges)
+
+    def _read_ranges_uncached(self, byteRanges):
+        parts = []
+        partCounts = []
+        for startByte, endByte in byteRanges:
+            rangeParts = [(x, min(x + RANGE_PART_SIZE, endByte))
+                          for x in range(startByte, endByte, RANGE_PART_SIZE)]
+            parts.extend(rangeParts)
+            partCounts.append(len(rangeParts))
+
+        if len(parts) == 1 or threading.current_thread().name.startswith(
+                _RANGE_THREAD_PREFIX):
+            partData = [self._read_range(*x) for x in parts]
+        else:
+            partData = list(_get_range_executor().map(
+                lambda x: self._read_range(*x), parts))
+
+        rangeData = []
+        for partCount in partCounts:
+            rangeData.append(b''.join(partData[:partCount]))
+            partData = partData[partCount:]
+        return rangeData
+
+
+class S3FilePortal(RemoteFilePortal):
+
+    """
+    A file portal for accessing a file from s3.
+    """
+
+    def __init__(self, fileName: str, s3=None, blockCache=None):
+        super().__init__(fileName, blockCache)
         t = parse.urlparse(fileName)
         self._bucketName = t.netloc
         self._prefix = t.path.strip('/')
         if s3 is None:
-            self._s3 = boto3.resource('s3')
+            self._s3 = _get_shared_s3_resource()
         else:
             self._s3 = s3
 
         self._fileHandle = self._s3.Object(self._bucketName, self._prefix)
 
     def exists(self):
+        import botocore.exceptions
         try:
             self._fileHandle.load()
         except botocore.exceptions.ClientError as e:
@@ -303,47 +562,70 @@ class S3FilePortal(FilePortal):
         return True
 
     def get_sibling_with_extension(self, newExtension: str):
-        return S3FilePortal(self._exchange_extension(newExtension), self._s3)
+        return S3FilePortal(self._exchange_extension(newExtension), self._s3,
+                            self._blockCache)
+
+    def get_version(self):
+        return self._fileHandle.e_tag
+
+    def get_size(self):
+        return self._fileHandle.content_length
 
     def read_as_text(self):
         return self._fileHandle.get()['Body'].read().decode('utf-8')
 
-    def read_file_bytes(self, startByte, endByte):
-        return self._fileHandle.get(
+    def _read_range(self, startByte, endByte):
+        # the low level client is thread safe, unlike the resource objects
+        return self._s3.meta.client.get_object(
+            Bucket=self._bucketName, Key=self._prefix,
             Range='bytes=%i-%i' % (startByte, endByte-1))['Body'].read()
 
     def close(self) -> None:
         pass
 
 
-class GCloudFilePortal(FilePortal):
+class GCloudFilePortal(RemoteFilePortal):
 
     """
     A file portal for accessing a file from Google Cloud.
     """
 
-    def __init__(self, fileName: str, client=None):
-        super().__init__(fileName)
+    def __init__(self, fileName: str, client=None, blockCache=None):
+        super().__init__(fileName, blockCache)
         if client is None:
-            self._client = storage.Client()
+            self._client = _get_shared_gcloud_client()
         else:
             self._client = client
         t = parse.urlparse(fileName)
         self._bucketName = t.netloc
         self._prefix = t.path.strip('/')
-        self._bucket = self._client.get_bucket(self._bucketName)
+        # bucket() and blob() do not issue requests, unlike get_bucket()
+        # and get_blob()
+        self._bucket = self._client.bucket(self._bucketName)
 
-        self._fileHandle = self._bucket.get_blob(self._prefix)
+        self._fileHandle = self._bucket.blob(self._prefix)
 
     def exists(self):
         return self._fileHandle.exists()
 
     def get_sibling_with_extension(self, newExtension: str):
         return GCloudFilePortal(
-            self._exchange_extension(newExtension), self._client)
+            self._exchange_extension(newExtension), self._client,
+            self._blockCache)
+
+    def get_version(self):
+        if self._fileHandle.generation is None:
+            self._fileHandle.reload()
+        return str(self._fileHandle.generation)
+
+    def get_size(self):
+        if self._fileHandle.size is None:
+            self._fileHandle.reload()
+        return self._fileHandle.size
 
     def _error_tolerant_reading(self, method, startByte=None,
                                 endByte=None):
+        from google.cloud import exceptions
         backoffSeries = [1, 2, 4, 8, 16, 32, 64, 128, 256]
         for sleepDuration in backoffSeries:
             try:
@@ -364,7 +646,7 @@ class GCloudFilePortal(FilePortal):
         file = self._error_tolerant_reading(self._fileHandle.download_as_string)
         return file.decode('utf-8')
 
-    def read_file_bytes(self, startByte, endByte):
+    def _read_range(self, startByte, endByte):
         """
         Attempts to read a file from bucket as bytes, it if encounters a timeout
         exception it reattempts after sleeping for exponentially increasing
@@ -375,6 +657,144 @@ class GCloudFilePortal(FilePortal):
                                             endByte=endByte-1)
         return file
 
-
     def close(self) -> None:
         pass
+
+
+class BlockCache(object):
+
+    """
+    A size-bounded cache of fixed-size blocks of remote files stored in a
+    local directory.
+
+    Blocks are keyed by the file path and the file version so that a file
+    that is modified is not served from stale blocks. When the total size
+    of the cached blocks exceeds maxBytes, the least recently used blocks
+    are removed. The cache directory can be shared by several processes.
+    """
+
+    def __init__(self, cachePath: str, maxBytes: int,
+                 blockSize: int = RANGE_PART_SIZE):
+        self._cachePath = cachePath
+        self._maxBytes = maxBytes
+        self._blockSize = blockSize
+        self._cachedBytes = None
+        self._lock = threading.Lock()
+        os.makedirs(self._cachePath, exist_ok=True)
+
+    def read_ranges(self, filePortal: RemoteFilePortal,
+                    byteRanges: List[Tuple[int, int]]) -> List[bytes]:
+        """ Read the bytes within each of the specified ranges from a
+        remote file, fetching only the blocks that are not yet cached.
+
+        Args:
+            filePortal: the file portal to read from on a cache miss
+            byteRanges: a list of (startByte, endByte) tuples where
+                startByte is inclusive and endByte is exclusive
+        Returns: A list containing the bytes for each of the ranges.
+        """
+        blockPrefix = self._block_prefix(filePortal)
+        blockIndexes = sorted(set(
+            i for startByte, endByte in byteRanges
+            for i in range(startByte // self._blockSize,
+                           (endByte - 1) // self._blockSize + 1)
+            if endByte > startByte))
+
+        blocks = {}
+        missingIndexes = []
+        for i in blockIndexes:
+            blockData = self._load_block(blockPrefix, i)
+            if blockData is None:
+                missingIndexes.append(i)
+            else:
+                blocks[i] = blockData
+
+        if len(missingIndexes) > 0:
+            # ranges that extend past the end of the file return the
+            # bytes up to the end of the file
+            missingData = filePortal._read_ranges_uncached(
+                [(i * self._blockSize, (i + 1) * self._blockSize)
+                 for i in missingIndexes])
+            for i, blockData in zip(missingIndexes, missingData):
+                self._store_block(blockPrefix, i, blockData)
+                blocks[i] = blockData
+
+        rangeData = []
+        for startByte, endByte in byteRanges:
+            firstBlock = startByte // self._blockSize
+            lastBlock = (endByte - 1) // self._blockSize
+            if endByte <= startByte:
+                rangeData.append(b'')
+                continue
+            data = b''.join(blocks[i] for i in range(firstBlock, lastBlock + 1))
+            offset = startByte - firstBlock * self._blockSize
+            rangeData.append(data[offset:offset + endByte - startByte])
+        return rangeData
+
+    def _block_prefix(self, filePortal: RemoteFilePortal) -> str:
+        digest = hashlib.sha1(('%s\n%s\n%i' % (
+            filePortal.get_file_name(), filePortal.get_version(),
+            self._blockSize)).encode('utf-8')).hexdigest()
+        return os.path.join(self._cachePath, digest[:2], digest)
+
+    def _load_block(self, blockPrefix: str, blockIndex: int) -> bytes:
+        blockPath = '%s_%i' % (blockPrefix, blockIndex)
+        try:
+            with open(blockPath, 'rb') as f:
+                blockData = f.read()
+            # the modification time records when the block was last used
+            os.utime(blockPath)
+            return blockData
+        except FileNotFoundError:
+            return None
+
+    def _store_block(self, blockPrefix: str, blockIndex: int,
+                     blockData: bytes) -> None:
+        blockPath = '%s_%i' % (blockPrefix, blockIndex)
+        os.makedirs(os.path.dirname(blockPath), exist_ok=True)
+        tempPath = '%s.%i.%i.tmp' % (
+            blockPath, os.getpid(), threading.get_ident())
+        with open(tempPath, 'wb') as f:
+            f.write(blockData)
+        os.replace(tempPath, blockPath)
+
+        with self._lock:
+            if self._cachedBytes is None:
+                self._cachedBytes = sum(
+                    x[2] for x in self._list_blocks())
+            else:
+                self._cachedBytes += len(blockData)
+            if self._cachedBytes > self._maxBytes:
+                self._evict()
+
+    def _list_blocks(self) -> List[Tuple[float, str, int]]:
+        blockList = []
+        for currentDir in os.scandir(self._cachePath):
+            if not currentDir.is_dir():
+                continue
+            for currentFile in os.scandir(currentDir.path):
+                if currentFile.name.endswith('.tmp'):
+                    continue
+                try:
+                    fileStat = currentFile.stat()
+                except FileNotFoundError:
+                    continue
+                blockList.append(
+                    (fileStat.st_mtime, currentFile.path, fileStat.st_size))
+        return blockList
+
+    def _evict(self) -> None:
+        # other processes may share the cache so the sizes are recounted
+        blockList = sorted(self._list_blocks())
+        self._cachedBytes = sum(x[2] for x in blockList)
+        # evict down to 90% of the budget so that eviction is not
+        # triggered again by the next stored block
+        targetBytes = 0.9 * self._maxBytes
+        for _, blockPath, blockBytes in blockList:
+            if self._cachedBytes <= targetBytes:
+                break
+            try:
+                os.remove(blockPath)
+            except FileNotFoundError:
+                pass
+            self._cachedBytes -= blockBytes
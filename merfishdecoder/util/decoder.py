@@ -3,18 +3,13 @@ import numpy as np
 import gc
 from numpy import linalg as LA
 import random
-import cv2
 import copy
-from sklearn.neighbors import NearestNeighbors
 import multiprocessing as mp
-import SharedArray as sa
-from skimage import measure
 import tempfile
 import os
 from collections import Counter
-from numba import jit
 import gc
-from scipy import stats, special
+from scipy import special
 
 from merfishdecoder.data import codebook as cb
 from merfishdecoder.util import utilities
@@ -52,33 +47,42 @@ def decoding(obj: zplane.Zplane = None,
     numCores: number of threads for decoding
     """
 
-    # remove the bordering pixels of decoding movie
+    # the bordering pixels of decoding movie are not decoded
     imageSize = movie.shape[1:]
     borderImage = np.ones(imageSize)
     borderImage[
         borderSize:(imageSize[0] - borderSize),
         borderSize:(imageSize[0] - borderSize)] = 0
-    movie = np.array([ x * (1 - borderImage) for x in movie ])
     
     # pixel-based decoding
     if decodeMethod == "distance":
+        # the movie is only read, so it can be a read-only view of 
+        # the images of a zplane and the border is masked instead
         decodeDict = pixel_based_decode_distance(
             movie = movie,
-            codebookMat = obj.get_codebook().get_barcodes().astype(np.float32),
+            codebookMat = obj.get_codebook().get_barcode_matrix(),
+            normalizedCodebookMat = \
+                obj.get_codebook().get_normalized_barcode_matrix(),
             distanceThreshold = distanceThreshold,
             magnitudeThreshold = magnitudeThreshold,
             oneBitThreshold = 1,
-            numCores = numCores)
-    elif decodeMethod == "cross_entropy":
+            numCores = numCores,
+            pixelMask = borderImage == 0)
+        return decodeDict
+
+    # the other methods modify the movie, so they decode a copy 
+    # with the border removed
+    movie = movie * (1 - borderImage)
+    if decodeMethod == "cross_entropy":
         decodeDict = pixel_based_decode_cross_entropy(
              movie = movie,
-             codebookMat = obj.get_codebook().get_barcodes().astype(np.float32),
+             codebookMat = obj.get_codebook().get_barcode_matrix(),
              bitWeight = bitWeight,
              magnitudeThreshold = magnitudeThreshold)
     elif decodeMethod == "joint_prob":
         decodeDict = pixel_based_decode_joint_prob(
             movie  = movie,
-            codebookMat = obj.get_codebook().get_barcodes().astype(np.float32),
+            codebookMat = obj.get_codebook().get_barcode_matrix(),
             barcodeWeight = barcodeWeight,
             magnitudeThreshold = magnitudeThreshold)
 
@@ -171,7 +175,9 @@ def pixel_based_decode_distance(
     numCores: int = 1,
     distanceThreshold: float = 0.65,
     magnitudeThreshold: float = 0,
-    oneBitThreshold: int = 1
+    oneBitThreshold: int = 1,
+    normalizedCodebookMat: np.ndarray = None,
+    pixelMask: np.ndarray = None
     ) -> dict:
   
     """
@@ -200,6 +206,13 @@ def pixel_based_decode_distance(
             Note that the magnitude is scaled by the median value of each bit.
 
         numCores: number of processors used for decoding
+
+        normalizedCodebookMat: the codebook matrix scaled to unit norm.
+            It is computed from codebookMat if it is not provided.
+
+        pixelMask: a boolean image of the pixels to decode. Pixels 
+            outside the mask are left unassigned. All the pixels are
+            decoded if it is not provided.
         
     Returns:
         A dictionary object contains the following images:
@@ -210,8 +223,11 @@ def pixel_based_decode_distance(
     """
     
     bitNum = codebookMat.sum(axis=1)[0]
-    codebookMatWeighted = codebookMat[:,:] / \
-        cal_pixel_magnitude(codebookMat)[:, None]
+    if normalizedCodebookMat is None:
+        codebookMatWeighted = codebookMat[:,:] / \
+            cal_pixel_magnitude(codebookMat)[:, None]
+    else:
+        codebookMatWeighted = normalizedCodebookMat
     
     imageSize = movie.shape[1:]
     
@@ -222,14 +238,16 @@ def pixel_based_decode_distance(
     numPixel = pixelTraces.shape[0]
     
     pixelMagnitudes = cal_pixel_magnitude(
-        pixelTraces.astype(np.float32))
+        pixelTraces.astype(np.float32, copy = False))
     
     pixelTracesCov = np.array(
         [np.count_nonzero(x) for x in pixelTraces])
 
-    pixelIndexes = np.where(
-        (pixelTracesCov >= oneBitThreshold) &
-        (pixelMagnitudes >= magnitudeThreshold))[0]
+    pixelSelected = (pixelTracesCov >= oneBitThreshold) & \
+        (pixelMagnitudes >= magnitudeThreshold)
+    if pixelMask is not None:
+        pixelSelected &= np.ravel(pixelMask)
+    pixelIndexes = np.where(pixelSelected)[0]
     
     if pixelIndexes.shape[0] == 0:
         return dict({
@@ -239,7 +257,10 @@ def pixel_based_decode_distance(
             "probabilityImage": np.empty(0)
         })
 
-    pixelTraces = pixelTraces[pixelIndexes]
+    # the selected pixels are decoded in double precision as the
+    # movie may be a single precision view of the images of a zplane
+    pixelTraces = pixelTraces[pixelIndexes].astype(
+        np.float64, copy = False)
     pixelMagnitudes = pixelMagnitudes[pixelIndexes]
     
     normalizedPixelTraces = \
@@ -249,6 +270,7 @@ def pixel_based_decode_distance(
     del pixelTracesCov
     gc.collect()
     
+    from sklearn.neighbors import NearestNeighbors
     neighbors = NearestNeighbors(
         n_neighbors = 1, 
         algorithm = 'ball_tree')
@@ -333,13 +355,24 @@ def calc_pixel_probability(
     probabilityImage[decodedImage > -1] = p
     return probabilityImage
 
-@jit(nopython=True)
+_calPixelMagnitude = None
+
 def cal_pixel_magnitude(x):
 
     """
     Calculate magnitude for pixel trace x 
+
+    The numba compiled function is created at the first call so that
+    numba is only imported by the jobs that decode.
     """
 
+    global _calPixelMagnitude
+    if _calPixelMagnitude is None:
+        from numba import jit
+        _calPixelMagnitude = jit(nopython=True)(_cal_pixel_magnitude)
+    return _calPixelMagnitude(x)
+
+def _cal_pixel_magnitude(x):
     pixelMagnitudes = np.array([ np.linalg.norm(x[i]) \
         for i in range(x.shape[0]) ], dtype=np.float32)
     pixelMagnitudes[pixelMagnitudes == 0] = 1 
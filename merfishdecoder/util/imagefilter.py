@@ -126,6 +126,6 @@ def estimate_scale_factors(obj: zplane.Zplane = None,
 
     return dict(zip(frameNames,
         [ np.median(x[x > 0]) for x in 
-        obj.get_readout_images(frameNames) ]))
+        obj.get_readout_images(frameNames, copy = False) ]))
 
 
@@ -1,7 +1,13 @@
 import hashlib
+import io
+import os
 import numpy as np
 import re
+import threading
 import tifffile
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
 from merfishdecoder.util import dataportal
@@ -31,24 +37,187 @@ from merfishdecoder.util import dataportal
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-def infer_reader(filePortal: dataportal.FilePortal, verbose: bool = False):
+def infer_reader(filePortal: dataportal.FilePortal, verbose: bool = False,
+                 useMemmap: bool = True):
     """
     Given a file name this will try to return the appropriate
     reader based on the file extension.
+
+    If useMemmap is True, local .dax files are memory mapped so that
+    frames are returned as views into the file instead of being read
+    into intermediate buffers.
     """
     ext = filePortal.get_file_extension()
 
     if ext == '.dax':
-        return DaxReader(filePortal, verbose=verbose)
+        return DaxReader(filePortal, verbose=verbose, useMemmap=useMemmap)
     elif ext == ".tif" or ext == ".tiff":
-        if isinstance(filePortal, dataportal.LocalFilePortal):
-            # TODO implement tif reading from s3/gcloud
-            return TifReader(filePortal._fileName, verbose=verbose)
-        else:
-            raise IOError('Loading tiff files from %s is not yet implemented'
-                          % type(filePortal))
+        return TifReader(filePortal, verbose=verbose)
+    elif ext == '.h5':
+        return StoreReader(filePortal, verbose=verbose)
     raise IOError(
-        "only .dax and .tif are supported (case sensitive..)")
+        "only .dax, .tif and .h5 are supported (case sensitive..)")
+
+
+class ReaderPool(object):
+    """
+    A least recently used pool of open readers keyed by image path.
+
+    Opening a reader requires opening the image file and, for .dax files,
+    reading and parsing the .inf sidecar. The pool keeps at most
+    maxOpenReaders readers open and closes the least recently used one when
+    a new reader is needed. Readers checked out with open_reader are
+    counted, and a reader that is evicted while it is checked out is only
+    closed once the last of its users releases it.
+    """
+
+    def __init__(self, maxOpenReaders: int = 64):
+        self._maxOpenReaders = maxOpenReaders
+        self._readers = OrderedDict()
+        self._checkouts = dict()
+        self._evicted = set()
+        self._lock = threading.RLock()
+
+    def get_reader(self, dataPortal: dataportal.DataPortal,
+                   fileName: str) -> 'Reader':
+        """
+        Get an open reader for the specified file, opening a new reader
+        only if the file is not already in the pool.
+
+        Args:
+            dataPortal: the data portal the file belongs to
+            fileName: the name of the image file, relative to the
+                base path of dataPortal or as a full path.
+        Returns: a reader for the file. The reader is owned by the pool
+            and should not be closed by the caller. It can be closed
+            when other threads open more files than the pool holds, so
+            readers used while other threads read from the pool should
+            be checked out with open_reader instead.
+        """
+        return self._get_reader(dataPortal, fileName, checkout=False)
+
+    @contextmanager
+    def open_reader(self, dataPortal: dataportal.DataPortal,
+                    fileName: str):
+        """
+        Check out an open reader for the specified file for the duration
+        of a with block. The reader is not closed while it is checked out,
+        even if it is evicted from the pool.
+
+        Args:
+            dataPortal: the data portal the file belongs to
+            fileName: the name of the image file, relative to the
+                base path of dataPortal or as a full path.
+        """
+        reader = self._get_reader(dataPortal, fileName, checkout=True)
+        try:
+            yield reader
+        finally:
+            self._release(reader)
+
+    def _get_reader(self, dataPortal, fileName, checkout):
+        key = (dataPortal.get_base_path(), fileName)
+        with self._lock:
+            reader = self._readers.get(key)
+            if reader is not None:
+                self._readers.move_to_end(key)
+                if checkout:
+                    self._checkouts[reader] = \
+                        self._checkouts.get(reader, 0) + 1
+                return reader
+
+        # readers are opened without holding the lock so that different
+        # files are opened concurrently. If another thread opened the
+        # same file in the meantime, its reader is used instead.
+        newReader = infer_reader(dataPortal.open_file(fileName))
+        with self._lock:
+            reader = self._readers.get(key)
+            if reader is not None:
+                self._readers.move_to_end(key)
+            else:
+                reader = newReader
+                self._readers[key] = reader
+            if checkout:
+                self._checkouts[reader] = self._checkouts.get(reader, 0) + 1
+            self._evict(self._maxOpenReaders)
+        if reader is not newReader:
+            newReader.close()
+        return reader
+
+    def _evict(self, maxOpenReaders: int) -> None:
+        while len(self._readers) > maxOpenReaders:
+            reader = self._readers.popitem(last=False)[1]
+            if reader in self._checkouts:
+                self._evicted.add(reader)
+            else:
+                reader.close()
+
+    def _release(self, reader: 'Reader') -> None:
+        with self._lock:
+            self._checkouts[reader] -= 1
+            if self._checkouts[reader] > 0:
+                return
+            del self._checkouts[reader]
+            if reader not in self._evicted:
+                return
+            self._evicted.remove(reader)
+        reader.close()
+
+    def set_max_open_readers(self, maxOpenReaders: int) -> None:
+        """
+        Set the maximum number of readers kept open by this pool.
+        """
+        with self._lock:
+            self._maxOpenReaders = maxOpenReaders
+            self._evict(self._maxOpenReaders)
+
+    def close(self) -> None:
+        """
+        Close all the readers in this pool. Readers that are checked out
+        are closed when they are released.
+        """
+        with self._lock:
+            self._evict(0)
+
+
+_readerPool = ReaderPool()
+
+
+def get_reader(dataPortal: dataportal.DataPortal, fileName: str) -> 'Reader':
+    """
+    Get a reader for the specified file from the per-process reader pool.
+    """
+    return _readerPool.get_reader(dataPortal, fileName)
+
+
+def open_reader(dataPortal: dataportal.DataPortal, fileName: str):
+    """
+    Check out a reader for the specified file from the per-process reader
+    pool for the duration of a with block.
+    """
+    return _readerPool.open_reader(dataPortal, fileName)
+
+
+def get_reader_pool() -> ReaderPool:
+    """
+    Get the per-process reader pool.
+    """
+    return _readerPool
+
+
+def _contiguous_runs(frameNumbers: List[int]) -> List[tuple]:
+    """
+    Group frame numbers into runs of adjacent frames.
+
+    Returns: a sorted list of (start, end) tuples where end is exclusive.
+    """
+    runs = []
+    for frameNumber in sorted(set(int(x) for x in frameNumbers)):
+        if len(runs) > 0 and runs[-1][1] == frameNumber:
+            runs[-1][1] = frameNumber + 1
+        else:
+            runs.append([frameNumber, frameNumber + 1])
+    return [tuple(x) for x in runs]
 
 
 class Reader(object):
@@ -74,6 +243,7 @@ class Reader(object):
         self.filename = filename
         self.fileptr = None
         self.verbose = verbose
+        self._memmap = None
 
     def __del__(self):
         self.close()
@@ -163,6 +333,30 @@ class Reader(object):
         assert frame_number < self.number_frames, \
             "Frame number must be less than " + str(self.number_frames)
 
+    def load_frames(self, frame_numbers):
+        """
+        Load multiple frames & return them as a single
+        (frames, height, width) np array.
+        """
+        frames = None
+        for i, frame_number in enumerate(frame_numbers):
+            image_data = self.load_frame(frame_number)
+            if frames is None:
+                frames = np.empty((len(frame_numbers),) + image_data.shape,
+                                  dtype=image_data.dtype)
+            frames[i] = image_data
+        if frames is None:
+            frames = np.empty((0, self.image_height, self.image_width),
+                              dtype=np.uint16)
+        return frames
+
+    def is_memory_mapped(self):
+        """
+        Returns True if frames are returned as views of a memory
+        mapped file.
+        """
+        return self._memmap is not None
+
     def lock_target(self):
         """
         Returns the film focus lock target.
@@ -178,17 +372,48 @@ class DaxReader(Reader):
     """
 
     def __init__(self, filePortal: dataportal.FilePortal,
-                 verbose: bool = False):
+                 verbose: bool = False, useMemmap: bool = True):
         super(DaxReader, self).__init__(
             filePortal.get_file_name(), verbose=verbose)
 
         self._filePortal = filePortal
         infFile = filePortal.get_sibling_with_extension('.inf')
         self._parse_inf(infFile.read_as_text().splitlines())
+        infFile.close()
+
+        if useMemmap and isinstance(filePortal, dataportal.LocalFilePortal):
+            self._memmap = self._map_frames()
+            if self._memmap is not None:
+                # the map keeps its own reference to the file
+                self._filePortal.close()
 
     def close(self):
+        self._memmap = None
         self._filePortal.close()
 
+    def _data_format(self) -> np.dtype:
+        dataFormat = np.dtype('uint16')
+        if self.bigendian:
+            dataFormat = dataFormat.newbyteorder('>')
+        return dataFormat
+
+    def _map_frames(self) -> np.memmap:
+        """
+        Memory map the frames of a local dax file as a read-only
+        (frames, height, width) array. Only complete frames that are
+        present in the file are mapped.
+        """
+        frameBytes = 2 * self.image_height * self.image_width
+        frameCount = min(self.number_frames,
+                         os.path.getsize(self._filePortal.get_file_name())
+                         // frameBytes)
+        if frameCount == 0:
+            return None
+        return np.memmap(self._filePortal.get_file_name(),
+                         dtype=self._data_format(), mode='r',
+                         shape=(frameCount, self.image_height,
+                                self.image_width))
+
     def _parse_inf(self, inf_lines: List[str]) -> None:
         size_re = re.compile(r'frame dimensions = ([\d]+) x ([\d]+)')
         length_re = re.compile(r'number of frames = ([\d]+)')
@@ -246,20 +471,143 @@ class DaxReader(Reader):
         """
         super(DaxReader, self).load_frame(frame_number)
 
+        if self._memmap is not None:
+            return self._memmap[frame_number]
+
         startByte = frame_number * self.image_height * self.image_width * 2
         endByte = startByte + 2*(self.image_height * self.image_width)
 
-        dataFormat = np.dtype('uint16')
-        if self.bigendian:
-            dataFormat = dataFormat.newbyteorder('>')
-
         image_data = np.frombuffer(
             self._filePortal.read_file_bytes(startByte, endByte),
-            dtype=dataFormat)
+            dtype=self._data_format())
         image_data = np.reshape(image_data,
                                 [self.image_height, self.image_width])
         return image_data
 
+    def load_frames(self, frame_numbers):
+        """
+        Load multiple frames & return them as a single
+        (frames, height, width) np array. When the file is memory
+        mapped the frames are gathered with a single copy, otherwise
+        each run of adjacent frames is read with a single request.
+        """
+        for frame_number in frame_numbers:
+            super(DaxReader, self).load_frame(frame_number)
+
+        if self._memmap is not None:
+            return self._memmap[np.asarray(frame_numbers, dtype=np.intp)]
+
+        # read each run of adjacent frames with a single request
+        frameBytes = 2 * self.image_height * self.image_width
+        frames = np.empty(
+            (len(frame_numbers), self.image_height, self.image_width),
+            dtype=self._data_format())
+        runs = _contiguous_runs(frame_numbers)
+        runBytes = self._filePortal.read_ranges(
+            [(start * frameBytes, end * frameBytes) for start, end in runs])
+        for (start, end), runBuffer in zip(runs, runBytes):
+            runData = np.frombuffer(
+                runBuffer, dtype=self._data_format()).reshape(
+                    [end - start, self.image_height, self.image_width])
+            for i, frame_number in enumerate(frame_numbers):
+                if start <= frame_number < end:
+                    frames[i] = runData[frame_number - start]
+        return frames
+
+
+class _FilePortalStream(io.RawIOBase):
+    """
+    A read-only, seekable file-like view of a FilePortal so that tifffile
+    can parse tiff files that are read through ranged requests.
+
+    Small reads are served from a read-ahead buffer so that parsing the
+    tiff header and IFDs does not issue a request for every field. Ranges
+    that are known to be needed, such as the strips of a page, can be
+    fetched together with prefetch().
+    """
+
+    def __init__(self, filePortal: dataportal.FilePortal,
+                 readAheadBytes: int = 65536):
+        super(_FilePortalStream, self).__init__()
+        self._filePortal = filePortal
+        self._size = filePortal.get_size()
+        self._position = 0
+        self._readAheadBytes = readAheadBytes
+        self._buffers = []
+        self._readAhead = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        else:
+            self._position = self._size + offset
+        return self._position
+
+    def prefetch(self, byteRanges: List[tuple]) -> None:
+        """
+        Fetch the specified (start, end) byte ranges with a single
+        read_ranges call and keep them until clear() is called.
+        """
+        byteRanges = [(int(x), int(y)) for x, y in byteRanges if y > x]
+        self._buffers.extend(zip(
+            [x for x, _ in byteRanges],
+            self._filePortal.read_ranges(byteRanges)))
+
+    def clear(self) -> None:
+        """
+        Release the prefetched and read-ahead buffers.
+        """
+        self._buffers = []
+        self._readAhead = None
+
+    def _find_buffered(self, startByte: int, endByte: int) -> bytes:
+        buffers = self._buffers if self._readAhead is None \
+            else self._buffers + [self._readAhead]
+        for bufferStart, bufferData in buffers:
+            if bufferStart <= startByte and \
+                    endByte <= bufferStart + len(bufferData):
+                return bufferData[startByte - bufferStart:
+                                  endByte - bufferStart]
+        return None
+
+    def readinto(self, b):
+        endByte = min(self._position + memoryview(b).nbytes, self._size)
+        if endByte <= self._position:
+            return 0
+
+        data = self._find_buffered(self._position, endByte)
+        if data is None:
+            if endByte - self._position < self._readAheadBytes:
+                bufferEnd = min(self._position + self._readAheadBytes,
+                                self._size)
+                self._readAhead = (self._position,
+                                   self._filePortal.read_file_bytes(
+                                       self._position, bufferEnd))
+                data = self._readAhead[1][:endByte - self._position]
+            else:
+                data = self._filePortal.read_file_bytes(
+                    self._position, endByte)
+
+        memoryview(b).cast('B')[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def close(self):
+        self.clear()
+        self._filePortal.close()
+        super(_FilePortalStream, self).close()
+
 
 class TifReader(Reader):
     """
@@ -269,16 +617,36 @@ class TifReader(Reader):
     1. A normal Tiff file with one frame/image per page.
     2. Tiff files with multiple frames on a single page.
     3. Tiff files with multiple frames on multiple pages.
+
+    Tiff files that are not stored locally are read through the file
+    portal. The IFDs are parsed once and each page is loaded by fetching
+    only the strips or tiles of that page.
+
+    When the image data is uncompressed and contiguous, frames are read
+    directly at their byte offsets, through a memory map for local files.
+    Frames on pages with several frames are read and decoded from only
+    the strips or tiles that belong to the frame.
     """
 
-    def __init__(self, filename, verbose=False):
-        super(TifReader, self).__init__(filename, verbose)
+    def __init__(self, filePortal, verbose=False):
+        if isinstance(filePortal, str):
+            filePortal = dataportal.LocalFilePortal(filePortal)
+        super(TifReader, self).__init__(
+            filePortal.get_file_name(), verbose)
 
         self.page_data = None
         self.page_number = -1
+        self._lock = threading.RLock()
+        self._filePortal = filePortal
+        self._dataOffset = None
 
-        # Save the filename
-        self.fileptr = tifffile.TiffFile(filename)
+        if isinstance(filePortal, dataportal.LocalFilePortal):
+            self._stream = None
+            self.fileptr = tifffile.TiffFile(filePortal.get_file_name())
+        else:
+            self._stream = _FilePortalStream(filePortal)
+            self.fileptr = tifffile.TiffFile(
+                self._stream, name=filePortal.get_file_name())
         number_pages = len(self.fileptr.pages)
 
         # Single page Tiff file, which might be a "ImageJ Tiff"
@@ -288,27 +656,24 @@ class TifReader(Reader):
             # Determines the size without loading the entire file.
             isize = self.fileptr.series[0].shape
 
-            # Check if this is actually just a single frame tiff, if
-            # it is we'll just load it into memory.
+            # Check if this is actually just a single frame tiff.
             if len(isize) == 2:
                 self.frames_per_page = 1
                 self.number_frames = 1
                 self.image_height = isize[0]
                 self.image_width = isize[1]
-                self.page_data = self.fileptr.asarray()
 
-            # Otherwise we'll memmap it in case it is really large.
+            # Otherwise the frames are read individually from the page.
             else:
                 self.frames_per_page = isize[0]
                 self.number_frames = isize[0]
                 self.image_height = isize[1]
                 self.image_width = isize[2]
-                self.page_data = self.fileptr.asarray(out='memmap')
 
         # Multiple page Tiff file.
         #
         else:
-            isize = self.fileptr.asarray(key=0).shape
+            isize = self.fileptr.pages[0].shape
 
             # Check for one frame per page.
             if len(isize) == 2:
@@ -318,52 +683,177 @@ class TifReader(Reader):
                 self.image_width = isize[1]
 
             # Multiple frames per page.
-            #
-            # FIXME: No unit test for this kind of file.
-            #
             else:
                 self.frames_per_page = isize[0]
                 self.number_frames = number_pages * isize[0]
                 self.image_height = isize[1]
                 self.image_width = isize[2]
 
+        self._map_contiguous_frames()
+
         if self.verbose:
             print("{0:0d} frames per page, {1:0d} pages".format(
                 self.frames_per_page, number_pages))
 
+    def close(self):
+        super(TifReader, self).close()
+        self.page_data = None
+        self._memmap = None
+        self._filePortal.close()
+
+    def _frame_bytes(self, dtype: np.dtype) -> int:
+        return self.image_height * self.image_width * dtype.itemsize
+
+    def _raw_dtype(self, page) -> np.dtype:
+        """
+        Get the dtype of the image data stored in the page if it can be
+        used without decoding, otherwise None.
+        """
+        dtype = np.dtype(page.dtype)
+        if page.compression != 1 or page.predictor != 1 \
+                or page.fillorder != 1 \
+                or page.bitspersample != 8 * dtype.itemsize:
+            return None
+        return dtype.newbyteorder(self.fileptr.byteorder)
+
+    def _map_contiguous_frames(self) -> None:
+        """
+        Find the offset of the image data if all the frames are stored
+        uncompressed and contiguously. Local files are then memory mapped.
+        """
+        series = self.fileptr.series[0]
+        dataOffset = getattr(series, 'dataoffset', None)
+        dtype = self._raw_dtype(self.fileptr.pages[0])
+        if dataOffset is None or dtype is None \
+                or np.prod(series.shape) != \
+                self.number_frames * self.image_height * self.image_width:
+            return
+
+        self._dataOffset = dataOffset
+        self._rawDtype = dtype
+        if self._stream is None:
+            self._memmap = np.memmap(
+                self._filePortal.get_file_name(), dtype=dtype, mode='r',
+                offset=dataOffset,
+                shape=(self.number_frames, self.image_height,
+                       self.image_width))
+
+    def _read_page(self, page_number):
+        """
+        Load a page & return it as a np array. For remote files the
+        strips of the page are fetched together before decoding.
+        """
+        if self._stream is None:
+            return self.fileptr.asarray(key=page_number)
+
+        with self._lock:
+            page = self.fileptr.pages[page_number]
+            self._stream.prefetch(
+                [(x, x + y) for x, y in zip(
+                    page.dataoffsets, page.databytecounts)])
+            try:
+                return page.asarray()
+            finally:
+                self._stream.clear()
+
+    def _frame_segments(self, page):
+        """
+        Get the number of strips or tiles that store each frame of a page
+        with several frames, or None if the frames of the page are not
+        stored in separate strips or tiles.
+        """
+        separateSamples, depth, _, _, contigSamples = page.shaped
+        segmentCount = len(page.dataoffsets)
+        if contigSamples != 1 or separateSamples * depth \
+                != self.frames_per_page \
+                or segmentCount % self.frames_per_page != 0:
+            return None
+        if depth > 1 and not (page.is_tiled and page.tiledepth == 1):
+            return None
+        return segmentCount // self.frames_per_page
+
+    def _read_frame_in_page(self, page_number, frame):
+        """
+        Load a single frame from a page with several frames by reading
+        only the image data of that frame.
+        """
+        page = self.fileptr.pages[page_number]
+        segmentsPerFrame = self._frame_segments(page)
+        if segmentsPerFrame is None:
+            with self._lock:
+                if page_number != self.page_number:
+                    self.page_data = self._read_page(page_number)
+                    self.page_number = page_number
+                return self.page_data[frame, :, :]
+
+        segmentIndexes = range(frame * segmentsPerFrame,
+                               (frame + 1) * segmentsPerFrame)
+        offsets = [page.dataoffsets[i] for i in segmentIndexes]
+        byteCounts = [page.databytecounts[i] for i in segmentIndexes]
+
+        # uncompressed frames that are contiguous are read in one request
+        dtype = self._raw_dtype(page)
+        if dtype is not None and all(
+                offsets[i] + byteCounts[i] == offsets[i + 1]
+                for i in range(len(offsets) - 1)) \
+                and sum(byteCounts) == self._frame_bytes(dtype):
+            return np.frombuffer(
+                self._filePortal.read_file_bytes(
+                    offsets[0], offsets[0] + sum(byteCounts)),
+                dtype=dtype).reshape(self.image_height, self.image_width)
+
+        segmentData = self._filePortal.read_ranges(
+            [(x, x + y) for x, y in zip(offsets, byteCounts)])
+        image_data = np.zeros((self.image_height, self.image_width),
+                              dtype=page.dtype)
+
+        def decode_segment(segmentIndex, data):
+            segment, (_, _, y, x, _), _ = page.decode(
+                data, segmentIndex, jpegtables=page.jpegtables)
+            if segment is not None:
+                segment = segment[0, :self.image_height - y,
+                                  :self.image_width - x, 0]
+                image_data[y:y + segment.shape[0],
+                           x:x + segment.shape[1]] = segment
+
+        # decompression releases the GIL so the segments of compressed
+        # frames are decoded in parallel
+        if page.compression != 1 and len(segmentData) > 1:
+            with ThreadPoolExecutor(
+                    max_workers=min(len(segmentData),
+                                    os.cpu_count() or 1)) as executor:
+                list(executor.map(decode_segment, segmentIndexes,
+                                  segmentData))
+        else:
+            for segmentIndex, data in zip(segmentIndexes, segmentData):
+                decode_segment(segmentIndex, data)
+        return image_data
+
     def load_frame(self, frame_number, cast_to_int16=True):
         super(TifReader, self).load_frame(frame_number)
 
-        # All the data is on a single page.
-        if self.number_frames == self.frames_per_page:
-            if self.number_frames == 1:
-                image_data = self.page_data
-            else:
-                image_data = self.page_data[frame_number, :, :]
-
-        # Multiple frames of data on multiple pages.
+        # All the data is stored uncompressed in a single block.
+        if self._memmap is not None:
+            image_data = self._memmap[frame_number]
+        elif self._dataOffset is not None:
+            startByte = self._dataOffset \
+                + frame_number * self._frame_bytes(self._rawDtype)
+            image_data = np.frombuffer(
+                self._filePortal.read_file_bytes(
+                    startByte,
+                    startByte + self._frame_bytes(self._rawDtype)),
+                dtype=self._rawDtype).reshape(
+                    self.image_height, self.image_width)
+
+        # Multiple frames of data on one or more pages.
         elif self.frames_per_page > 1:
-            page = int(frame_number / self.frames_per_page)
-            frame = frame_number % self.frames_per_page
-
-            # This is an optimization for files with a large number of frames
-            # per page. In this case tifffile will keep loading the entire
-            # page over and over again, which really slows everything down.
-            # Ideally tifffile would let us specify which frame on the page
-            # we wanted.
-            #
-            # Since it was going to load the whole thing anyway we'll have
-            # memory overflow either way, so not much we can do about that
-            # except hope for small file sizes.
-            #
-            if page != self.page_number:
-                self.page_data = self.fileptr.asarray(key=page)
-                self.page_number = page
-            image_data = self.page_data[frame, :, :]
+            image_data = self._read_frame_in_page(
+                frame_number // self.frames_per_page,
+                frame_number % self.frames_per_page)
 
         # One frame on each page.
         else:
-            image_data = self.fileptr.asarray(key=frame_number)
+            image_data = self._read_page(frame_number)
 
         assert (len(
             image_data.shape) == 2), "Not a monochrome tif image! " + str(
@@ -374,3 +864,67 @@ class TifReader(Reader):
 
         return image_data
 
+
+class StoreReader(Reader):
+    """
+    Reader for the chunked image store written by convert-raw.
+
+    Each store file holds the raw frames of a single field of view. The
+    readout frames are kept in a "readouts" dataset with (readout, z, y, x)
+    axes and the fiducial frames in a "fiducials" dataset with
+    (fiducial, y, x) axes, holding each fiducial frame shared by several
+    readouts once. Both are chunked by frame, so loading a frame reads
+    and decompresses a single chunk.
+
+    Frames are numbered with the readout frames first, in (readout, z)
+    order, followed by the fiducial frames.
+    """
+
+    # the version of the store layout written by convert-raw
+    STORE_VERSION = 2
+
+    def __init__(self, filePortal, verbose=False):
+        if isinstance(filePortal, str):
+            filePortal = dataportal.LocalFilePortal(filePortal)
+        super(StoreReader, self).__init__(
+            filePortal.get_file_name(), verbose)
+
+        # h5py is imported here so that only the jobs reading converted
+        # images import it
+        import h5py
+
+        self._filePortal = filePortal
+        if isinstance(filePortal, dataportal.LocalFilePortal):
+            self._stream = None
+            self.fileptr = h5py.File(filePortal.get_file_name(), 'r')
+        else:
+            self._stream = _FilePortalStream(filePortal)
+            self.fileptr = h5py.File(self._stream, 'r')
+
+        if self.fileptr.attrs.get('version') != self.STORE_VERSION:
+            raise IOError(
+                "Image store %s was written in an older layout, convert "
+                "it again with convert-raw --overwrite"
+                % filePortal.get_file_name())
+        self._readouts = self.fileptr['readouts']
+        self._fiducials = self.fileptr['fiducials']
+        [readoutCount, self.z_count, self.image_height, self.image_width] = \
+            self._readouts.shape
+        self.readout_frames = readoutCount * self.z_count
+        self.number_frames = self.readout_frames + len(self._fiducials)
+
+        if self.verbose:
+            print("{0:0d} readout frames, {1:0d} fiducial frames".format(
+                self.readout_frames, len(self._fiducials)))
+
+    def close(self):
+        super(StoreReader, self).close()
+        self._filePortal.close()
+
+    def load_frame(self, frame_number):
+        super(StoreReader, self).load_frame(frame_number)
+
+        if frame_number < self.readout_frames:
+            return self._readouts[frame_number // self.z_count,
+                                  frame_number % self.z_count]
+        return self._fiducials[frame_number - self.readout_frames]
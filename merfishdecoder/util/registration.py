@@ -1,88 +1,631 @@
+import os
 import random
 import numpy as np
+import pandas as pd
+from scipy import fft
+from scipy import ndimage
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from skimage import feature, registration, transform
-from skimage.registration import phase_cross_correlation
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
 
 import merfishdecoder
 from merfishdecoder.core import zplane
 from merfishdecoder.util import imagefilter
 from merfishdecoder.util import utilities
 
-def correct_drift(obj, 
-                  frameNames: list = None,
-                  refFrameIndex: int = 0,
-                  highPassSigma: int = 3):
+# the upsample factor of the phase correlation used to estimate the drift
+DRIFT_UPSAMPLE_FACTOR = 100
+
+class PhaseCorrelation(object):
+
+    """
+    Measures the translation of images relative to a reference image by
+    phase cross correlation, following the method of
+    skimage.registration.phase_cross_correlation.
+
+    The spectrum of the reference image is computed once. The spectra
+    and cross correlations of the moving images are computed in batches
+    by the multithreaded scipy FFT. The subpixel shift is refined with an
+    upsampled DFT, first at a coarse factor over 1.5 pixels and then at
+    the full factor only in a small window around the coarse peak.
+    """
+
+    def __init__(self, referenceImage: np.ndarray,
+                 upsampleFactor: int = 100,
+                 batchSize: int = 8,
+                 workers: int = -1):
+        """
+        Args:
+            referenceImage: the image that the moving images are
+                registered to.
+            upsampleFactor: the shifts are measured to within
+                1 / upsampleFactor of a pixel.
+            batchSize: the number of moving images that are transformed
+                together.
+            workers: the number of threads used by the FFT. If it is
+                negative, all the cpus are used.
+        """
+        self._referenceSpectrum = fft.fft2(referenceImage, workers=workers)
+        self._referenceAmplitude = np.sum(np.real(
+            self._referenceSpectrum * self._referenceSpectrum.conj()))
+        self._upsampleFactor = upsampleFactor
+        self._batchSize = batchSize
+        self._workers = workers
+
+        # the coarse stage locates the peak to within a tenth of a pixel
+        # so the full factor is only evaluated over three coarse steps
+        if upsampleFactor > 10:
+            self._refinementStages = [
+                (10, 1.5), (upsampleFactor, 3 / 10)]
+        else:
+            self._refinementStages = [(upsampleFactor, 1.5)]
+
+    def register(self, movingImages) -> list:
+        """
+        Measure the translation of each of the moving images.
+
+        Returns:
+            A list with a tuple (shift, error, phasediff) for each image,
+            as returned by skimage.registration.phase_cross_correlation.
+            The shift is the (row, column) translation that registers
+            the moving image with the reference image.
+        """
+        results = []
+        for start in range(0, len(movingImages), self._batchSize):
+            results.extend(self._register_batch(
+                np.asarray(movingImages[start:start + self._batchSize])))
+        return results
+
+    def _register_batch(self, movingImages: np.ndarray) -> list:
+        if movingImages.shape[1:] != self._referenceSpectrum.shape:
+            raise ValueError("images must be same shape")
+
+        movingSpectra = fft.fft2(movingImages, workers=self._workers)
+        imageProducts = self._referenceSpectrum * movingSpectra.conj()
+        eps = np.finfo(imageProducts.real.dtype).eps
+        imageProducts /= np.maximum(np.abs(imageProducts), 100 * eps)
+        crossCorrelations = fft.ifft2(imageProducts, workers=self._workers)
+
+        shape = np.array(self._referenceSpectrum.shape)
+        midpoint = np.fix(shape / 2)
+        results = []
+        for i in range(len(movingImages)):
+            maxima = np.unravel_index(
+                np.argmax(np.abs(crossCorrelations[i])), tuple(shape))
+            shift = np.array(maxima, dtype=np.float64)
+            shift[shift > midpoint] -= shape[shift > midpoint]
+
+            movingAmplitude = np.sum(np.real(
+                movingSpectra[i] * movingSpectra[i].conj()))
+            amplitudes = self._referenceAmplitude * movingAmplitude
+            if self._upsampleFactor > 1:
+                (shift, ccMax) = self._refine_shift(
+                    imageProducts[i].conj(), shift)
+            else:
+                ccMax = crossCorrelations[i][maxima]
+                amplitudes /= imageProducts[i].size ** 2
+            shift[shape == 1] = 0
+
+            error = np.sqrt(np.abs(
+                1.0 - ccMax * ccMax.conj() / amplitudes))
+            results.append(
+                (shift, error, np.arctan2(ccMax.imag, ccMax.real)))
+        return results
+
+    def _refine_shift(self, imageProduct: np.ndarray, shift: np.ndarray):
+        for (upsampleFactor, window) in self._refinementStages:
+            upsampleFactor = np.float64(upsampleFactor)
+            shift = np.round(shift * upsampleFactor) / upsampleFactor
+            regionSize = int(np.ceil(upsampleFactor * window))
+            dftShift = np.fix(regionSize / 2.0)
+            crossCorrelation = _upsampled_dft(
+                imageProduct, regionSize, upsampleFactor,
+                dftShift - shift * upsampleFactor).conj()
+            maxima = np.unravel_index(
+                np.argmax(np.abs(crossCorrelation)), crossCorrelation.shape)
+            ccMax = crossCorrelation[maxima]
+            shift = shift + (np.array(maxima) - dftShift) / upsampleFactor
+        return shift, ccMax
+
+def _upsampled_dft(data: np.ndarray, regionSize: int,
+                   upsampleFactor: float, offsets: np.ndarray) -> np.ndarray:
+    """
+    Compute the DFT of data upsampled by upsampleFactor over a
+    regionSize wide region starting at offsets, by matrix multiplication.
+    """
+    for (itemCount, offset) in list(zip(data.shape, offsets))[::-1]:
+        kernel = np.exp(-2j * np.pi * (
+            (np.arange(regionSize) - offset)[:, None]
+            * fft.fftfreq(itemCount, upsampleFactor)))
+        data = np.tensordot(kernel, data, axes=(1, -1))
+    return data
+
+def shift_image(image: np.ndarray,
+                shift: np.ndarray) -> np.ndarray:
+
+    """
+    Translate an image by a subpixel shift with bilinear interpolation.
+
+    This is equivalent to transform.warp with a
+    SimilarityTransform(translation=[-shift[1], -shift[0]]) and
+    preserve_range=True, but is computed as two separable passes of
+    whole-array float32 operations instead of a per-pixel inverse map.
+    Each pass interpolates as a + f * (b - a) so that flat regions keep
+    their exact values.
+
+    Args:
+        image: a 2D image.
+
+        shift: the (row, column) translation. Pixels shifted in from
+                  outside the image are 0.
+
+    Returns:
+        A float32 image.
+    """
+
+    shifted = image
+    for axis in [1, 0]:
+        shifted = _shift_axis(shifted, -shift[axis], axis)
+    return shifted
+
+def _shift_axis(image: np.ndarray,
+                offset: float,
+                axis: int) -> np.ndarray:
     
+    # output[i] = a[i] + f * (b[i] - a[i]) where a[i] = image[i + k],
+    # b[i] = image[i + k + 1] and k and f are the integer and fractional
+    # parts of offset
+    start = int(np.floor(offset))
+    fraction = np.float32(offset - start)
+    output = _shifted_copy(image, start, axis)
+    if fraction > 0:
+        difference = _shifted_copy(image, start + 1, axis)
+        difference -= output
+        difference *= fraction
+        output += difference
+    return output
+
+def _shifted_copy(image: np.ndarray,
+                  offset: int,
+                  axis: int) -> np.ndarray:
+    
+    output = np.zeros(image.shape, dtype=np.float32)
+    itemCount = image.shape[axis]
+    if abs(offset) < itemCount:
+        outputIndex = [slice(None)] * image.ndim
+        imageIndex = [slice(None)] * image.ndim
+        outputIndex[axis] = slice(
+            max(0, -offset), min(itemCount, itemCount - offset))
+        imageIndex[axis] = slice(
+            max(0, offset), min(itemCount, itemCount + offset))
+        output[tuple(outputIndex)] = image[tuple(imageIndex)]
+    return output
+
+def get_warp_coordinates(transformation,
+                         shape: tuple) -> np.ndarray:
+
     """
-    Correct mechanical drift using fiducial images.
+    Evaluate the inverse map of a geometric transform, such as a
+    chromatic aberration profile, at every pixel of an image.
 
-    Args: 
+    Args:
+        transformation: a skimage transform that maps output (x, y)
+                  coordinates to input (x, y) coordinates, as used by
+                  transform.warp.
+
+        shape: the (rows, columns) shape of the image.
+
+    Returns:
+        A (2, rows, columns) array with the input row and column
+        coordinates of each output pixel.
+    """
+
+    (rows, cols) = np.indices(shape)
+    inputCoordinates = transformation(
+        np.column_stack([cols.ravel(), rows.ravel()]))
+    return np.stack([
+        inputCoordinates[:, 1].reshape(shape),
+        inputCoordinates[:, 0].reshape(shape)])
+
+def warp_shifted_image(image: np.ndarray,
+                       transformation,
+                       shift: np.ndarray,
+                       coordinates: np.ndarray = None) -> np.ndarray:
+
+    """
+    Translate an image by shift and then warp it with a geometric
+    transform, in a single bilinear resampling of the image.
+
+    Args:
+        image: a 2D image.
+
+        transformation: a skimage transform that maps output (x, y)
+                  coordinates to input (x, y) coordinates, as used by
+                  transform.warp.
+
+        shift: the (row, column) translation applied before the warp.
+
+        coordinates: the inverse map of transformation as returned by
+                  get_warp_coordinates. It is only used for transforms
+                  that are not described by a matrix and is computed
+                  if it is not provided.
+
+    Returns:
+        A float64 image.
+    """
+
+    # the translation composes with a matrix transform into another
+    # matrix, which warp resamples without evaluating a coordinate map
+    if isinstance(transformation, transform.ProjectiveTransform):
+        shiftMatrix = np.array([[1, 0, -shift[1]],
+                                [0, 1, -shift[0]],
+                                [0, 0, 1]])
+        return transform.warp(
+            image,
+            transform.ProjectiveTransform(
+                matrix = shiftMatrix @ transformation.params),
+            preserve_range = True)
+
+    if coordinates is None:
+        coordinates = get_warp_coordinates(transformation, image.shape)
+    return ndimage.map_coordinates(
+        image, coordinates - np.asarray(shift)[:, None, None],
+        output = np.float64, order = 1, mode = "grid-constant", cval = 0,
+        prefilter = False)
+
+def remap_shifted_image(image: np.ndarray,
+                        colorMap: np.ndarray,
+                        shift: np.ndarray = None) -> np.ndarray:
+
+    """
+    Translate an image by shift and then warp it with a remap table,
+    in a single bilinear resampling of the image. The resampling uses
+    the remap of OpenCV, which quantizes the coordinates to 1/32 of a
+    pixel, and scipy when OpenCV is not installed.
+
+    Args:
+        image: a 2D image.
+
+        colorMap: the (2, rows, columns) input row and column coordinates
+                  of each output pixel, as returned by
+                  dataset.get_chromatic_aberration_maps.
+
+        shift: the (row, column) translation applied before the warp.
+
+    Returns:
+        A float64 image. Pixels mapped from outside of the image are 0.
+    """
+
+    if cv2 is not None:
+        (rowShift, colShift) = (0, 0) if shift is None else shift
+        return cv2.remap(
+            np.asarray(image, dtype = np.float32),
+            np.subtract(colorMap[1], colShift, dtype = np.float32),
+            np.subtract(colorMap[0], rowShift, dtype = np.float32),
+            interpolation = cv2.INTER_LINEAR,
+            borderMode = cv2.BORDER_CONSTANT,
+            borderValue = 0).astype(np.float64)
+
+    coordinates = colorMap if shift is None \
+        else colorMap - np.asarray(shift)[:, None, None]
+    return ndimage.map_coordinates(
+        image, coordinates,
+        output = np.float64, order = 1, mode = "grid-constant", cval = 0,
+        prefilter = False)
+
+def _get_color_corrections(obj,
+                           frameNames: list,
+                           profile: dict,
+                           colorMaps: dict) -> dict:
+
+    """
+    Get a function for each frame that resamples its readout image,
+    with a shift, through the remap table or the profile of its color.
+    Frames that have neither are not in the returned dictionary.
+    """
+
+    corrections = dict()
+    colorCorrections = dict()
+    for (fn, frameColor) in zip(frameNames, obj.get_image_color(frameNames)):
+        if frameColor not in colorCorrections:
+            shape = obj._frames[fn]._img.shape
+            if colorMaps is not None and frameColor in colorMaps \
+                    and colorMaps[frameColor].shape[1:] == shape:
+                colorCorrections[frameColor] = partial(
+                    _remap_correction, colorMaps[frameColor])
+            elif profile is not None and frameColor in profile:
+                # the profile of each color is evaluated only once
+                coordinates = None \
+                    if isinstance(profile[frameColor],
+                                  transform.ProjectiveTransform) \
+                    else get_warp_coordinates(profile[frameColor], shape)
+                colorCorrections[frameColor] = partial(
+                    _warp_correction, profile[frameColor], coordinates)
+            else:
+                colorCorrections[frameColor] = None
+        if colorCorrections[frameColor] is None:
+            utilities.print_warning(
+                "%s does not have color profile\n" % fn)
+        else:
+            corrections[fn] = colorCorrections[frameColor]
+    return corrections
+
+def _remap_correction(colorMap, image, shift):
+    return remap_shifted_image(image, colorMap, shift).astype(np.uint16)
+
+def _warp_correction(transformation, coordinates, image, shift):
+    return warp_shifted_image(
+        image, transformation, shift, coordinates).astype(np.uint16)
+
+def estimate_drift(obj,
+                   frameNames: list = None,
+                   refFrameIndex: int = 0,
+                   highPassSigma: int = 3) -> tuple:
+
+    """
+    Estimate the mechanical drift of the frames from their fiducial
+    images. The fiducial images are loaded if they are not loaded yet
+    and are high pass filtered in place.
+
+    Args:
         obj: a Zplane object
-                             
-        frameNames: a list of read names to perform correction.
 
-        profile: a dictionary object that contains chromatic 
-                  aberration correction profile.
+        frameNames: a list of read names to estimate the drift of.
 
         refFrameIndex: index of the frame used as referenece
                   image for calculating the drift offset.
 
-    Returns: 
-        A Zplane object
+        highPassSigma: the sigma of the high pass filter applied to
+                  the fiducial images.
+
+    Returns:
+        A tuple of two dictionaries with the (row, column) offset and
+        the registration error of each frame.
     """
-    
+
     frameNames = obj.get_readout_name() \
         if frameNames is None else frameNames
-    
-    if obj.get_readout_image_from_readout_name(
-            frameNames[refFrameIndex]) is None:
-        obj.load_readout_images(
-            readoutNames = frameNames)
 
     if obj.get_fiducial_image_from_readout_name(
             frameNames[refFrameIndex]) is None:
-        obj.load_fiducial_images(
-            readoutNames = frameNames)
-    
+        obj.load_images(
+            readoutNames = frameNames,
+            readoutImages = False,
+            fiducialImages = True)
+
+    # readouts that share a fiducial frame are registered once
+    fiducialGroups = obj.get_fiducial_groups(frameNames)
+    groupNames = [ x[0] for x in fiducialGroups ]
+    frameGroupNames = dict([ (fn, x[0]) \
+        for x in fiducialGroups for fn in x ])
+
     obj = imagefilter.high_pass_filter(obj,
-        frameNames = frameNames,
+        frameNames = groupNames,
         readoutImage = False,
         fiducialImage = True,
         sigma = highPassSigma)
 
     fiducials = obj.get_fiducial_images(
-        frameNames);
+        groupNames);
+    refFiducial = fiducials[groupNames.index(
+        frameGroupNames[frameNames[refFrameIndex]])]
     
     # align all images to the ref image;
     random.seed(1);
-    pcc = dict(zip(frameNames, [
-        phase_cross_correlation(
-            fiducials[refFrameIndex], 
-            x, upsample_factor = 100) \
-            for x in fiducials]))
+    groupPcc = dict(zip(groupNames, PhaseCorrelation(
+        refFiducial, upsampleFactor = DRIFT_UPSAMPLE_FACTOR
+        ).register(fiducials)))
+    pcc = dict([ (fn, groupPcc[frameGroupNames[fn]]) \
+        for fn in frameNames ])
     
     offsets = dict([ [k, x[0]] for k, x in pcc.items() ])
     errors = dict([ (k, x[1]) for k, x in pcc.items() ])
+    return (offsets, errors)
+
+def _drift_key(driftTable: pd.DataFrame,
+               referenceName: str,
+               highPassSigma: int,
+               dataVersion: str) -> pd.Series:
+
+    """
+    Get the rows of the drift table that were estimated with the same
+    reference, filter and upsample factor from the same fiducial images.
+    """
+
+    return (driftTable["referenceName"] == referenceName) & \
+        np.isclose(driftTable["highPassSigma"], highPassSigma) & \
+        (driftTable["upsampleFactor"] == DRIFT_UPSAMPLE_FACTOR) & \
+        (driftTable["dataVersion"] == dataVersion)
+
+def _lookup_drift(obj,
+                  frameNames: list,
+                  refFrameIndex: int,
+                  highPassSigma: int,
+                  dataVersion: str):
+
+    """
+    Look up the drift of the frames in the drift table of the field of
+    view. Returns None if any of the frames is not in the table.
+    """
+
+    driftTable = obj.load_drift_table()
+    if driftTable is None or "dataVersion" not in driftTable:
+        return None
+    driftTable = driftTable[_drift_key(
+        driftTable, frameNames[refFrameIndex], highPassSigma, dataVersion)
+        ].set_index("readoutName")
+    if not all(fn in driftTable.index for fn in frameNames):
+        return None
+    driftTable = driftTable.loc[frameNames]
+    offsets = dict(zip(frameNames, driftTable[
+        ["rowShift", "columnShift"]].to_numpy(dtype=np.float64)))
+    errors = dict(zip(frameNames, driftTable["error"].tolist()))
+    return (offsets, errors)
+
+def _save_drift(obj,
+                frameNames: list,
+                refFrameIndex: int,
+                highPassSigma: int,
+                dataVersion: str,
+                offsets: dict,
+                errors: dict):
+
+    """
+    Add the drift of the frames to the drift table of the field of view,
+    replacing the rows estimated with the same key and dropping the rows
+    estimated from other versions of the fiducial images.
+    """
+
+    newTable = pd.DataFrame({
+        "readoutName": frameNames,
+        "referenceName": frameNames[refFrameIndex],
+        "highPassSigma": highPassSigma,
+        "upsampleFactor": DRIFT_UPSAMPLE_FACTOR,
+        "dataVersion": dataVersion,
+        "rowShift": [ offsets[fn][0] for fn in frameNames ],
+        "columnShift": [ offsets[fn][1] for fn in frameNames ],
+        "error": [ errors[fn] for fn in frameNames ]})
+    driftTable = obj.load_drift_table()
+    if driftTable is not None and "dataVersion" in driftTable:
+        driftTable = driftTable[
+            (driftTable["dataVersion"] == dataVersion) & \
+            ~(_drift_key(driftTable, frameNames[refFrameIndex],
+                         highPassSigma, dataVersion) & \
+              driftTable["readoutName"].isin(frameNames))]
+        newTable = pd.concat([driftTable, newTable], ignore_index = True)
+    obj.save_drift_table(newTable)
+
+def correct_drift(obj, 
+                  frameNames: list = None,
+                  refFrameIndex: int = 0,
+                  highPassSigma: int = 3,
+                  numThreads: int = None,
+                  profile: dict = None,
+                  colorMaps: dict = None,
+                  reuseDrift: bool = False):
     
-    transformations = dict([ (k, transform.SimilarityTransform(
-        translation=[ -x[1], -x[0]])) for k, x in offsets.items() ])
+    """
+    Correct mechanical drift using fiducial images.
+
+    Args: 
+        obj: a Zplane object
+                             
+        frameNames: a list of read names to perform correction.
+
+        refFrameIndex: index of the frame used as referenece
+                  image for calculating the drift offset.
+
+        numThreads: the number of threads used to shift the images.
+                  If it is None, one thread per cpu is used.
+
+        profile: a dictionary object that contains chromatic 
+                  aberration correction profile. If it is provided, the
+                  chromatic aberration of the readout images is corrected
+                  in the same resampling as the drift, instead of by a
+                  second warp in correct_chromatic_aberration.
+
+        colorMaps: the remap tables of the chromatic aberration profile
+                  for each color, as returned by
+                  Zplane.get_chromatic_aberration_maps. They are used
+                  instead of the profile for the colors they contain.
+
+        reuseDrift: a boolen variable indicates whether the drift is
+                  looked up in the drift table of the field of view. The
+                  drift of the frames that are not in the table is
+                  estimated and added to the table. Fiducial images are
+                  not loaded when all the frames are in the table. The
+                  table is locked from the lookup to the update, so
+                  concurrent jobs of a field of view estimate the drift
+                  once.
+
+    Returns: 
+        A Zplane object
+    """
+    
+    frameNames = obj.get_readout_name() \
+        if frameNames is None else frameNames
+
+    loadReadouts = obj.get_readout_image_from_readout_name(
+        frameNames[refFrameIndex]) is None
+
+    def load_and_estimate_drift():
+        # readout and fiducial images are read from the files together
+        loadFiducials = obj.get_fiducial_image_from_readout_name(
+            frameNames[refFrameIndex]) is None
+        if loadReadouts or loadFiducials:
+            obj.load_images(
+                readoutNames = frameNames,
+                readoutImages = loadReadouts,
+                fiducialImages = loadFiducials)
+        return estimate_drift(
+            obj, frameNames, refFrameIndex, highPassSigma)
+
+    if reuseDrift:
+        with obj.lock_drift_table():
+            dataVersion = obj.get_fiducial_version()
+            drift = _lookup_drift(
+                obj, frameNames, refFrameIndex, highPassSigma, dataVersion)
+            estimated = drift is None
+            if estimated:
+                drift = load_and_estimate_drift()
+                _save_drift(obj, frameNames, refFrameIndex, highPassSigma,
+                            dataVersion, *drift)
+    else:
+        estimated = True
+        drift = load_and_estimate_drift()
+    (offsets, errors) = drift
+
+    if loadReadouts and not estimated:
+        obj.load_images(
+            readoutNames = frameNames,
+            readoutImages = True,
+            fiducialImages = False)
+
+    # fiducial images are only shifted when they are loaded, and are
+    # filtered as they would be for estimating the drift
+    fiducialGroups = [ x for x in obj.get_fiducial_groups(frameNames) \
+        if obj.get_fiducial_image_from_readout_name(x[0]) is not None ]
+    if not estimated and len(fiducialGroups) > 0:
+        obj = imagefilter.high_pass_filter(obj,
+            frameNames = [ x[0] for x in fiducialGroups ],
+            readoutImage = False,
+            fiducialImage = True,
+            sigma = highPassSigma)
     
-    for fn in frameNames:
-        obj._frames[fn]._fiducial = transform.warp(
-                obj._frames[fn]._fiducial, 
-                transformations[fn], 
-                preserve_range=True
-                ).astype(np.uint16)
-        obj._frames[fn]._img = transform.warp(
-                obj._frames[fn]._img, 
-                transformations[fn], 
-                preserve_range=True
-                ).astype(np.uint16); 
+    def shift_fiducial(fiducialGroup):
+        fiducial = shift_image(
+            obj._frames[fiducialGroup[0]]._fiducial,
+            offsets[fiducialGroup[0]]).astype(np.uint16)
+        for fn in fiducialGroup:
+            obj._frames[fn]._fiducial = fiducial
+
+    corrections = dict() if profile is None and colorMaps is None \
+        else _get_color_corrections(obj, frameNames, profile, colorMaps)
+
+    def shift_readout(fn):
+        if fn in corrections:
+            obj._frames[fn]._img = corrections[fn](
+                obj._frames[fn]._img, offsets[fn])
+        else:
+            obj._frames[fn]._img = shift_image(
+                obj._frames[fn]._img,
+                offsets[fn]).astype(np.uint16)
+
+    with ThreadPoolExecutor(max_workers = numThreads \
+            if numThreads is not None else os.cpu_count()) as executor:
+        list(executor.map(shift_fiducial, fiducialGroups))
+        list(executor.map(shift_readout, frameNames))
     return (obj, errors)
 
 def correct_chromatic_aberration(obj, 
                                  frameNames: list = None,
-                                 profile: dict = None):
+                                 profile: dict = None,
+                                 colorMaps: dict = None):
 
     """
     Correct the chromatic aberration.
@@ -95,22 +638,19 @@ def correct_chromatic_aberration(obj,
         profile: A dictionary object that contains chromatic 
             aberration correction profile. The profile was
             generated prior to the experiment.
+
+        colorMaps: the remap tables of the profile for each color, as
+            returned by Zplane.get_chromatic_aberration_maps. They are
+            used instead of the profile for the colors they contain.
                 
     Returns: 
         A Zplane object.
     """
     frameNames = obj.get_readout_name() \
         if frameNames is None else frameNames
-    for fn in frameNames:
-        frameColor = obj.get_image_color([fn])[0]
-        if frameColor in profile:
-            obj._frames[fn]._img = transform.warp(
-                obj.get_readout_image_from_readout_name(fn), 
-                profile[frameColor], 
-                preserve_range=True
-                ).astype("uint16");
-        else:
-            utilities.print_warning(
-                "%s does not have color profile\n" % fn)
+    corrections = _get_color_corrections(
+        obj, frameNames, profile, colorMaps)
+    for fn, correction in corrections.items():
+        obj._frames[fn]._img = correction(
+            obj.get_readout_image_from_readout_name(fn), np.zeros(2))
     return obj
-
@@ -1,5 +1,4 @@
 import numpy as np
-import geopandas as geo
 import pandas as pd
 from skimage.segmentation import find_boundaries
 from shapely.geometry import Polygon
@@ -9,12 +8,9 @@ from scipy.sparse.csgraph import connected_components
 from merfishdecoder.core import zplane
 from merfishdecoder.core import dataset
 
-from cellpose import utils
-from cellpose import models
-
 def connect_features_per_fov(
     dataSet,
-    features: geo.geodataframe.GeoDataFrame,
+    features: 'geopandas.GeoDataFrame',
     bufferSize = 15,
     fov: int = None):
     
@@ -112,6 +108,7 @@ def run_cell_pose(
         labelled image, where 0=no masks; 1,2,...=mask labels
     """
     
+    from cellpose import models
     model = models.Cellpose(
         gpu = gpu, 
         model_type = modelType)
@@ -127,14 +124,15 @@ def run_cell_pose(
 
 def global_align_features_per_fov(
     dataSet,
-    features: geo.geodataframe.GeoDataFrame,
+    features: 'geopandas.GeoDataFrame',
     fov: int = None):
     x = features[features.fov == fov]
+    (offsetX, offsetY) = \
+        dataSet.get_global_coordinates().get_fov_offset(fov)
     x = x.assign(geometry = x.affine_transform(
         [dataSet.get_microns_per_pixel(), 0, 
         0, dataSet.get_microns_per_pixel(), 
-        dataSet.get_fov_offset(fov)[0], 
-        dataSet.get_fov_offset(fov)[1]]))
+        float(offsetX), float(offsetY)]))
     
     x = x.assign(global_x = x.centroid.x)
     x = x.assign(global_y = x.centroid.y)
@@ -142,7 +140,7 @@ def global_align_features_per_fov(
 
 def filter_features_per_fov(
     dataSet,
-    features: geo.geodataframe.GeoDataFrame,
+    features: 'geopandas.GeoDataFrame',
     fov: int = None,
     minZplane: int = 2,
     borderSize: int = 80):
@@ -1,5 +1,4 @@
 import cv2
-import h5py 
 import scipy
 from scipy import ndimage
 import hashlib
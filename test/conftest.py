@@ -0,0 +1,165 @@
+import itertools
+import json
+import os
+import pickle
+
+import numpy as np
+import pytest
+import tifffile
+from skimage import transform
+
+import merfishdecoder
+from merfishdecoder.core import dataset
+from merfishdecoder.util import imagereader
+
+IMAGE_SIZE = 64
+COLORS = ['750', '650', '560']
+ZPOSITIONS = [1.0, 2.0]
+ROUND_COUNT = 2
+FOV_COUNT = 2
+FRAME_COUNT = 1 + len(COLORS) * len(ZPOSITIONS)
+FILE_PATTERN = \
+    '(?P<imageType>[\\w|-]+)_(?P<fov>[0-9]+)_(?P<imagingRound>[0-9]+)'
+
+
+def _write_parameters(parametersHome):
+    for d in ['codebooks', 'dataorganization', 'positions', 'microscope']:
+        os.makedirs(os.path.join(parametersHome, d), exist_ok=True)
+
+    rows = []
+    bit = 0
+    for imagingRound in range(ROUND_COUNT):
+        for colorIndex, color in enumerate(COLORS):
+            bit += 1
+            frames = [1 + colorIndex * len(ZPOSITIONS) + i
+                      for i in range(len(ZPOSITIONS))]
+            rows.append(','.join([
+                'bit%d' % bit, 'RS%04d' % bit, 'Conv_zscan', FILE_PATTERN,
+                str(bit), str(imagingRound), color,
+                '[%s]' % ' '.join(str(x) for x in frames),
+                '[%s]' % ' '.join(str(x) for x in ZPOSITIONS),
+                'Conv_zscan', FILE_PATTERN, str(imagingRound), '0', '405']))
+    with open(os.path.join(parametersHome, 'dataorganization',
+                           'test_data_organization.csv'), 'w') as f:
+        f.write('channelName,readoutName,imageType,imageRegExp,bitNumber,'
+                'imagingRound,color,frame,zPos,fiducialImageType,'
+                'fiducialRegExp,fiducialImagingRound,fiducialFrame,'
+                'fiducialColor\n')
+        f.write('\n'.join(rows) + '\n')
+
+    bitNames = ['RS%04d' % (i + 1) for i in range(bit)]
+    with open(os.path.join(parametersHome, 'codebooks',
+                           'test_codebook.csv'), 'w') as f:
+        f.write('name,id,%s\n' % ','.join(bitNames))
+        for i, onBits in enumerate(itertools.combinations(range(bit), 2)):
+            barcode = ['1' if x in onBits else '0' for x in range(bit)]
+            f.write('%s,id%d,%s\n' % (
+                'Blank-%d' % i if i % 5 == 0 else 'Gene%d' % i, i,
+                ','.join(barcode)))
+
+    np.savetxt(os.path.join(parametersHome, 'positions', 'test_positions.csv'),
+               np.array([[0, 0], [6.0, 0]]), delimiter=',')
+
+    with open(os.path.join(parametersHome, 'microscope',
+                           'test_microscope_parameters.json'), 'w') as f:
+        json.dump({'flip_horizontal': True, 'flip_vertical': False,
+                   'transpose': True, 'microns_per_pixel': 0.1,
+                   'image_dimensions': [IMAGE_SIZE, IMAGE_SIZE]}, f)
+    with open(os.path.join(parametersHome, 'microscope',
+                           'test_chromatic_aberration.pkl'), 'wb') as f:
+        pickle.dump(dict((color, transform.SimilarityTransform(
+            translation=(0.3 * i, -0.2 * i))) for i, color in enumerate(COLORS)),
+            f)
+
+
+def _write_raw_images(dataPath, extension):
+    os.makedirs(dataPath, exist_ok=True)
+    randomState = np.random.RandomState(0)
+    for fov in range(FOV_COUNT):
+        for imagingRound in range(ROUND_COUNT):
+            images = randomState.randint(
+                100, 1000, size=(FRAME_COUNT, IMAGE_SIZE, IMAGE_SIZE)
+                ).astype('<u2')
+            baseName = os.path.join(
+                dataPath, 'Conv_zscan_%02d_%d' % (fov, imagingRound))
+            if extension == '.dax':
+                images.tofile(baseName + '.dax')
+                with open(baseName + '.inf', 'w') as f:
+                    f.write('frame dimensions = %d x %d\n'
+                            'number of frames = %d\n little endian\n'
+                            % (IMAGE_SIZE, IMAGE_SIZE, FRAME_COUNT))
+            else:
+                tifffile.imwrite(baseName + extension, images)
+
+
+@pytest.fixture(scope='session')
+def merfish_homes(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp('merfishdecoder'))
+    homes = dict(
+        DATA_HOME=os.path.join(root, 'data'),
+        ANALYSIS_HOME=os.path.join(root, 'analysis'),
+        PARAMETERS_HOME=os.path.join(root, 'parameters'))
+    homes.update(
+        CODEBOOK_HOME=os.path.join(homes['PARAMETERS_HOME'], 'codebooks'),
+        DATA_ORGANIZATION_HOME=os.path.join(
+            homes['PARAMETERS_HOME'], 'dataorganization'),
+        POSITION_HOME=os.path.join(homes['PARAMETERS_HOME'], 'positions'),
+        MICROSCOPE_PARAMETERS_HOME=os.path.join(
+            homes['PARAMETERS_HOME'], 'microscope'))
+    previous = dict((k, getattr(merfishdecoder, k, None)) for k in homes)
+    for k, v in homes.items():
+        setattr(merfishdecoder, k, v)
+    _write_parameters(homes['PARAMETERS_HOME'])
+
+    yield homes
+
+    for k, v in previous.items():
+        setattr(merfishdecoder, k, v)
+
+
+def _create_dataset(homes, dataSetName, extension):
+    _write_raw_images(os.path.join(homes['DATA_HOME'], dataSetName), extension)
+    microscopeHome = homes['MICROSCOPE_PARAMETERS_HOME']
+    dataset.MERFISHDataSet(
+        dataSetName,
+        codebookNames=['test_codebook.csv'],
+        dataOrganizationName='test_data_organization.csv',
+        positionFileName='test_positions.csv',
+        dataHome=homes['DATA_HOME'],
+        analysisHome=homes['ANALYSIS_HOME'],
+        microscopeParametersName=os.path.join(
+            microscopeHome, 'test_microscope_parameters.json'),
+        microscopeChromaticAberrationName=os.path.join(
+            microscopeHome, 'test_chromatic_aberration.pkl'))
+    return dataSetName
+
+
+@pytest.fixture(scope='session')
+def create_dataset(merfish_homes):
+    """Create a new data set with raw images of the given extension, for
+    tests that modify the analysis directory."""
+    return lambda dataSetName, extension: _create_dataset(
+        merfish_homes, dataSetName, extension)
+
+
+@pytest.fixture(scope='session')
+def dax_dataset(create_dataset):
+    return create_dataset('test_dax', '.dax')
+
+
+@pytest.fixture(scope='session')
+def tif_dataset(create_dataset):
+    return create_dataset('test_tif', '.tif')
+
+
+@pytest.fixture(params=['.dax', '.tif'])
+def raw_dataset(request, merfish_homes):
+    return request.getfixturevalue(
+        'dax_dataset' if request.param == '.dax' else 'tif_dataset')
+
+
+@pytest.fixture(autouse=True)
+def clear_shared_state():
+    yield
+    dataset.clear_merfish_datasets()
+    imagereader.get_reader_pool().close()
@@ -0,0 +1,36 @@
+import numpy as np
+
+from merfishdecoder.core import dataset
+from merfishdecoder.data import codebook
+
+
+def test_barcode_lookups_use_the_dataframe_index(dax_dataset):
+    dataSet = dataset.MERFISHDataSet(dax_dataset)
+    cb = dataSet.get_codebook()
+    data = cb.get_data()
+    blankIndexes = list(cb.get_blank_indexes())
+    assert blankIndexes == [i for i in range(len(data))
+                            if data['name'][i].startswith('Blank')]
+    assert cb.is_blank(blankIndexes).all()
+    assert not cb.is_coding(blankIndexes).any()
+    assert cb.is_coding(list(cb.get_coding_indexes())).all()
+
+    matrix = cb.get_barcode_matrix()
+    assert np.array_equal(matrix, cb.get_barcodes())
+    assert np.allclose(np.linalg.norm(
+        cb.get_normalized_barcode_matrix(), axis=1), 1)
+
+    # the barcode indexes are labels of the index, not positions
+    shiftedData = data.iloc[::-1].copy()
+    shiftedData.index = shiftedData.index + 100
+    shifted = codebook.Codebook.from_snapshot(dataSet, shiftedData)
+    labels = np.array([[100, 101], [100 + blankIndexes[1], -1]])
+    assert np.array_equal(
+        shifted.is_blank(labels),
+        shiftedData['name'].reindex(labels.ravel()).fillna('').str
+        .startswith('Blank').to_numpy().reshape(labels.shape))
+    assert not shifted.is_coding([0, -1, 100 + len(data)]).any()
+    assert shifted.get_barcode(100 + blankIndexes[1]) \
+        == cb.get_barcode(blankIndexes[1])
+    assert list(shifted.get_blank_indexes()) == \
+        sorted([100 + i for i in blankIndexes], reverse=True)
@@ -0,0 +1,103 @@
+import os
+import shutil
+import sys
+
+import h5py
+import numpy as np
+import pytest
+
+from merfishdecoder import parser
+from merfishdecoder.core import dataset
+from merfishdecoder.core import zplane
+from merfishdecoder.util import dataportal
+from merfishdecoder.util import imagereader
+
+
+@pytest.fixture(params=['.dax', '.tif'])
+def converted_dataset(request, create_dataset, monkeypatch):
+    dataSetName = 'test_convert_' + request.param[1:]
+    create_dataset(dataSetName, request.param)
+    zplanes = dict()
+    for fov in range(2):
+        for zpos in [1.0, 2.0]:
+            zp = zplane.Zplane(dataSetName, fov=fov, zpos=zpos)
+            zp.load_images()
+            zplanes[(fov, zpos)] = zp
+
+    # convert through the command line
+    monkeypatch.setattr(sys, 'argv', [
+        'merfishdecoder', 'convert-raw', '--data-set-name', dataSetName,
+        '--compression', 'gzip'])
+    parser.parse_args()
+    dataset.clear_merfish_datasets()
+    imagereader.get_reader_pool().close()
+
+    yield dataSetName, zplanes
+    shutil.rmtree(dataset.get_merfish_dataset(dataSetName).rawStorePath)
+
+
+def test_store_frames_match_raw_images(converted_dataset):
+    dataSetName, _ = converted_dataset
+    dataSet = dataset.get_merfish_dataset(dataSetName)
+    dataOrganization = dataSet.get_data_organization()
+
+    for fov in range(2):
+        storeFileName = dataSet.get_raw_store_file_name(fov)
+        assert storeFileName is not None
+        storeReader = imagereader.StoreReader(
+            dataportal.LocalFilePortal(storeFileName))
+        # six data channels share two fiducial frames
+        assert len(storeReader.fileptr['fiducials']) == 2
+        for dataChannel in dataOrganization.get_data_channels():
+            for zpos in dataSet.get_z_positions():
+                with imagereader.open_reader(
+                        dataSet.rawDataPortal,
+                        dataOrganization.get_image_filename(
+                            dataChannel, fov)) as rawReader:
+                    rawFrame = rawReader.load_frame(int(
+                        dataOrganization.get_image_frame_index(
+                            dataChannel, zpos)))
+                assert np.array_equal(
+                    storeReader.load_frame(dataSet.get_raw_store_frame_index(
+                        dataChannel, zpos)), rawFrame)
+
+            with imagereader.open_reader(
+                    dataSet.rawDataPortal,
+                    dataOrganization.get_fiducial_filename(
+                        dataChannel, fov)) as rawReader:
+                rawFiducial = rawReader.load_frame(int(
+                    dataOrganization.get_fiducial_frame_index(dataChannel)))
+            assert np.array_equal(
+                storeReader.load_frame(
+                    dataSet.get_raw_store_fiducial_frame_index(dataChannel)),
+                rawFiducial)
+        storeReader.close()
+
+
+def test_zplanes_load_the_same_images_from_the_store(converted_dataset):
+    dataSetName, rawZplanes = converted_dataset
+    for (fov, zpos), rawZplane in rawZplanes.items():
+        zp = zplane.Zplane(dataSetName, fov=fov, zpos=zpos, ioThreads=2)
+        assert zp._frames[zp.get_readout_name()[0]]._dataPortal \
+            is zp._dataSet.rawStorePortal
+        zp.load_images()
+        assert np.array_equal(zp.get_readout_images(),
+                              rawZplane.get_readout_images())
+        assert np.array_equal(zp.get_fiducial_images(),
+                              rawZplane.get_fiducial_images())
+
+
+def test_store_reader_rejects_other_store_versions(converted_dataset,
+                                                   tmp_path):
+    dataSetName, _ = converted_dataset
+    storeFileName = dataset.get_merfish_dataset(
+        dataSetName).get_raw_store_file_name(0)
+    oldStoreFileName = str(tmp_path / 'fov_0000.h5')
+    shutil.copy(storeFileName, oldStoreFileName)
+    with h5py.File(oldStoreFileName, 'r+') as f:
+        f.attrs['version'] = imagereader.StoreReader.STORE_VERSION - 1
+
+    with pytest.raises(IOError):
+        imagereader.StoreReader(dataportal.LocalFilePortal(oldStoreFileName))
+    imagereader.StoreReader(
+        dataportal.LocalFilePortal(storeFileName)).close()
@@ -0,0 +1,139 @@
+import json
+import os
+import shutil
+import sys
+
+import pytest
+
+from merfishdecoder import parser
+from merfishdecoder.core import dataset
+from merfishdecoder.data import dataorganization
+
+
+def _copy_fov(dataSet, sourceFov, targetFov):
+    for fileName in os.listdir(dataSet.rawDataPath):
+        prefix = 'Conv_zscan_%02d_' % sourceFov
+        if fileName.startswith(prefix):
+            shutil.copy(
+                os.path.join(dataSet.rawDataPath, fileName),
+                os.path.join(dataSet.rawDataPath, fileName.replace(
+                    prefix, 'Conv_zscan_%02d_' % targetFov)))
+
+
+def test_validate_raw_refreshes_the_file_map(create_dataset, monkeypatch):
+    dataSetName = create_dataset('test_refresh_cli', '.dax')
+    dataSet = dataset.MERFISHDataSet(dataSetName)
+    fileCount = len(dataSet.get_data_organization().fileMap)
+
+    _copy_fov(dataSet, 0, 2)
+    monkeypatch.setattr(sys, 'argv', [
+        'merfishdecoder', 'validate-raw', '--data-set-name', dataSetName,
+        '--refresh-file-map', 'true', '--io-threads', '2'])
+    parser.parse_args()
+
+    fileMap = dataset.MERFISHDataSet(
+        dataSetName).get_data_organization().fileMap
+    assert sorted(set(fileMap['fov'])) == [0, 1, 2]
+    assert len(fileMap) == fileCount * 3 // 2
+
+
+def test_refresh_file_map_matches_only_new_files(create_dataset):
+    dataSetName = create_dataset('test_refresh', '.dax')
+    dataSet = dataset.MERFISHDataSet(dataSetName)
+    dataOrganization = dataSet.get_data_organization()
+
+    # files already in the manifest are not matched again
+    manifestPath = os.path.join(dataSet.analysisPath, 'raw_manifest.json')
+    with open(manifestPath) as f:
+        manifest = json.load(f)
+    knownFile = os.path.join(dataSet.rawDataPath, 'Conv_zscan_01_1.dax')
+    manifest['files'][knownFile][0][1]['imagingRound'] = '7'
+    with open(manifestPath, 'w') as f:
+        json.dump(manifest, f)
+
+    _copy_fov(dataSet, 0, 2)
+    dataOrganization.refresh_file_map()
+    fileMap = dataOrganization.fileMap
+    assert sorted(set(fileMap['fov'])) == [0, 1, 2]
+    assert set(fileMap['imagingRound']) == {0, 1, 7}
+
+    # without a manifest all the files are matched
+    os.remove(manifestPath)
+    dataOrganization.refresh_file_map()
+    assert set(dataOrganization.fileMap['imagingRound']) == {0, 1}
+    assert len(dataOrganization.fileMap) == len(fileMap)
+
+
+def test_corrupt_manifest_is_treated_as_missing(create_dataset):
+    dataSetName = create_dataset('test_manifest', '.dax')
+    dataSet = dataset.MERFISHDataSet(dataSetName)
+    dataOrganization = dataSet.get_data_organization()
+    fileMap = dataOrganization.fileMap.copy()
+
+    manifestPath = os.path.join(dataSet.analysisPath, 'raw_manifest.json')
+    with open(manifestPath) as f:
+        manifestText = f.read()
+    with open(manifestPath, 'w') as f:
+        f.write(manifestText[:len(manifestText) // 2])
+
+    dataOrganization.refresh_file_map()
+    assert dataOrganization.fileMap.equals(fileMap)
+    with open(manifestPath) as f:
+        assert json.load(f)['files']
+    assert not [x for x in os.listdir(dataSet.analysisPath)
+                if x.endswith('.tmp')]
+
+
+def test_name_prefix_of_regular_expressions():
+    pattern = '(?P<imageType>[\\w|-]+)_(?P<fov>[0-9]+)_(?P<imagingRound>[0-9]+)'
+    assert dataorganization._get_name_prefix('Conv_zscan', pattern) \
+        == 'Conv_zscan'
+    assert dataorganization._get_name_prefix(
+        'Conv', 'Conv_(?P<imageType>[a-z]+)') == 'Conv_'
+    assert dataorganization._get_name_prefix('x', 'abc*_(?P<fov>[0-9]+)') \
+        == 'ab'
+    assert dataorganization._get_name_prefix('x', 'abc|def') == ''
+    assert dataorganization._get_name_prefix('x', '(?i)abc') == ''
+
+
+def test_validate_raw_accepts_complete_data(raw_dataset, monkeypatch):
+    monkeypatch.setattr(sys, 'argv', [
+        'merfishdecoder', 'validate-raw', '--data-set-name', raw_dataset,
+        '--io-threads', '3'])
+    parser.parse_args()
+
+
+def test_validate_file_map_reports_truncated_and_missing_files(
+        create_dataset, monkeypatch):
+    dataSetName = create_dataset('test_validate', '.dax')
+    dataOrganization = dataset.MERFISHDataSet(
+        dataSetName).get_data_organization()
+    rawDataPath = dataOrganization._dataSet.rawDataPath
+    truncatedPath = os.path.join(rawDataPath, 'Conv_zscan_00_1.dax')
+    missingPath = os.path.join(rawDataPath, 'Conv_zscan_01_0.dax')
+    with open(truncatedPath, 'r+b') as f:
+        f.truncate(3 * 64 * 64 * 2)
+    os.remove(missingPath)
+
+    imageSize, problem = dataOrganization._read_image_stack_size(
+        truncatedPath)
+    assert imageSize is None and 'is truncated' in problem
+    imageSize, problem = dataOrganization._read_image_stack_size(missingPath)
+    assert imageSize is None and 'not found' in problem
+    imageSize, problem = dataOrganization._read_image_stack_size(
+        os.path.join(rawDataPath, 'Conv_zscan_00_0.dax'))
+    assert imageSize == [64, 64, 7] and problem is None
+
+    # all the problems are reported together
+    for ioThreads in [1, 4]:
+        with pytest.raises(dataorganization.InputDataError) as e:
+            dataOrganization.validate_file_map(ioThreads=ioThreads)
+        message = str(e.value)
+        assert message.startswith('2 problems found')
+        assert truncatedPath in message and missingPath in message
+
+    monkeypatch.setattr(sys, 'argv', [
+        'merfishdecoder', 'validate-raw', '--data-set-name', dataSetName,
+        '--io-threads', '2'])
+    with pytest.raises(dataorganization.InputDataError):
+        parser.parse_args()
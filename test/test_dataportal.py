@@ -0,0 +1,221 @@
+import os
+
+import numpy as np
+import pytest
+
+from merfishdecoder.util import dataportal
+
+
+@pytest.fixture
+def s3_bucket(monkeypatch, tmp_path):
+    moto = pytest.importorskip('moto')
+    boto3 = pytest.importorskip('boto3')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with moto.mock_aws():
+        # the shared resource is created again inside the mock
+        monkeypatch.setattr(dataportal, '_sharedS3Resource', None)
+        boto3.client('s3').create_bucket(Bucket='merfish-test')
+        yield 'merfish-test'
+
+
+def _put_object(bucketName, key, data, localPath):
+    import boto3
+    boto3.client('s3').put_object(Bucket=bucketName, Key=key, Body=data)
+    with open(localPath, 'wb') as f:
+        f.write(data)
+
+
+def test_s3_read_ranges_match_local_file(s3_bucket, tmp_path):
+    data = np.random.RandomState(0).bytes(2 * dataportal.RANGE_PART_SIZE + 12345)
+    localPath = str(tmp_path / 'movie.dax')
+    _put_object(s3_bucket, 'ds/movie.dax', data, localPath)
+
+    remotePortal = dataportal.DataPortal.create_portal(
+        's3://%s/ds' % s3_bucket).open_file('movie.dax')
+    localPortal = dataportal.LocalFilePortal(localPath)
+
+    requestedParts = []
+    readRange = remotePortal._read_range
+
+    def record_range(startByte, endByte):
+        requestedParts.append((startByte, endByte))
+        return readRange(startByte, endByte)
+
+    remotePortal._read_range = record_range
+
+    # out of order and overlapping ranges, one spanning several parts
+    byteRanges = [(len(data) - 100, len(data)), (0, len(data)),
+                  (10, 20), (15, 5000), (10, 20),
+                  (dataportal.RANGE_PART_SIZE - 3,
+                   dataportal.RANGE_PART_SIZE + 3)]
+    remoteData = remotePortal.read_ranges(byteRanges)
+    localData = localPortal.read_ranges(byteRanges)
+    assert remoteData == localData
+    assert remoteData == [data[s:e] for s, e in byteRanges]
+
+    # the full range is split into parts of at most RANGE_PART_SIZE bytes
+    partSize = dataportal.RANGE_PART_SIZE
+    assert set([(0, partSize), (partSize, 2 * partSize),
+                (2 * partSize, len(data))]) <= set(requestedParts)
+    assert all(e - s <= partSize for s, e in requestedParts)
+
+    assert remotePortal.read_file_bytes(5, 17) == data[5:17]
+
+
+def test_s3_read_ranges_from_range_executor(s3_bucket, tmp_path, monkeypatch):
+    monkeypatch.setattr(dataportal, 'RANGE_PART_SIZE', 1000)
+    data = np.random.RandomState(1).bytes(10500)
+    _put_object(s3_bucket, 'ds/movie.dax', data, str(tmp_path / 'movie.dax'))
+    filePortal = dataportal.DataPortal.create_portal(
+        's3://%s/ds' % s3_bucket).open_file('movie.dax')
+
+    # a read issued from a range thread must not wait on parts queued
+    # behind it on the same executor
+    executor = dataportal._get_range_executor()
+    futures = [executor.submit(filePortal.read_ranges, [(0, len(data))])
+               for i in range(2 * dataportal.MAX_CONCURRENT_REQUESTS)]
+    assert all(f.result(timeout=60) == [data] for f in futures)
+
+
+def test_s3_portals_share_one_resource(s3_bucket):
+    firstPortal = dataportal.DataPortal.create_portal('s3://%s/a' % s3_bucket)
+    secondPortal = dataportal.DataPortal.create_portal('s3://%s/b' % s3_bucket)
+    assert firstPortal._s3 is secondPortal._s3
+    assert firstPortal.open_file('x.dax')._s3 is firstPortal._s3
+    assert firstPortal._s3 is dataportal._get_shared_s3_resource()
+
+
+class _MemoryFilePortal(dataportal.RemoteFilePortal):
+
+    """
+    A remote file portal serving bytes held in memory, recording the
+    requests that reach the remote store.
+    """
+
+    def __init__(self, fileName, data, version='1', blockCache=None):
+        super().__init__(fileName, blockCache)
+        self._data = data
+        self._version = version
+        self.requests = []
+
+    def exists(self):
+        return True
+
+    def get_version(self):
+        return self._version
+
+    def get_size(self):
+        return len(self._data)
+
+    def get_sibling_with_extension(self, newExtension):
+        raise NotImplementedError
+
+    def read_as_text(self):
+        return self._data.decode('utf-8')
+
+    def _read_range(self, startByte, endByte):
+        self.requests.append((startByte, endByte))
+        return self._data[startByte:endByte]
+
+    def close(self):
+        pass
+
+
+def _cached_block_paths(cachePath):
+    return sorted(os.path.join(d, f) for d, _, files in os.walk(cachePath)
+                  for f in files if not f.endswith('.tmp'))
+
+
+def test_block_cache_serves_repeated_reads_from_cache(tmp_path):
+    data = np.random.RandomState(2).bytes(1050)
+    blockCache = dataportal.BlockCache(
+        str(tmp_path / 'cache'), maxBytes=10000, blockSize=100)
+    filePortal = _MemoryFilePortal('s3://bucket/movie.dax', data,
+                                   blockCache=blockCache)
+
+    byteRanges = [(950, 1050), (120, 130), (0, 250)]
+    assert filePortal.read_ranges(byteRanges) == \
+        [data[s:e] for s, e in byteRanges]
+    assert sorted(filePortal.requests) == \
+        [(i * 100, (i + 1) * 100) for i in [0, 1, 2, 9, 10]]
+    assert len(_cached_block_paths(str(tmp_path / 'cache'))) == 5
+
+    # cache hits, including a range spanning cached blocks
+    filePortal.requests = []
+    assert filePortal.read_ranges([(50, 220), (1000, 1050)]) == \
+        [data[50:220], data[1000:1050]]
+    assert filePortal.requests == []
+
+    # only the missing block is requested
+    assert filePortal.read_file_bytes(150, 350) == data[150:350]
+    assert filePortal.requests == [(300, 400)]
+
+    # a new version of the file is not served from stale blocks
+    newData = data[::-1]
+    newPortal = _MemoryFilePortal('s3://bucket/movie.dax', newData,
+                                  version='2', blockCache=blockCache)
+    assert newPortal.read_file_bytes(0, 100) == newData[:100]
+    assert newPortal.requests == [(0, 100)]
+
+
+def test_block_cache_evicts_least_recently_used_blocks(tmp_path):
+    cachePath = str(tmp_path / 'cache')
+    data = np.random.RandomState(3).bytes(1000)
+    blockCache = dataportal.BlockCache(cachePath, maxBytes=500, blockSize=100)
+    filePortal = _MemoryFilePortal('s3://bucket/movie.dax', data,
+                                   blockCache=blockCache)
+
+    for i in range(5):
+        filePortal.read_file_bytes(i * 100, (i + 1) * 100)
+    blockPaths = dict((int(p.rsplit('_', 1)[1]), p)
+                      for p in _cached_block_paths(cachePath))
+    assert sorted(blockPaths) == [0, 1, 2, 3, 4]
+
+    # block 0 is used most recently and blocks 1 and 2 least recently
+    for i, blockIndex in enumerate([1, 2, 3, 4, 0]):
+        os.utime(blockPaths[blockIndex], (1000 + i, 1000 + i))
+
+    # exceeding the budget evicts down to 90% of it
+    filePortal.read_file_bytes(500, 600)
+    remaining = sorted(int(p.rsplit('_', 1)[1])
+                       for p in _cached_block_paths(cachePath))
+    assert remaining == [0, 3, 4, 5]
+    assert sum(os.path.getsize(p) for p in _cached_block_paths(cachePath)) \
+        <= 0.9 * 500
+
+    # evicted blocks are fetched again, cached ones are not
+    filePortal.requests = []
+    assert filePortal.read_ranges([(0, 100), (100, 200)]) == \
+        [data[:100], data[100:200]]
+    assert filePortal.requests == [(100, 200)]
+
+
+def test_raw_data_cache_size_is_read_when_used(monkeypatch):
+    import merfishdecoder
+    monkeypatch.delenv('RAW_DATA_CACHE_SIZE', raising=False)
+    assert merfishdecoder.get_raw_data_cache_size() == 0
+    monkeypatch.setenv('RAW_DATA_CACHE_SIZE', '1048576')
+    assert merfishdecoder.get_raw_data_cache_size() == 1048576
+
+
+def test_s3_list_files_by_name_prefix(s3_bucket, tmp_path):
+    import boto3
+    client = boto3.client('s3')
+    keys = ['ds/Conv_zscan_00_0.dax', 'ds/Conv_zscan_00_0.inf',
+            'ds/Conv_zscan_01_0.dax', 'ds/Conv_zscan_b_00_0.tif',
+            'ds/Epi_00_0.dax', 'ds/Other_00_0.dax', 'other/Epi_00_0.dax']
+    for key in keys:
+        client.put_object(Bucket=s3_bucket, Key=key, Body=b'0')
+    dataPortal = dataportal.DataPortal.create_portal('s3://%s/ds' % s3_bucket)
+
+    allFiles = dataPortal.list_files(extensionList=['.dax', '.tif'])
+    assert sorted(allFiles) == ['s3://%s/%s' % (s3_bucket, k)
+                                for k in keys[:-1] if not k.endswith('.inf')]
+
+    prefixFiles = dataPortal.list_files(
+        extensionList=['.dax', '.tif'],
+        namePrefixes=['Conv_zscan', 'Conv_zscan_b', 'Epi'])
+    assert sorted(prefixFiles) == \
+        [f for f in sorted(allFiles) if '/Other_' not in f]
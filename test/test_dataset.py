@@ -0,0 +1,50 @@
+import os
+import threading
+import time
+
+import pytest
+
+from merfishdecoder.core import dataset
+
+
+@pytest.mark.parametrize('useFcntl', [True, False])
+def test_drift_table_lock_is_exclusive(dax_dataset, monkeypatch, useFcntl):
+    if not useFcntl:
+        monkeypatch.setattr(dataset, 'fcntl', None)
+    elif dataset.fcntl is None:
+        pytest.skip('fcntl is not available')
+    dataSet = dataset.MERFISHDataSet(dax_dataset)
+
+    holders = []
+    overlaps = []
+
+    def hold_lock():
+        for i in range(5):
+            with dataSet.lock_drift_table(0):
+                holders.append(threading.get_ident())
+                if len(holders) > 1:
+                    overlaps.append(list(holders))
+                time.sleep(0.002)
+                holders.remove(threading.get_ident())
+
+    threads = [threading.Thread(target=hold_lock) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert overlaps == []
+
+    lockFileName = os.path.splitext(
+        dataSet.get_drift_table_file_name(0))[0] + '.lock.excl'
+    assert not os.path.exists(lockFileName)
+
+
+def test_stale_lock_file_is_removed(tmp_path):
+    lockFileName = str(tmp_path / 'drift.lock.excl')
+    with open(lockFileName, 'w') as f:
+        f.write('12345')
+    os.utime(lockFileName, (1000, 1000))
+    with dataset._exclusive_file_lock(lockFileName, staleSeconds=60):
+        with open(lockFileName) as f:
+            assert f.read() == str(os.getpid())
+    assert not os.path.exists(lockFileName)
@@ -0,0 +1,110 @@
+import os
+import threading
+
+import numpy as np
+
+from merfishdecoder.util import dataportal
+from merfishdecoder.util import imagereader
+
+
+def _write_dax(fileName, images, bigEndian=False):
+    images.astype('>u2' if bigEndian else '<u2').tofile(fileName)
+    with open(os.path.splitext(fileName)[0] + '.inf', 'w') as f:
+        f.write('frame dimensions = %d x %d\nnumber of frames = %d\n %s endian\n'
+                % (images.shape[2], images.shape[1], images.shape[0],
+                   'big' if bigEndian else 'little'))
+
+
+def _fromfile_frames(fileName, height, width, bigEndian=False):
+    return np.fromfile(fileName, dtype='>u2' if bigEndian else '<u2').reshape(
+        (-1, height, width))
+
+
+def test_memory_mapped_dax_frames_match_fromfile(tmp_path):
+    images = np.random.RandomState(1).randint(
+        0, 2**16, size=(5, 24, 32)).astype(np.uint16)
+    for bigEndian in [False, True]:
+        fileName = str(tmp_path / ('frames_%i.dax' % bigEndian))
+        _write_dax(fileName, images, bigEndian)
+        expected = _fromfile_frames(fileName, 24, 32, bigEndian)
+
+        mapped = imagereader.DaxReader(
+            dataportal.LocalFilePortal(fileName), useMemmap=True)
+        unmapped = imagereader.DaxReader(
+            dataportal.LocalFilePortal(fileName), useMemmap=False)
+        assert mapped.is_memory_mapped()
+        assert not unmapped.is_memory_mapped()
+
+        for i in range(len(images)):
+            assert np.array_equal(mapped.load_frame(i), expected[i])
+            assert np.array_equal(unmapped.load_frame(i), expected[i])
+        frameIndexes = [4, 0, 1, 2]
+        assert np.array_equal(
+            mapped.load_frames(frameIndexes), expected[frameIndexes])
+        assert np.array_equal(
+            unmapped.load_frames(frameIndexes), expected[frameIndexes])
+        mapped.close()
+        unmapped.close()
+
+
+def test_memory_mapped_dax_maps_only_complete_frames(tmp_path):
+    images = np.arange(3 * 8 * 8, dtype=np.uint16).reshape((3, 8, 8))
+    fileName = str(tmp_path / 'truncated.dax')
+    _write_dax(fileName, images)
+    with open(fileName, 'r+b') as f:
+        f.truncate(2 * 8 * 8 * 2 + 10)
+
+    reader = imagereader.DaxReader(dataportal.LocalFilePortal(fileName))
+    assert np.array_equal(reader.load_frame(1), images[1])
+    assert len(reader._memmap) == 2
+    reader.close()
+
+
+def test_reader_pool_defers_closing_checked_out_readers(tmp_path):
+    images = np.ones((2, 8, 8), dtype=np.uint16)
+    for name in ['a.dax', 'b.dax']:
+        _write_dax(str(tmp_path / name), images)
+    portal = dataportal.LocalDataPortal(str(tmp_path))
+    pool = imagereader.ReaderPool(maxOpenReaders=1)
+
+    closed = []
+    with pool.open_reader(portal, 'a.dax') as readerA:
+        readerA.close = lambda: closed.append('a.dax')
+        # opening another file evicts the reader that is checked out
+        pool.get_reader(portal, 'b.dax')
+        assert closed == []
+        assert np.array_equal(readerA.load_frame(1), images[1])
+    assert closed == ['a.dax']
+
+    with pool.open_reader(portal, 'b.dax') as readerB:
+        readerB.close = lambda: closed.append('b.dax')
+        pool.close()
+        assert closed == ['a.dax']
+    assert closed == ['a.dax', 'b.dax']
+
+
+def test_reader_pool_shares_readers_between_threads(tmp_path):
+    images = np.ones((2, 8, 8), dtype=np.uint16)
+    for i in range(4):
+        _write_dax(str(tmp_path / ('%i.dax' % i)), images)
+    portal = dataportal.LocalDataPortal(str(tmp_path))
+    pool = imagereader.ReaderPool(maxOpenReaders=2)
+
+    errors = []
+
+    def read_files():
+        try:
+            for i in range(50):
+                with pool.open_reader(portal, '%i.dax' % (i % 4)) as reader:
+                    assert np.array_equal(reader.load_frames([0, 1]), images)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=read_files) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert len(pool._readers) <= 2
+    assert pool._checkouts == {} and pool._evicted == set()
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from merfishdecoder.core import zplane
+
+
+def test_stack_backed_images_are_copied_unless_requested(raw_dataset):
+    zp = zplane.Zplane(raw_dataset, fov=1, zpos=2.0, stackBacked=True)
+    zp.load_images()
+    plainZp = zplane.Zplane(raw_dataset, fov=1, zpos=2.0)
+    plainZp.load_images()
+    readoutNames = zp.get_readout_name()
+    expected = plainZp.get_readout_images()
+
+    images = zp.get_readout_images()
+    view = zp.get_readout_images(copy=False)
+    fiducialView = zp.get_fiducial_images(copy=False)
+    assert np.array_equal(images, expected)
+    assert np.array_equal(view, expected)
+    assert np.array_equal(zp.get_fiducial_images(),
+                          plainZp.get_fiducial_images())
+    assert images.flags.writeable and not view.flags.writeable
+    assert not fiducialView.flags.writeable
+    with pytest.raises(ValueError):
+        view[0, 0, 0] = 0
+
+    # setting the image of a frame again writes into the stack, which
+    # the copy does not see but the view does
+    frame = zp.get_frame_by_readout_name(readoutNames[0])
+    frame._img = frame._img + 1
+    assert np.array_equal(images, expected)
+    assert np.array_equal(view[0], expected[0] + 1)
+    assert np.array_equal(zp.get_readout_images()[0], expected[0] + 1)